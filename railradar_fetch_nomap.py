@@ -172,15 +172,17 @@ def main():
             if lat is not None and lon is not None:
                 coords_count += 1
 
+            # Newer API responses nest times under "schedule"
+            sched = stop.get("schedule") or {}
             enriched_rows.append({
                 "name": name,
                 "code": code,
                 "lat": lat,
                 "lon": lon,
-                "arr": stop.get("arrival"),
-                "dep": stop.get("departure"),
-                "day": stop.get("day"),
-                "distance": stop.get("distance"),
+                "arr": stop.get("arrival") or sched.get("arrival"),
+                "dep": stop.get("departure") or sched.get("departure"),
+                "day": stop.get("day") or stop.get("journeyDay"),
+                "distance": stop.get("distance") if stop.get("distance") is not None else stop.get("distanceKilometers"),
             })
 
         print(f"  Route stops with coordinates: {coords_count}/{len(route_data)}")
@@ -0,0 +1,533 @@
+"""
+Long-running RailRadar live poller that emits only what changed.
+
+Each train is polled on its own schedule: moving trains every
+MOVING_INTERVAL seconds, backing off while nothing changes; trains that
+have not started or have terminated are checked rarely. Every response is
+reduced to the fields downstream cares about (position, delay, last/next
+station, state) and diffed against the last known state; only trains that
+changed are appended to the change feed (JSON lines). The last known state
+is saved so a restart does not re-emit every train. A train that has
+terminated (or has no live data) and is no longer returned by discovery is
+dropped from tracking and from the saved state.
+
+    python railradar_poll.py poll                       # real API, RAILRADAR_API_KEY
+    python railradar_poll.py stub --port 8765 --speed 60
+    python railradar_poll.py poll --base-url http://127.0.0.1:8765/api/v1 \\
+        --moving-interval 1 --max-moving-interval 5 --duration 60
+"""
+
+import argparse
+import heapq
+import json
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import date, datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+from railradar_fetch import safe_get
+
+BASE_URL = os.getenv("RAILRADAR_BASE_URL", "https://railradar.in/api/v1")
+FROM_STATION = os.getenv("FROM_STATION", "NDLS")
+TO_STATION = os.getenv("TO_STATION", "MMCT")
+TRAIN_NUMBERS = os.getenv("TRAIN_NUMBERS", "")  # optional comma-separated list instead of discovery
+
+MOVING_INTERVAL = float(os.getenv("MOVING_INTERVAL", "60"))
+MAX_MOVING_INTERVAL = float(os.getenv("MAX_MOVING_INTERVAL", "300"))
+NOT_STARTED_INTERVAL = float(os.getenv("NOT_STARTED_INTERVAL", "600"))
+TERMINATED_INTERVAL = float(os.getenv("TERMINATED_INTERVAL", "3600"))
+MAX_ERROR_INTERVAL = float(os.getenv("MAX_ERROR_INTERVAL", "900"))
+DISCOVERY_INTERVAL = float(os.getenv("DISCOVERY_INTERVAL", "1800"))
+MAX_CALLS_PER_MINUTE = int(os.getenv("MAX_CALLS_PER_MINUTE", "60"))
+BACKOFF = 1.5
+POSITION_EPSILON_KM = 0.2  # GPS jitter below this is not movement
+
+MOVING = "moving"
+NOT_STARTED = "not_started"
+TERMINATED = "terminated"
+UNAVAILABLE = "unavailable"
+
+TRACKED_FIELDS = ("position", "delay_minutes", "last_station", "next_station", "state")
+
+
+def haversine_km(a: tuple[float, float], b: tuple[float, float]) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (*a, *b))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0 * math.asin(math.sqrt(min(1.0, h)))
+
+
+def _station(value) -> str | None:
+    if isinstance(value, dict):
+        return value.get("code") or value.get("stationCode") or value.get("name")
+    return value or None
+
+
+def normalize_live(payload: dict | None) -> dict | None:
+    """Compact live state from a /live (or dataType=full) response; None if there is none"""
+    data = (payload or {}).get("data") or {}
+    live = data.get("liveData") or {}
+    if not live:
+        return None
+    location = live.get("currentLocation") or {}
+    lat = live.get("latitude", location.get("latitude"))
+    lon = live.get("longitude", location.get("longitude"))
+    delay = live.get("delayMinutes", live.get("overallDelayMinutes"))
+    last_station = _station(live.get("lastStation")) or location.get("stationCode")
+    next_station = _station(live.get("nextStation"))
+
+    status = str(live.get("status") or live.get("journeyStatus") or live.get("trainStatus") or "").upper()
+    if "NOT" in status and "START" in status or status in ("YET_TO_START", "SCHEDULED"):
+        state = NOT_STARTED
+    elif status in ("TERMINATED", "COMPLETED", "ARRIVED", "ENDED"):
+        state = TERMINATED
+    elif lat is None and last_station is None:
+        state = NOT_STARTED
+    elif last_station is not None and next_station is None:
+        state = TERMINATED
+    else:
+        state = MOVING
+
+    position = None
+    if lat is not None and lon is not None:
+        position = [round(float(lat), 5), round(float(lon), 5)]
+    return {
+        "position": position,
+        "delay_minutes": int(float(delay)) if delay is not None else None,
+        "last_station": last_station,
+        "next_station": next_station,
+        "state": state,
+    }
+
+
+def diff(previous: dict | None, current: dict) -> list[str]:
+    """Fields that changed; position only when it moved more than the GPS jitter"""
+    if previous is None:
+        return list(TRACKED_FIELDS)
+    changed = []
+    for name in TRACKED_FIELDS:
+        before, after = previous.get(name), current.get(name)
+        if name == "position" and before and after:
+            if haversine_km(tuple(before), tuple(after)) >= POSITION_EPSILON_KM:
+                changed.append(name)
+        elif before != after:
+            changed.append(name)
+    return changed
+
+
+@dataclass
+class Tracked:
+    train_no: str
+    name: str | None = None
+    last: dict | None = None
+    interval: float = MOVING_INTERVAL
+    next_poll: float = 0.0
+    unchanged: int = 0
+    failures: int = 0
+
+
+@dataclass
+class PollerConfig:
+    moving_interval: float = MOVING_INTERVAL
+    max_moving_interval: float = MAX_MOVING_INTERVAL
+    not_started_interval: float = NOT_STARTED_INTERVAL
+    terminated_interval: float = TERMINATED_INTERVAL
+    max_error_interval: float = MAX_ERROR_INTERVAL
+    discovery_interval: float = DISCOVERY_INTERVAL
+    max_calls_per_minute: int = MAX_CALLS_PER_MINUTE
+
+
+class LivePoller:
+    """Adaptive per-train polling with a diffed change feed"""
+
+    def __init__(self, base_url: str = BASE_URL, headers: dict | None = None,
+                 train_numbers: list[str] | None = None, from_station: str = FROM_STATION,
+                 to_station: str = TO_STATION, journey_date: str | None = None,
+                 feed_path: Path | None = Path("out/live_changes.jsonl"),
+                 state_path: Path | None = Path("out/live_state.json"),
+                 config: PollerConfig | None = None, sink=None):
+        self.base_url = base_url.rstrip("/")
+        self.headers = headers or {}
+        self.fixed_trains = train_numbers
+        self.from_station = from_station
+        self.to_station = to_station
+        self.journey_date = journey_date
+        self.feed_path = feed_path
+        self.state_path = state_path
+        self.config = config or PollerConfig()
+        self.sink = sink  # optional callable(list of events), e.g. a queue or webhook
+        self.trains: dict[str, Tracked] = {}
+        self.listed: set[str] | None = None  # trains returned by the latest successful discovery
+        self.queue: list[tuple[float, str]] = []
+        self.calls: deque = deque()
+        self.next_discovery = 0.0
+        self.seq = 0
+        self.stats = {"api_calls": 0, "polls": 0, "errors": 0, "events": 0, "unchanged_polls": 0,
+                      "dropped": 0, "started_at": time.time()}
+        self._load_state()
+
+    # --- state --------------------------------------------------------------
+
+    def _load_state(self):
+        if not self.state_path or not self.state_path.exists():
+            return
+        saved = json.loads(self.state_path.read_text())
+        self.seq = saved.get("seq", 0)
+        for train_no, entry in saved.get("trains", {}).items():
+            self._track(train_no, entry.get("name"), entry.get("last"), 0.0)
+
+    def save_state(self):
+        if not self.state_path:
+            return
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        state = {"seq": self.seq, "saved_at": time.time(),
+                 "trains": {n: {"name": t.name, "last": t.last} for n, t in self.trains.items()}}
+        tmp = self.state_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(state))
+        tmp.replace(self.state_path)
+
+    def _track(self, train_no: str, name: str | None, last: dict | None, due: float):
+        if train_no in self.trains:
+            return
+        self.trains[train_no] = Tracked(train_no, name, last, self.config.moving_interval, due)
+        heapq.heappush(self.queue, (due, train_no))
+
+    def _finished(self, tracked: Tracked) -> bool:
+        """Done for good: terminated or without live data, and no longer listed"""
+        if self.listed is None or tracked.train_no in self.listed:
+            return False
+        return (tracked.last or {}).get("state") in (TERMINATED, UNAVAILABLE)
+
+    def _drop(self, train_no: str):
+        # Its heap entry is left behind and skipped when it comes due
+        del self.trains[train_no]
+        self.stats["dropped"] += 1
+
+    # --- API ----------------------------------------------------------------
+
+    def _get(self, path: str) -> tuple[int | None, dict | None, str | None]:
+        self.calls.append(time.time())
+        self.stats["api_calls"] += 1
+        return safe_get(f"{self.base_url}{path}", self.headers)
+
+    def _budget_left(self, now: float) -> bool:
+        while self.calls and now - self.calls[0] >= 60:
+            self.calls.popleft()
+        return len(self.calls) < self.config.max_calls_per_minute
+
+    def discover(self, now: float):
+        """Add trains running between the two stations (or the fixed list)"""
+        if self.fixed_trains is not None:
+            for train_no in self.fixed_trains:
+                self._track(train_no, None, None, now)
+            self.listed = set(self.fixed_trains)
+        else:
+            journey_date = self.journey_date or date.today().isoformat()
+            status, payload, err = self._get(
+                f"/trains/between?from={self.from_station}&to={self.to_station}&date={journey_date}")
+            if status == 200 and isinstance(payload, dict):
+                listed = set()
+                for train in payload.get("data", []):
+                    number = train.get("trainNumber") or train.get("number") or train.get("id")
+                    if number:
+                        listed.add(str(number))
+                        self._track(str(number), train.get("trainName") or train.get("name"), None, now)
+                self.listed = listed
+            else:
+                self.stats["errors"] += 1
+                print(f"Discovery failed: status={status} err={err}")
+        self.next_discovery = now + self.config.discovery_interval
+        finished = [n for n, t in self.trains.items() if self._finished(t)]
+        for train_no in finished:
+            self._drop(train_no)
+        if finished:
+            self.save_state()
+
+    def poll_train(self, tracked: Tracked, now: float) -> dict | None:
+        """Poll one train; returns a change event or None"""
+        self.stats["polls"] += 1
+        status, payload, err = self._get(f"/trains/{tracked.train_no}/live")
+        if status != 200 or not isinstance(payload, dict):
+            self.stats["errors"] += 1
+            tracked.failures += 1
+            tracked.interval = min(self.config.max_error_interval,
+                                   self.config.moving_interval * 2 ** tracked.failures)
+            return None
+        tracked.failures = 0
+
+        current = normalize_live(payload) or {"position": None, "delay_minutes": None,
+                                              "last_station": None, "next_station": None,
+                                              "state": UNAVAILABLE}
+        changed = diff(tracked.last, current)
+        tracked.interval = self._next_interval(tracked, current["state"], bool(changed))
+        if not changed:
+            self.stats["unchanged_polls"] += 1
+            return None
+
+        previous = tracked.last
+        if previous is not None and "position" not in changed and current.get("position") is not None:
+            # Sub-threshold jitter: keep the reference point so slow drift still adds up
+            current["position"] = previous.get("position")
+        tracked.last = current
+        self.seq += 1
+        event = {
+            "seq": self.seq,
+            "ts": datetime.fromtimestamp(now, tz=timezone.utc).isoformat(),
+            "train_no": tracked.train_no,
+            "event": "added" if previous is None else "changed",
+            "changed": changed,
+            **current,
+        }
+        if previous is not None:
+            event["previous"] = {name: previous.get(name) for name in changed}
+        return event
+
+    def _next_interval(self, tracked: Tracked, state: str, changed: bool) -> float:
+        if state == NOT_STARTED:
+            return self.config.not_started_interval
+        if state in (TERMINATED, UNAVAILABLE):
+            return self.config.terminated_interval
+        if changed:
+            tracked.unchanged = 0
+            return self.config.moving_interval
+        # Moving but nothing new (halted at a signal or a long dwell): back off
+        tracked.unchanged += 1
+        return min(self.config.max_moving_interval, tracked.interval * BACKOFF)
+
+    # --- loop ---------------------------------------------------------------
+
+    def run_once(self, now: float | None = None) -> list[dict]:
+        """Poll every train that is due; emit and return their change events"""
+        now = time.time() if now is None else now
+        if now >= self.next_discovery:
+            self.discover(now)
+        events = []
+        dropped = False
+        while self.queue and self.queue[0][0] <= now:
+            due, train_no = self.queue[0]
+            tracked = self.trains.get(train_no)
+            if tracked is None or tracked.next_poll != due:
+                heapq.heappop(self.queue)  # dropped, or superseded by a later re-track
+                continue
+            if not self._budget_left(time.time()):
+                break  # the rest stay due for the next cycle
+            heapq.heappop(self.queue)
+            event = self.poll_train(tracked, now)
+            if event:
+                events.append(event)
+            if self._finished(tracked):
+                self._drop(train_no)
+                dropped = True
+                continue
+            tracked.next_poll = now + tracked.interval
+            heapq.heappush(self.queue, (tracked.next_poll, train_no))
+        if events:
+            self.emit(events)
+        elif dropped:
+            self.save_state()
+        return events
+
+    def emit(self, events: list[dict]):
+        self.stats["events"] += len(events)
+        if self.feed_path:
+            self.feed_path.parent.mkdir(parents=True, exist_ok=True)
+            with self.feed_path.open("a", encoding="utf-8") as f:
+                for event in events:
+                    f.write(json.dumps(event) + "\n")
+        if self.sink:
+            self.sink(events)
+        for event in events:
+            print(f"[{event['seq']}] {event['train_no']} {event['event']}: {', '.join(event['changed'])}")
+        self.save_state()
+
+    def run(self, duration: float | None = None):
+        stop_at = time.time() + duration if duration else None
+        try:
+            while stop_at is None or time.time() < stop_at:
+                self.run_once()
+                due = min(self.queue[0][0] if self.queue else math.inf, self.next_discovery)
+                wait = max(0.05, due - time.time())
+                if stop_at is not None:
+                    wait = min(wait, max(0.0, stop_at - time.time()))
+                time.sleep(min(wait, 5.0))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.save_state()
+
+    def report(self) -> dict:
+        """Calls made versus refetching every train every moving interval"""
+        elapsed = max(1e-9, time.time() - self.stats["started_at"])
+        naive = len(self.trains) * max(1, math.ceil(elapsed / self.config.moving_interval))
+        return {**self.stats, "elapsed_seconds": round(elapsed, 1), "trains": len(self.trains),
+                "naive_live_calls": naive,
+                "states": {s: sum(1 for t in self.trains.values() if (t.last or {}).get("state") == s)
+                           for s in (MOVING, NOT_STARTED, TERMINATED, UNAVAILABLE)}}
+
+
+# --- local stub API -----------------------------------------------------------
+
+class StubRailRadar:
+    """Simulated RailRadar: trains from the mock file run station to station,
+    dwell, pick up delay and terminate; time runs `speed` times faster"""
+
+    LEG_SECONDS = 1800
+    DWELL_SECONDS = 300
+
+    def __init__(self, mock_path: Path, geo_path: Path, speed: float = 60.0, seed: int = 7):
+        self.rows = json.loads(mock_path.read_text())
+        self.geo = json.loads(geo_path.read_text()) if geo_path.exists() else {}
+        self.speed = speed
+        self.started = time.time()
+        self.calls = {"between": 0, "live": 0}
+        self.trains = {}
+        for k, row in enumerate(self.rows):
+            rng = random.Random(f"{seed}:{row['train_no']}")
+            route = [s["station"] for s in row.get("schedule") or []] or \
+                [row["current_station"], row["next_station"]]
+            route = [code for code in route if code in self.geo] or route
+            self.trains[row["train_no"]] = {
+                "name": row.get("train_name"),
+                "route": route,
+                # Every third train departs later in the simulation
+                "depart_at": 0 if k % 3 else 2 * self.LEG_SECONDS,
+                "delay": row.get("delay_minutes", 0),
+                "delay_steps": [rng.choice([0, 0, 1, 2, 5]) for _ in route],
+            }
+
+    def sim_seconds(self) -> float:
+        return (time.time() - self.started) * self.speed
+
+    def live(self, train_no: str) -> dict | None:
+        train = self.trains.get(train_no)
+        if train is None:
+            return None
+        t = self.sim_seconds() - train["depart_at"]
+        route = train["route"]
+        if t < 0:
+            return {"success": True, "data": {"trainNumber": train_no, "liveData": {
+                "status": "NOT_STARTED", "delayMinutes": train["delay"]}}}
+        leg = int(t // self.LEG_SECONDS)
+        if leg >= len(route) - 1:
+            last = route[-1]
+            live = {"status": "TERMINATED", "lastStation": {"code": last}, "nextStation": None,
+                    "delayMinutes": train["delay"] + sum(train["delay_steps"]),
+                    "latitude": self.geo.get(last, {}).get("lat"),
+                    "longitude": self.geo.get(last, {}).get("lon")}
+        else:
+            a, b = route[leg], route[leg + 1]
+            # Stands at the station for the dwell, then moves along the straight line
+            progress = max(0.0, (t - leg * self.LEG_SECONDS - self.DWELL_SECONDS)
+                           / (self.LEG_SECONDS - self.DWELL_SECONDS))
+            pa, pb = self.geo.get(a, {}), self.geo.get(b, {})
+            lat = lon = None
+            if pa and pb:
+                lat = pa["lat"] + (pb["lat"] - pa["lat"]) * progress
+                lon = pa["lon"] + (pb["lon"] - pa["lon"]) * progress
+            live = {"status": "RUNNING", "lastStation": {"code": a}, "nextStation": {"code": b},
+                    "delayMinutes": train["delay"] + sum(train["delay_steps"][:leg + 1]),
+                    "latitude": lat, "longitude": lon}
+        live["lastUpdated"] = datetime.now(timezone.utc).isoformat()
+        return {"success": True, "data": {"trainNumber": train_no, "liveData": live}}
+
+    def handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                parts = [p for p in url.path.split("/") if p]
+                if parts[-2:] == ["trains", "between"]:
+                    stub.calls["between"] += 1
+                    data = [{"trainNumber": n, "trainName": t["name"]} for n, t in stub.trains.items()]
+                    self._send(200, {"success": True, "data": data, "query": parse_qs(url.query)})
+                elif len(parts) >= 3 and parts[-1] == "live" and parts[-3] == "trains":
+                    stub.calls["live"] += 1
+                    payload = stub.live(parts[-2])
+                    self._send(200 if payload else 404, payload or {"success": False, "error": "not found"})
+                elif parts[-1:] == ["stats"]:
+                    self._send(200, {"calls": stub.calls, "sim_seconds": stub.sim_seconds()})
+                else:
+                    self._send(404, {"success": False, "error": "unknown endpoint"})
+
+            def _send(self, status: int, payload: dict):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def serve(self, port: int = 8765, background: bool = False) -> ThreadingHTTPServer:
+        server = ThreadingHTTPServer(("127.0.0.1", port), self.handler())
+        if background:
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        else:
+            print(f"Stub RailRadar on http://127.0.0.1:{server.server_port}/api/v1 (speed x{self.speed})")
+            server.serve_forever()
+        return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Delta-based RailRadar live poller")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    poll = sub.add_parser("poll", help="Poll live status and append changes to the feed")
+    poll.add_argument("--base-url", default=BASE_URL)
+    poll.add_argument("--api-key", default=os.getenv("RAILRADAR_API_KEY", ""))
+    poll.add_argument("--trains", default=TRAIN_NUMBERS, help="Comma-separated train numbers (skip discovery)")
+    poll.add_argument("--from-station", default=FROM_STATION)
+    poll.add_argument("--to-station", default=TO_STATION)
+    poll.add_argument("--date", help="Journey date for discovery (default today)")
+    poll.add_argument("--feed", default="out/live_changes.jsonl")
+    poll.add_argument("--state", default="out/live_state.json")
+    poll.add_argument("--duration", type=float, help="Stop after this many seconds")
+    poll.add_argument("--moving-interval", type=float, default=MOVING_INTERVAL)
+    poll.add_argument("--max-moving-interval", type=float, default=MAX_MOVING_INTERVAL)
+    poll.add_argument("--not-started-interval", type=float, default=NOT_STARTED_INTERVAL)
+    poll.add_argument("--terminated-interval", type=float, default=TERMINATED_INTERVAL)
+    poll.add_argument("--max-calls-per-minute", type=int, default=MAX_CALLS_PER_MINUTE)
+
+    stub = sub.add_parser("stub", help="Serve a simulated RailRadar API from the mock trains")
+    stub.add_argument("--port", type=int, default=8765)
+    stub.add_argument("--speed", type=float, default=60.0, help="Simulated seconds per real second")
+    stub.add_argument("--mock", default="server/mock/railradar_mock.json")
+    stub.add_argument("--geo", default="server/config/stations_geo.json")
+
+    args = parser.parse_args()
+
+    if args.command == "stub":
+        StubRailRadar(Path(args.mock), Path(args.geo), args.speed).serve(args.port)
+        return
+
+    if not args.api_key and args.base_url == BASE_URL and "railradar.in" in BASE_URL:
+        print("ERROR: Provide API key via env RAILRADAR_API_KEY or --api-key.")
+        raise SystemExit(2)
+    config = PollerConfig(
+        moving_interval=args.moving_interval,
+        max_moving_interval=args.max_moving_interval,
+        not_started_interval=args.not_started_interval,
+        terminated_interval=args.terminated_interval,
+        max_calls_per_minute=args.max_calls_per_minute,
+    )
+    trains = [t.strip() for t in args.trains.split(",") if t.strip()] or None
+    poller = LivePoller(args.base_url, {"x-api-key": args.api_key} if args.api_key else {}, trains,
+                        args.from_station, args.to_station, args.date, Path(args.feed),
+                        Path(args.state), config)
+    poller.run(args.duration)
+    print(json.dumps(poller.report(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
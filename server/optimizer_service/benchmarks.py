@@ -0,0 +1,539 @@
+#!/usr/bin/env python3
+"""
+Optimizer benchmarks
+In-process timing of solver components on synthetic instances. Each
+benchmark prints a JSON report so results can be compared across commits.
+The startup benchmark runs each sample in a fresh interpreter.
+
+    python benchmarks.py incremental --segments 300 --trains-per-segment 5
+"""
+
+import argparse
+import copy
+import json
+import os
+import random
+import sys
+import time
+from typing import Dict, List
+
+from instances import generate_instance
+from solver import TrainOptimizer
+
+
+# Benchmark requests are neither recorded in the solve history nor profiled
+BENCH_HEADERS = {'X-History': '0', 'X-Profile': '0'}
+
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    value = fn(*args, **kwargs)
+    return value, time.perf_counter() - started
+
+
+def full_solve(payload: Dict) -> Dict:
+    optimizer = TrainOptimizer()
+    trains, params = optimizer.parse_input(payload)
+    optimizer.build_model(trains, params)
+    return optimizer.solve()
+
+
+def bench_incremental(segments: int, trains_per_segment: int,
+                      changed_segments: List[int], seed: int, time_limit: int) -> Dict:
+    """Cold solve vs updates touching k segments on the same session"""
+    from incremental import IncrementalSession
+
+    payload = generate_instance(segments * trains_per_segment, segments, seed=seed,
+                                time_limit_seconds=time_limit)
+    rng = random.Random(seed)
+
+    full, full_seconds = timed(full_solve, payload)
+    session = IncrementalSession()
+    cold, cold_seconds = timed(session.update, payload)
+
+    updates = []
+    for k in changed_segments:
+        payload = copy.deepcopy(payload)
+        # Delay one train on each of k distinct segments
+        for s in rng.sample(range(segments), k):
+            payload['trains'][s]['earliest_entry_seconds'] += 60
+        result, seconds = timed(session.update, payload)
+        updates.append({
+            'changed_segments': k,
+            'seconds': round(seconds, 4),
+            'status': result['solver_meta']['status'],
+            'incremental': result['solver_meta']['incremental']
+        })
+
+    return {
+        'benchmark': 'incremental',
+        'segments': segments,
+        'trains': segments * trains_per_segment,
+        'full_solve': {
+            'seconds': round(full_seconds, 4),
+            'status': full['solver_meta']['status'],
+            'objective_value': full['solver_meta']['objective_value']
+        },
+        'incremental_cold': {
+            'seconds': round(cold_seconds, 4),
+            'status': cold['solver_meta']['status'],
+            'objective_value': cold['solver_meta']['objective_value']
+        },
+        'updates': updates
+    }
+
+
+def bench_lns(trains: int, segments: int, horizon_hours: float, time_limit: int,
+              neighbourhood_size: int, strategy: str, seed: int, compare_cpsat: bool) -> Dict:
+    """LNS objective over time, optionally against one full CP-SAT call"""
+    from lns import LNSOptimizer, LNSParams
+
+    payload = generate_instance(trains, segments, seed=seed,
+                                horizon_seconds=int(horizon_hours * 3600),
+                                time_limit_seconds=time_limit)
+    optimizer = TrainOptimizer()
+    parsed, params = optimizer.parse_input(payload)
+
+    lns_params = LNSParams(neighbourhood_size=neighbourhood_size, strategy=strategy, seed=seed)
+    result, seconds = timed(LNSOptimizer(lns_params).solve, parsed, params)
+    meta = result['solver_meta']
+    report = {
+        'benchmark': 'lns',
+        'trains': trains,
+        'segments': segments,
+        'time_limit_seconds': time_limit,
+        'lns': {
+            'seconds': round(seconds, 4),
+            'initial_objective': meta['lns']['initial_objective'],
+            'objective_value': meta['objective_value'],
+            'iterations': meta['lns']['iterations'],
+            'improvements': meta['lns']['improvements'],
+            'strategy_stats': meta['lns']['strategy_stats'],
+            'history': meta['lns']['history'][::max(1, len(meta['lns']['history']) // 20)]
+        }
+    }
+    if compare_cpsat:
+        full, full_seconds = timed(full_solve, payload)
+        report['cpsat'] = {
+            'seconds': round(full_seconds, 4),
+            'status': full['solver_meta']['status'],
+            'objective_value': full['solver_meta']['objective_value']
+        }
+    return report
+
+
+def bench_dispatch(sizes: List[int], repeats: int, seed: int) -> Dict:
+    """End-to-end /solve latency for single-segment requests, auto vs cpsat"""
+    from solver import app
+
+    client = app.test_client()
+    rows = []
+    for n in sizes:
+        for engine in ('auto', 'cpsat'):
+            latencies = []
+            statuses = {}
+            for r in range(repeats):
+                payload = generate_instance(n, 1, seed=seed + r, horizon_seconds=500 * n)
+                payload['solver_params']['engine'] = engine
+                response, seconds = timed(client.post, '/solve', json=payload, headers=BENCH_HEADERS)
+                latencies.append(seconds)
+                meta = response.get_json()['solver_meta']
+                statuses[meta['status']] = statuses.get(meta['status'], 0) + 1
+            latencies.sort()
+            rows.append({
+                'trains': n,
+                'engine': engine,
+                'p50_ms': round(1000 * latencies[len(latencies) // 2], 3),
+                'max_ms': round(1000 * latencies[-1], 3),
+                'solver_status': statuses
+            })
+    return {'benchmark': 'dispatch', 'repeats': repeats, 'results': rows}
+
+
+def bench_simulate(trains: int, segments: int, samples: int, seed: int) -> Dict:
+    """Monte Carlo robustness run on a list-schedule plan"""
+    from lns import list_schedule
+    from simulate import Scenario, simulate_plan
+
+    payload = generate_instance(trains, segments, seed=seed, horizon_seconds=6 * 3600)
+    parsed, params = TrainOptimizer().parse_input(payload)
+    plan = list_schedule(parsed, params.headway_seconds)
+    result, seconds = timed(simulate_plan, parsed, plan, params.headway_seconds,
+                            Scenario(samples=samples, seed=seed))
+    return {
+        'benchmark': 'simulate',
+        'trains': trains,
+        'segments': segments,
+        'samples': samples,
+        'seconds': round(seconds, 3),
+        'mean_delay_vs_plan_seconds': result['simulation_meta']['mean_delay_vs_plan_seconds']
+    }
+
+
+def bench_validate(trains: int, segments: int, seed: int) -> Dict:
+    """Validator throughput on a list-schedule plan and on a plan with injected conflicts"""
+    import random
+    from lns import list_schedule
+    from validate import validate_schedule
+
+    payload = generate_instance(trains, segments, seed=seed, horizon_seconds=6 * 3600)
+    parsed, params = TrainOptimizer().parse_input(payload)
+    plan = list_schedule(parsed, params.headway_seconds)
+    clean, clean_seconds = timed(validate_schedule, parsed, plan, params.headway_seconds,
+                                 params.max_hold_minutes)
+
+    # A controller override: pull a few trains forward onto their predecessors
+    rng = random.Random(seed)
+    edited = list(plan)
+    for i in rng.sample(range(trains), max(1, trains // 100)):
+        edited[i] = max(parsed[i].earliest_entry_seconds, edited[i] - params.headway_seconds)
+    dirty, dirty_seconds = timed(validate_schedule, parsed, edited, params.headway_seconds,
+                                 params.max_hold_minutes)
+    return {
+        'benchmark': 'validate',
+        'trains': trains,
+        'segments': segments,
+        'clean': {'seconds': round(clean_seconds, 4), 'valid': clean['validation_meta']['valid'],
+                  'objective_value': clean['validation_meta']['objective_value']},
+        'edited': {'seconds': round(dirty_seconds, 4), 'valid': dirty['validation_meta']['valid'],
+                   'headway_violations': dirty['validation_meta']['headway_violations']}
+    }
+
+
+def bench_corridor(trains: int, segments: int, bucket_seconds: int, seed: int) -> Dict:
+    """Corridor statistics on the as-is schedule and a list-schedule plan"""
+    from corridor import corridor_stats
+    from lns import list_schedule
+
+    payload = generate_instance(trains, segments, seed=seed, horizon_seconds=6 * 3600)
+    parsed, params = TrainOptimizer().parse_input(payload)
+    plan = list_schedule(parsed, params.headway_seconds)
+    before, before_seconds = timed(corridor_stats, parsed,
+                                   [t.earliest_entry_seconds for t in parsed],
+                                   params.headway_seconds, bucket_seconds)
+    after, after_seconds = timed(corridor_stats, parsed, plan, params.headway_seconds, bucket_seconds)
+    return {
+        'benchmark': 'corridor',
+        'trains': trains,
+        'segments': segments,
+        'buckets': len(before['corridor_meta']['buckets']),
+        'before': {'seconds': round(before_seconds, 4),
+                   'peak_concurrency': before['corridor_meta']['peak_concurrency']},
+        'after': {'seconds': round(after_seconds, 4),
+                  'peak_concurrency': after['corridor_meta']['peak_concurrency']}
+    }
+
+
+def bench_spatial(positions: int, stations: int, seed: int) -> Dict:
+    """Batch snapping throughput on a synthetic chain of stations"""
+    import numpy as np
+    from spatial import SpatialIndex
+
+    rng = np.random.default_rng(seed)
+    # A meandering line of stations 10-40 km apart, heading steadily north
+    steps = rng.uniform(0.1, 0.35, (stations, 2)) * [1, 0.3] * np.column_stack(
+        (np.ones(stations), rng.choice([-1, 1], stations)))
+    coords = np.cumsum(steps, axis=0) + [22.0, 75.0]
+    codes = [f'S{k}' for k in range(stations)]
+    geo = {c: (float(lat), float(lon)) for c, (lat, lon) in zip(codes, coords)}
+    segments = [(codes[k], codes[k + 1], None) for k in range(stations - 1)]
+    index, build_seconds = timed(SpatialIndex, geo, segments)
+
+    seg = rng.integers(0, stations - 1, positions)
+    frac = rng.random(positions)
+    points = coords[seg] + (coords[seg + 1] - coords[seg]) * frac[:, None]
+    points += rng.normal(0.0, 0.005, points.shape)  # GPS noise, roughly 500 m
+    snapped, snap_seconds = timed(index.snap, points[:, 0], points[:, 1])
+    geometry = snapped['geometry']
+    return {
+        'benchmark': 'spatial',
+        'stations': stations,
+        'positions': positions,
+        'build_seconds': round(build_seconds, 4),
+        'snap_seconds': round(snap_seconds, 4),
+        'matched': int((geometry >= 0).sum()),
+        'same_segment': int((geometry == seg).sum())
+    }
+
+
+STARTUP_PROBE = """
+import json, sys, time
+t0 = time.time()
+import solver
+imported = time.time() - t0
+warm_up_seconds = solver.warm_up() if sys.argv[1] == 'warm' else 0.0
+client = solver.app.test_client()
+payload = json.loads(sys.argv[2])
+latencies = []
+for k in range(11):
+    payload['run_id'] = f'startup_{k}'
+    t = time.time()
+    client.post('/solve', json=payload, headers={'X-Profile': '0'})
+    latencies.append(time.time() - t)
+print(json.dumps({'import_seconds': imported, 'warm_up_seconds': warm_up_seconds,
+                  'ready_seconds': time.time() - t0 - sum(latencies),
+                  'first_request_ms': 1000 * latencies[0],
+                  'steady_request_ms': 1000 * sorted(latencies[1:])[5]}))
+"""
+
+
+def bench_startup(trains: int, repeats: int, seed: int) -> Dict:
+    """Fresh-process import, warm-up and first-request latency, with and without warm-up"""
+    import subprocess
+    import tempfile
+
+    payload = generate_instance(trains, 1, seed=seed)
+    here = os.path.dirname(os.path.abspath(__file__))
+    report = {'benchmark': 'startup', 'trains': trains, 'repeats': repeats}
+    for mode in ('cold', 'warm'):
+        runs = []
+        for _ in range(repeats):
+            started = time.time()
+            # Probe requests still go through history, into a throwaway database
+            with tempfile.TemporaryDirectory() as tmp:
+                env = dict(os.environ, HISTORY_DB=os.path.join(tmp, 'history.sqlite3'))
+                out = subprocess.run([sys.executable, '-c', STARTUP_PROBE, mode, json.dumps(payload)],
+                                     cwd=here, env=env, capture_output=True, text=True, check=True)
+            run = json.loads(out.stdout.strip().splitlines()[-1])
+            run['process_seconds'] = time.time() - started
+            runs.append(run)
+        report[mode] = {key: round(sorted(r[key] for r in runs)[len(runs) // 2], 3) for key in runs[0]}
+    return report
+
+
+def bench_tracks(trains: int, segments: int, direction_change_headway: int, seed: int) -> Dict:
+    """Model build time on a mixed-direction instance, directed vs single-track blocks"""
+    from solver import segment_key, track_key
+
+    payload = generate_instance(trains, segments, seed=seed, horizon_seconds=6 * 3600)
+    rng = random.Random(seed)
+    for train in payload['trains']:
+        if rng.random() < 0.5:
+            train['current_station'], train['next_station'] = train['next_station'], train['current_station']
+
+    def legacy_scan(parsed, params, key):
+        # The all-pairs conflict scan build_model used before the block index
+        return sum(1 for i in range(len(parsed)) for j in range(i + 1, len(parsed))
+                   if key(parsed[i], params) == key(parsed[j], params))
+
+    report = {'benchmark': 'tracks', 'trains': trains, 'segments': segments}
+    modes = {
+        'directed': {},
+        'single_track': {'single_track': True},
+        'single_track_direction_change': {'single_track': True,
+                                          'direction_change_headway_seconds': direction_change_headway}
+    }
+    for mode, overrides in modes.items():
+        run = copy.deepcopy(payload)
+        run['solver_params'].update(overrides)
+        optimizer = TrainOptimizer()
+        parsed, params = optimizer.parse_input(run)
+        _, build_seconds = timed(optimizer.build_model, parsed, params)
+        key = track_key if params.single_track else (lambda train, _: segment_key(train))
+        pairs, scan_seconds = timed(legacy_scan, parsed, params, key)
+        assert pairs == optimizer.preprocessing['ordering_pairs']
+        report[mode] = {
+            'build_seconds': round(build_seconds, 3),
+            'legacy_scan_seconds': round(scan_seconds, 3),
+            'ordering_pairs': optimizer.preprocessing['ordering_pairs'],
+            'order_variables': optimizer.preprocessing['ordering_pairs'] - len(optimizer.fixed_orders)
+        }
+    return report
+
+
+def bench_bounds(trains: int, segments: int, gap_limit: float, time_limit: int, seed: int) -> Dict:
+    """Lower-bound cost and solve time saved by bound cuts and gap-based stopping"""
+    from bounds import lower_bound
+    from solver import solve_trains
+
+    payload = generate_instance(trains, segments, seed=seed, horizon_seconds=3 * 3600)
+    payload['solver_params'].update(max_hold_minutes=None, time_limit_seconds=time_limit,
+                                    cpsat_profile='default')
+    parsed, params = TrainOptimizer().parse_input(payload)
+    bound, bound_seconds = timed(lower_bound, parsed, params)
+    report = {'benchmark': 'bounds', 'trains': trains, 'segments': segments,
+              'lower_bound': bound.value, 'bound_seconds': round(bound_seconds, 4)}
+
+    # exact_max_trains=0 sends every component to CP-SAT, where the bounds apply
+    modes = {
+        'no_bounds': {'lower_bounds': False},
+        'bounds': {},
+        f'bounds_gap_{gap_limit}': {'gap_limit': gap_limit}
+    }
+    for mode, overrides in modes.items():
+        run = copy.deepcopy(payload)
+        run['solver_params'].update(engine='auto', exact_max_trains=0, **overrides)
+        optimizer = TrainOptimizer()
+        run_trains, run_params = optimizer.parse_input(run)
+        result, seconds = timed(solve_trains, optimizer, run_trains, run_params)
+        meta = result['solver_meta']
+        report[mode] = {
+            'seconds': round(seconds, 3),
+            'status': meta['status'],
+            'objective_value': meta['objective_value'],
+            'gap': round(meta['gap'], 4)
+        }
+    return report
+
+
+def bench_history(runs: int, trains: int, seed: int) -> Dict:
+    """record() latency on the request path, writer throughput and query times"""
+    import tempfile
+    from history import HistoryStore
+    from lns import list_schedule
+    from solver import schedule_row
+
+    payload = generate_instance(trains, max(1, trains // 10), seed=seed, horizon_seconds=3 * 3600)
+    parsed, params = TrainOptimizer().parse_input(payload)
+    result = {
+        'solver_meta': {'status': 'FEASIBLE', 'objective_value': 0.0, 'solve_time_seconds': 0.5,
+                        'engine': 'auto'},
+        'results': [schedule_row(t, s) for t, s in zip(parsed, list_schedule(parsed, params.headway_seconds))]
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = HistoryStore(os.path.join(tmp, 'history.sqlite3'))
+        now = time.time()
+        latencies = []
+        started = time.perf_counter()
+        for k in range(runs):
+            # Spread over a fortnight so time-range queries have something to skip
+            created = now - (runs - k) * 14 * 86400 / runs
+            begin = time.perf_counter()
+            store.record(dict(payload, run_id=f'bench_{k}'), result, created)
+            latencies.append(time.perf_counter() - begin)
+        store.flush(timeout=600)
+        write_seconds = time.perf_counter() - started
+
+        train_no = payload['trains'][0]['train_no']
+        queries = {
+            'holds_one_train_week': lambda: store.holds(train_no, since=now - 7 * 86400, limit=100000),
+            'results_one_segment_day': lambda: store.results(
+                segment=[payload['trains'][0]['current_station'], payload['trains'][0]['next_station']],
+                since=now - 86400, limit=100000),
+            'solve_times_hourly': lambda: store.solve_time_stats(3600),
+            'compare_two_runs': lambda: store.compare('bench_0', f'bench_{runs - 1}')
+        }
+        timings = {}
+        for name, query in queries.items():
+            rows, seconds = timed(query)
+            timings[name] = {'seconds': round(seconds, 4),
+                             'rows': len(rows) if isinstance(rows, list) else rows['trains_compared']}
+        compacted, compact_seconds = timed(store.compact)
+        latencies.sort()
+        return {
+            'benchmark': 'history',
+            'runs': runs,
+            'trains_per_run': trains,
+            'record_p50_us': round(latencies[len(latencies) // 2] * 1e6, 1),
+            'record_p99_us': round(latencies[int(len(latencies) * 0.99)] * 1e6, 1),
+            'write_rows_per_second': round(runs * trains / write_seconds),
+            'queries': timings,
+            'compaction': dict(compacted, seconds=round(compact_seconds, 3)),
+            'stats': store.stats()
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Optimizer benchmarks')
+    sub = parser.add_subparsers(dest='benchmark', required=True)
+
+    inc = sub.add_parser('incremental', help='Dirty-segment re-solve vs full solve')
+    inc.add_argument('--segments', type=int, default=300)
+    inc.add_argument('--trains-per-segment', type=int, default=5)
+    inc.add_argument('--changed', default='1,10,50', help='Comma-separated changed segment counts')
+    inc.add_argument('--seed', type=int, default=7)
+    inc.add_argument('--time-limit', type=int, default=10)
+
+    lns = sub.add_parser('lns', help='Large neighbourhood search on a large instance')
+    lns.add_argument('--trains', type=int, default=10000)
+    lns.add_argument('--segments', type=int, default=200)
+    lns.add_argument('--horizon-hours', type=float, default=6)
+    lns.add_argument('--time-limit', type=int, default=30)
+    lns.add_argument('--neighbourhood-size', type=int, default=20)
+    lns.add_argument('--strategy', default='mixed')
+    lns.add_argument('--seed', type=int, default=7)
+    lns.add_argument('--compare-cpsat', action='store_true', help='Also run one full CP-SAT solve')
+
+    disp = sub.add_parser('dispatch', help='Small single-segment /solve latency by engine')
+    disp.add_argument('--sizes', default='3,8,15,25')
+    disp.add_argument('--repeats', type=int, default=20)
+    disp.add_argument('--seed', type=int, default=7)
+
+    sim = sub.add_parser('simulate', help='Monte Carlo delay simulation throughput')
+    sim.add_argument('--trains', type=int, default=2000)
+    sim.add_argument('--segments', type=int, default=100)
+    sim.add_argument('--samples', type=int, default=10000)
+    sim.add_argument('--seed', type=int, default=7)
+
+    val = sub.add_parser('validate', help='Schedule validator throughput')
+    val.add_argument('--trains', type=int, default=100000)
+    val.add_argument('--segments', type=int, default=2000)
+    val.add_argument('--seed', type=int, default=7)
+
+    cor = sub.add_parser('corridor', help='Occupancy statistics throughput')
+    cor.add_argument('--trains', type=int, default=100000)
+    cor.add_argument('--segments', type=int, default=2000)
+    cor.add_argument('--bucket-seconds', type=int, default=900)
+    cor.add_argument('--seed', type=int, default=7)
+
+    spa = sub.add_parser('spatial', help='Live position snapping throughput')
+    spa.add_argument('--positions', type=int, default=100000)
+    spa.add_argument('--stations', type=int, default=2000)
+    spa.add_argument('--seed', type=int, default=7)
+
+    sta = sub.add_parser('startup', help='Worker start-up and first-request latency')
+    sta.add_argument('--trains', type=int, default=8)
+    sta.add_argument('--repeats', type=int, default=3)
+    sta.add_argument('--seed', type=int, default=7)
+
+    trk = sub.add_parser('tracks', help='Model build time with single-track blocks')
+    trk.add_argument('--trains', type=int, default=4000)
+    trk.add_argument('--segments', type=int, default=200)
+    trk.add_argument('--direction-change-headway', type=int, default=300)
+    trk.add_argument('--seed', type=int, default=7)
+
+    bnd = sub.add_parser('bounds', help='Lower bounds and gap-based early termination')
+    bnd.add_argument('--trains', type=int, default=300)
+    bnd.add_argument('--segments', type=int, default=20)
+    bnd.add_argument('--gap-limit', type=float, default=0.01)
+    bnd.add_argument('--time-limit', type=int, default=10)
+    bnd.add_argument('--seed', type=int, default=11)
+
+    his = sub.add_parser('history', help='Solve-history write path and query latency')
+    his.add_argument('--runs', type=int, default=2000)
+    his.add_argument('--trains', type=int, default=200)
+    his.add_argument('--seed', type=int, default=7)
+
+    args = parser.parse_args()
+
+    if args.benchmark == 'incremental':
+        report = bench_incremental(args.segments, args.trains_per_segment,
+                                   [int(k) for k in args.changed.split(',')], args.seed,
+                                   args.time_limit)
+    elif args.benchmark == 'lns':
+        report = bench_lns(args.trains, args.segments, args.horizon_hours, args.time_limit,
+                           args.neighbourhood_size, args.strategy, args.seed, args.compare_cpsat)
+    elif args.benchmark == 'dispatch':
+        report = bench_dispatch([int(n) for n in args.sizes.split(',')], args.repeats, args.seed)
+    elif args.benchmark == 'simulate':
+        report = bench_simulate(args.trains, args.segments, args.samples, args.seed)
+    elif args.benchmark == 'validate':
+        report = bench_validate(args.trains, args.segments, args.seed)
+    elif args.benchmark == 'corridor':
+        report = bench_corridor(args.trains, args.segments, args.bucket_seconds, args.seed)
+    elif args.benchmark == 'spatial':
+        report = bench_spatial(args.positions, args.stations, args.seed)
+    elif args.benchmark == 'startup':
+        report = bench_startup(args.trains, args.repeats, args.seed)
+    elif args.benchmark == 'tracks':
+        report = bench_tracks(args.trains, args.segments, args.direction_change_headway, args.seed)
+    elif args.benchmark == 'bounds':
+        report = bench_bounds(args.trains, args.segments, args.gap_limit, args.time_limit, args.seed)
+    elif args.benchmark == 'history':
+        report = bench_history(args.runs, args.trains, args.seed)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Lower bounds on weighted delay
+Every block is a single machine with release dates: train j holds it for
+travel + headway after entering, and the objective is sum w_j (S_j - r_j).
+Dropping the horizon, hold limits and the coupling between blocks leaves
+1|r_j|sum w_j C_j per block, bounded below by the split-job relaxation of
+Belouadah, Posner and Potts: preemptive WSPT (highest w/p first, preempting
+on release) is optimal once every job may be split at its preemption
+points, and adding back the cost of splitting gives a valid bound. One
+heap sweep per block, O(n log n), a fraction of the time of building the
+CP-SAT model. Opposing trains on single track use the smaller of the two
+headways, which keeps the relaxation valid.
+"""
+
+import heapq
+import math
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from solver import SolverParams, Train, conflict_groups
+
+SINGLE_MACHINE = 'single_machine'
+CPSAT = 'cpsat'
+
+
+@dataclass
+class LowerBound:
+    value: int
+    by_block: Dict[Tuple[str, str], int] = field(default_factory=dict)
+    source: str = SINGLE_MACHINE
+
+
+def single_machine_bound(release: List[int], processing: List[int], weight: List[int]) -> int:
+    """Lower bound on sum w_j (S_j - r_j) for jobs on one machine with release dates"""
+    jobs = sorted((r, k) for k, r in enumerate(release) if processing[k] > 0)
+    if not jobs:
+        return 0
+    t0 = jobs[0][0]  # relative times keep the products small and exact
+    remaining = {k: processing[k] for _, k in jobs}
+    done = {k: 0 for _, k in jobs}  # processed so far
+    cost = {k: 0 for _, k in jobs}  # sum over pieces of len * C plus len * earlier lengths
+
+    heap = []
+    t = 0
+    n = 0
+    while n < len(jobs) or heap:
+        if not heap:
+            t = max(t, jobs[n][0] - t0)
+        while n < len(jobs) and jobs[n][0] - t0 <= t:
+            k = jobs[n][1]
+            heapq.heappush(heap, (-weight[k] / processing[k], k))
+            n += 1
+        ratio, k = heap[0]
+        next_release = jobs[n][0] - t0 if n < len(jobs) else math.inf
+        run = min(remaining[k], next_release - t)
+        t += run
+        cost[k] += run * t + run * done[k]
+        done[k] += run
+        remaining[k] -= run
+        if remaining[k] == 0:
+            heapq.heappop(heap)
+
+    completion = sum(weight[k] * cost[k] / processing[k] for k in cost)
+    baseline = sum(weight[k] * (release[k] - t0 + processing[k]) for k in cost)
+    # Guard against float rounding; the true optimum is an integer
+    return max(0, math.ceil(completion - baseline - 1e-6))
+
+
+def lower_bound(trains: List[Train], params: SolverParams,
+                fixed_starts: Optional[Dict[int, int]] = None) -> LowerBound:
+    """Sum of per-block single-machine bounds on the weighted-delay objective"""
+    fixed_starts = fixed_starts or {}
+    headway = params.headway_seconds
+    if params.direction_change_headway_seconds is not None:
+        headway = min(headway, params.direction_change_headway_seconds)
+
+    by_block = {}
+    for key, group in conflict_groups(trains, params).items():
+        release, processing, weight = [], [], []
+        pinned_cost = 0
+        for i in group:
+            train = trains[i]
+            r = train.earliest_entry_seconds
+            if i in fixed_starts:
+                # A pinned train starts exactly there: its own delay is a constant
+                pinned_cost += train.priority_score * (fixed_starts[i] - r)
+                r = fixed_starts[i]
+            release.append(r)
+            processing.append(train.travel_time_seconds + headway)
+            weight.append(train.priority_score)
+        by_block[key] = pinned_cost + single_machine_bound(release, processing, weight)
+    return LowerBound(sum(by_block.values()), by_block)
+
+
+def relative_gap(objective: float, bound: float) -> float:
+    """Gap of an incumbent to a lower bound, as a fraction of the incumbent"""
+    if objective <= bound:
+        return 0.0
+    return (objective - bound) / max(abs(objective), 1e-9)
+
+
+def gap_stopper(bound: int, gap_limit: float = 0.0):
+    """CP-SAT solution callback that stops the search once the incumbent is
+    within gap_limit of bound (at the bound itself when gap_limit is 0)"""
+    from ortools.sat.python import cp_model
+
+    class GapStop(cp_model.CpSolverSolutionCallback):
+        def __init__(self):
+            super().__init__()
+            self.stopped = False
+
+        def on_solution_callback(self):
+            if relative_gap(self.ObjectiveValue(), bound) <= gap_limit:
+                self.stopped = True
+                self.StopSearch()
+
+    return GapStop()
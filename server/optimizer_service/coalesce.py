@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Single-flight coalescing of identical solves
+Requests whose canonical input is identical while one of them is still
+solving attach to that solve instead of starting their own; every caller
+gets a private copy of the result so per-request fields such as run_id do
+not leak between them. Nothing is cached once the solve finishes.
+"""
+
+import copy
+import hashlib
+import json
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Fields that identify the request, not the instance
+PER_REQUEST_FIELDS = ('run_id',)
+
+
+def canonical_key(input_data: Dict) -> str:
+    """Digest of the solver input, independent of key order and per-request fields"""
+    canonical = {k: v for k, v in input_data.items() if k not in PER_REQUEST_FIELDS}
+    text = json.dumps(canonical, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; concurrent callers share its outcome"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flights: Dict[str, _Flight] = {}
+        self.counters = {'requests': 0, 'executed': 0, 'coalesced': 0, 'errors': 0,
+                         'max_waiters': 0}
+
+    def do(self, key: Optional[str], fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """(result, shared): shared is True when another caller's call produced it"""
+        if key is None:
+            with self.lock:
+                self.counters['requests'] += 1
+                self.counters['executed'] += 1
+            return fn(), False
+
+        with self.lock:
+            self.counters['requests'] += 1
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = _Flight()
+                self.counters['executed'] += 1
+            else:
+                flight.waiters += 1
+                self.counters['coalesced'] += 1
+                self.counters['max_waiters'] = max(self.counters['max_waiters'], flight.waiters)
+
+        if leader:
+            try:
+                flight.result = fn()
+            except BaseException as e:
+                flight.error = e
+                with self.lock:
+                    self.counters['errors'] += 1
+            finally:
+                with self.lock:
+                    del self.flights[key]
+                flight.done.set()
+        else:
+            flight.done.wait()
+
+        if flight.error is not None:
+            raise flight.error
+        # Leader and followers each get their own copy to annotate
+        return copy.deepcopy(flight.result), not leader
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return dict(self.counters, in_flight=len(self.flights))
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Segment occupancy and corridor statistics
+Indexes a schedule (optimized or as-is) as occupancy intervals
+[entry, entry + travel) per segment, sorted once by (segment, time). Every
+statistic is then array work over that order:
+  - utilization per bucket from prefix sums of sorted entries and exits,
+  - peak concurrency from a +1/-1 event sweep,
+  - headway margins between consecutive trains on a segment,
+  - the most congested (segment, bucket) windows.
+Segments are offset into disjoint time bands so all of them are handled in
+the same sort and search calls, with no pairwise scans. With params,
+trains are grouped per block (track_key), so a single-track block carries
+both directions and an opposing successor's margin uses the
+direction-change headway (pair_headway).
+"""
+
+import time
+from datetime import datetime, timezone
+from typing import Dict, List
+
+import numpy as np
+
+from solver import Train, segment_key, track_key
+
+
+def _iso(epoch: float) -> str:
+    return datetime.fromtimestamp(int(epoch), tz=timezone.utc).isoformat()
+
+
+def _percentiles(values: np.ndarray) -> Dict:
+    if values.size == 0:
+        return {'count': 0}
+    p10, p50, p90 = np.percentile(values, [10, 50, 90])
+    return {
+        'count': int(values.size),
+        'min': int(values.min()),
+        'p10': float(p10),
+        'p50': float(p50),
+        'p90': float(p90),
+        'mean': round(float(values.mean()), 1),
+        'below_zero': int((values < 0).sum())
+    }
+
+
+class OccupancyIndex:
+    """Occupancy intervals of one schedule, grouped and sorted by segment"""
+
+    def __init__(self, trains: List[Train], starts: List[int], headway: int, params=None):
+        self.headway = headway
+        self.opposing_headway = headway
+        if params is not None and params.direction_change_headway_seconds is not None:
+            self.opposing_headway = params.direction_change_headway_seconds
+        keys = {}
+        resources = [track_key(t, params) for t in trains]
+        seg = np.array([keys.setdefault(r, len(keys)) for r in resources], dtype=np.int64)
+        direction = np.array([segment_key(t) != r for t, r in zip(trains, resources)], dtype=np.int64)
+        self.segments = list(keys)
+        self.n_seg = len(keys)
+
+        start = np.asarray(starts, dtype=np.int64)
+        end = start + np.array([t.travel_time_seconds for t in trains], dtype=np.int64)
+        self.t0 = int(start.min()) if len(trains) else 0
+        self.t1 = int(end.max()) if len(trains) else 0
+        # Band width: every segment's times fit in [seg * span, (seg + 1) * span)
+        self.span = self.t1 - self.t0 + 1
+
+        order = np.lexsort((start, seg))
+        self.seg = seg[order]
+        self.start = start[order]
+        self.end = end[order]
+        self.direction = direction[order]
+        self.train_no = [trains[i].train_no for i in order]
+        self.seg_begin = np.searchsorted(self.seg, np.arange(self.n_seg + 1))
+        self.counts = np.diff(self.seg_begin)
+
+        # Exits sorted separately: intervals may overlap in an unvalidated plan
+        end_order = np.lexsort((self.end, self.seg))
+        self.banded_start = self.seg * self.span + (self.start - self.t0)
+        self.banded_end = self.seg * self.span + (self.end[end_order] - self.t0)
+        self.start_prefix = np.concatenate(([0], np.cumsum(self.start - self.t0)))
+        self.end_prefix = np.concatenate(([0], np.cumsum(self.end[end_order] - self.t0)))
+
+    def occupied_before(self, edges: np.ndarray) -> np.ndarray:
+        """Train-seconds on each segment before each edge: (segments, edges)"""
+        rel = np.clip(edges - self.t0, 0, self.span - 1)
+        base = (np.arange(self.n_seg) * self.span)[:, None]
+        query = base + rel[None, :]
+        first = self.seg_begin[:-1, None]
+
+        started = np.searchsorted(self.banded_start, query, side='left')
+        ended = np.searchsorted(self.banded_end, query, side='left')
+        # sum over started (edge - start) minus sum over ended (edge - end)
+        n_started = started - first
+        n_ended = ended - first
+        sum_started = self.start_prefix[started] - self.start_prefix[first]
+        sum_ended = self.end_prefix[ended] - self.end_prefix[first]
+        return (n_started - n_ended) * rel[None, :] - sum_started + sum_ended
+
+    def utilization(self, bucket_seconds: int) -> Dict:
+        """Occupied fraction of each bucket per segment; above 1 means overlapping trains"""
+        n_buckets = max(1, -(-(self.t1 - self.t0) // bucket_seconds))
+        edges = self.t0 + bucket_seconds * np.arange(n_buckets + 1)
+        busy = np.diff(self.occupied_before(edges), axis=1)
+        return {'edges': edges, 'busy': busy, 'utilization': busy / bucket_seconds}
+
+    def peak_concurrency(self):
+        """Highest number of trains inside each segment at once, and when"""
+        # Exits sort before entries at the same instant: back-to-back is not overlap
+        times = np.concatenate((self.banded_end, self.banded_start))
+        steps = np.concatenate((np.full(self.end.size, -1), np.ones(self.start.size, dtype=np.int64)))
+        order = np.lexsort((steps, times))
+        level = np.cumsum(steps[order])
+        event_seg = times[order] // self.span
+
+        peak = np.zeros(self.n_seg, dtype=np.int64)
+        peak_at = np.full(self.n_seg, self.t0, dtype=np.int64)
+        if level.size:
+            np.maximum.at(peak, event_seg, level)
+            hit = np.flatnonzero(level == peak[event_seg])
+            segs, first = np.unique(event_seg[hit], return_index=True)
+            peak_at[segs] = times[order][hit[first]] - segs * self.span + self.t0
+        return peak, peak_at
+
+    def headway_margins(self) -> np.ndarray:
+        """Slack between each train's exit plus headway and the next entry on its segment"""
+        same = self.seg[1:] == self.seg[:-1]
+        gap = np.where(self.direction[1:] != self.direction[:-1], self.opposing_headway, self.headway)
+        return (self.start[1:] - (self.end[:-1] + gap))[same]
+
+    def segment_margins(self, margins_all: np.ndarray) -> List[np.ndarray]:
+        # Margin k belongs to the segment of the later train of pair k
+        same = self.seg[1:] == self.seg[:-1]
+        owners = self.seg[1:][same]
+        cuts = np.searchsorted(owners, np.arange(1, self.n_seg))
+        return np.split(margins_all, cuts)
+
+
+def corridor_stats(trains: List[Train], starts: List[int], headway: int,
+                   bucket_seconds: int = 900, top_windows: int = 10, params=None) -> Dict:
+    """Utilization, concurrency, headway margins and congested windows of one schedule"""
+    started = time.time()
+    if bucket_seconds <= 0:
+        raise ValueError('bucket_seconds must be positive')
+    index = OccupancyIndex(trains, starts, headway, params)
+    util = index.utilization(bucket_seconds)
+    utilization = util['utilization']
+    peak, peak_at = index.peak_concurrency()
+    margins = index.headway_margins()
+    per_segment_margins = index.segment_margins(margins)
+
+    # Most congested windows across the corridor
+    flat = utilization.ravel()
+    k = min(top_windows, flat.size)
+    top = np.argpartition(-flat, k - 1)[:k] if k else np.array([], dtype=np.int64)
+    top = top[np.argsort(-flat[top], kind='stable')]
+    n_buckets = utilization.shape[1]
+    windows = [{
+        'segment': '{}->{}'.format(*index.segments[i // n_buckets]),
+        'window_start_iso': _iso(util['edges'][i % n_buckets]),
+        'window_end_iso': _iso(util['edges'][i % n_buckets + 1]),
+        'utilization': round(float(flat[i]), 4)
+    } for i in top if flat[i] > 0]
+
+    segments = []
+    for s, key in enumerate(index.segments):
+        seg_margins = per_segment_margins[s]
+        segments.append({
+            'segment': f'{key[0]}->{key[1]}',
+            'trains': int(index.counts[s]),
+            'busy_seconds': int(util['busy'][s].sum()),
+            'peak_utilization': round(float(utilization[s].max()), 4),
+            'peak_concurrency': int(peak[s]),
+            'peak_concurrency_at_iso': _iso(peak_at[s]),
+            'min_headway_margin_seconds': int(seg_margins.min()) if seg_margins.size else None,
+            'utilization': [round(float(u), 4) for u in utilization[s]]
+        })
+
+    return {
+        'corridor_meta': {
+            'trains': len(trains),
+            'segments': index.n_seg,
+            'bucket_seconds': bucket_seconds,
+            'window_start_iso': _iso(index.t0),
+            'window_end_iso': _iso(index.t1),
+            'buckets': [_iso(e) for e in util['edges'][:-1]],
+            'mean_utilization': [round(float(u), 4) for u in utilization.mean(axis=0)],
+            'peak_concurrency': int(peak.max()) if peak.size else 0,
+            'segments_with_overlap': int((peak > 1).sum()),
+            'headway_margin_seconds': _percentiles(margins),
+            'stats_time_seconds': time.time() - started
+        },
+        'congested_windows': windows,
+        'segments': segments
+    }
+
+
+def compare_stats(before: Dict, after: Dict) -> Dict:
+    """Headline differences between an as-is and an optimized schedule"""
+    b, a = before['corridor_meta'], after['corridor_meta']
+    b_margin, a_margin = b['headway_margin_seconds'], a['headway_margin_seconds']
+    return {
+        'peak_concurrency': {'before': b['peak_concurrency'], 'after': a['peak_concurrency']},
+        'segments_with_overlap': {'before': b['segments_with_overlap'],
+                                  'after': a['segments_with_overlap']},
+        'headway_breaches': {'before': b_margin.get('below_zero', 0),
+                             'after': a_margin.get('below_zero', 0)},
+        'min_headway_margin_seconds': {'before': b_margin.get('min'), 'after': a_margin.get('min')},
+        'busiest_window_utilization': {
+            'before': before['congested_windows'][0]['utilization'] if before['congested_windows'] else 0,
+            'after': after['congested_windows'][0]['utilization'] if after['congested_windows'] else 0
+        }
+    }
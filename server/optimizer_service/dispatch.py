@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Solver dispatch
+Splits an instance into independent components (trains that can never
+conflict share no constraint) and routes each one by size:
+  - trivial: a lone train proceeds at its release time
+  - exact:   single-segment branch and bound (exact.py), proven optimal
+  - cpsat:   TrainOptimizer on just that component
+  - lns:     list-schedule heuristic improved by LNS (lns.py)
+An exact search that runs out of nodes falls back to CP-SAT; a component
+CP-SAT returns no schedule for (UNKNOWN) falls back to the release-order
+list schedule, so the merged plan always covers every train.
+"""
+
+import time
+from dataclasses import replace
+from typing import Dict, List, Optional, Tuple
+
+from bounds import relative_gap
+from exact import solve_single_segment, OPTIMAL as EXACT_OPTIMAL
+from solver import (Train, SolverParams, TrainOptimizer, conflict_groups, schedule_row,
+                    segment_key)
+
+# Statuses from best to worst; a merged run reports the worst component status
+STATUS_RANK = ['OPTIMAL', 'FEASIBLE', 'UNKNOWN', 'INFEASIBLE']
+
+MIN_COMPONENT_TIME_LIMIT = 0.05
+
+NO_PREPROCESSING = {'ordering_pairs': 0, 'fixed_by_dominance': 0, 'fixed_by_symmetry': 0}
+
+
+def components(trains: List[Train], params: Optional[SolverParams] = None) -> Dict[Tuple[str, str], List[Train]]:
+    """Independent sub-instances, keyed by block (track_key)"""
+    return {key: [trains[i] for i in group] for key, group in conflict_groups(trains, params).items()}
+
+
+def classify(component: List[Train], params: SolverParams) -> str:
+    """Engine for one component"""
+    if len(component) == 1:
+        return 'trivial'
+    if len(component) <= params.exact_max_trains and not _direction_headways(component, params):
+        return 'exact'
+    if len(component) > params.lns_threshold_trains:
+        return 'lns'
+    return 'cpsat'
+
+
+def _direction_headways(component: List[Train], params: SolverParams) -> bool:
+    """Opposing trains with their own headway: not a single machine with one setup time"""
+    if params.direction_change_headway_seconds in (None, params.headway_seconds):
+        return False
+    return len({segment_key(train) for train in component}) > 1
+
+
+def component_params(params: SolverParams, time_limit: float) -> SolverParams:
+    return replace(params, time_limit_seconds=time_limit, engine='cpsat')
+
+
+def solve_component(component: List[Train], params: SolverParams, time_limit: float,
+                    engine: str = None) -> Dict:
+    """Solve one component and return a /solve-shaped result"""
+    started = time.time()
+    engine = engine or classify(component, params)
+
+    if engine == 'trivial':
+        train = component[0]
+        return {
+            'solver_meta': {'status': 'OPTIMAL', 'objective_value': 0.0,
+                            'solve_time_seconds': time.time() - started, 'engine': engine,
+                            'preprocessing': dict(NO_PREPROCESSING)},
+            'results': [schedule_row(train, train.earliest_entry_seconds)]
+        }
+
+    if engine == 'exact':
+        # Same horizon as the CP-SAT model: last release + 1 hour
+        max_start = max(t.earliest_entry_seconds for t in component) + 3600
+        exact = solve_single_segment(component, params.headway_seconds, max_start,
+                                     node_limit=params.exact_node_limit,
+                                     use_dominance=params.fix_dominated_orders)
+        if exact.status == EXACT_OPTIMAL:
+            return {
+                'solver_meta': {'status': 'OPTIMAL', 'objective_value': float(exact.objective),
+                                'solve_time_seconds': time.time() - started, 'engine': engine,
+                                'nodes': exact.nodes, 'preprocessing': exact.preprocessing},
+                'results': [schedule_row(t, s) for t, s in zip(component, exact.starts)]
+            }
+        # Node limit or no schedule inside the horizon: let CP-SAT decide
+        engine = 'cpsat'
+
+    sub_params = component_params(params, max(MIN_COMPONENT_TIME_LIMIT, time_limit))
+    if engine == 'lns':
+        from lns import LNSOptimizer, LNSParams
+        return LNSOptimizer(LNSParams.from_dict(params.lns)).solve(component, sub_params)
+
+    optimizer = TrainOptimizer()
+    optimizer.build_model(component, sub_params)
+    solution = optimizer.solve()
+    if not solution['results']:
+        solution = list_schedule_fallback(component, params, solution)
+    return solution
+
+
+def list_schedule_fallback(component: List[Train], params: SolverParams, solution: Dict) -> Dict:
+    """Release-order schedule for a component CP-SAT found no solution for"""
+    from lns import list_schedule, weighted_delay
+
+    starts = list_schedule(component, params.headway_seconds, params)
+    solution['solver_meta'].update({
+        'objective_value': float(weighted_delay(component, starts, range(len(component)))),
+        'fallback': 'list_schedule'
+    })
+    solution['results'] = [schedule_row(t, s) for t, s in zip(component, starts)]
+    return solution
+
+
+def merge_results(trains: List[Train], solutions: List[Dict]) -> Dict:
+    """Combine per-component results into one result in input train order"""
+    result_by_train = {}
+    objective_value = 0
+    lower = 0
+    sources = set()
+    worst = 0
+    preprocessing = dict(NO_PREPROCESSING)
+    fallbacks = 0
+    for solution in solutions:
+        meta = solution['solver_meta']
+        for name, count in meta.get('preprocessing', {}).items():
+            preprocessing[name] = preprocessing.get(name, 0) + count
+        fallbacks += 'fallback' in meta
+        objective_value += meta['objective_value']
+        status = meta['status']
+        worst = max(worst, STATUS_RANK.index(status) if status in STATUS_RANK else 2)
+        if status == 'OPTIMAL':
+            # A proven component bounds itself
+            lower += meta['objective_value']
+            sources.add(meta.get('bound_source', 'exact'))
+        elif meta.get('lower_bound') is not None:
+            lower += meta['lower_bound']
+            sources.add(meta['bound_source'])
+        for row in solution['results']:
+            result_by_train[row['train_no']] = row
+    meta = {
+        'status': STATUS_RANK[worst],
+        'objective_value': objective_value,
+        'lower_bound': lower,
+        'bound_source': sources.pop() if len(sources) == 1 else 'mixed' if sources else None,
+        'gap': relative_gap(objective_value, lower),
+        'preprocessing': preprocessing
+    }
+    if fallbacks:
+        meta['fallback_components'] = fallbacks
+    unscheduled = [t.train_no for t in trains if t.train_no not in result_by_train]
+    if unscheduled:
+        # Never hand back a partial plan without saying so
+        meta['status'] = STATUS_RANK[max(worst, STATUS_RANK.index('UNKNOWN'))]
+        meta['unscheduled'] = unscheduled
+    return {
+        'solver_meta': meta,
+        'results': [result_by_train[t.train_no] for t in trains if t.train_no in result_by_train]
+    }
+
+
+def dispatch(trains: List[Train], params: SolverParams) -> Dict:
+    """Classify every component, solve it with its engine and merge"""
+    started = time.time()
+    deadline = started + params.time_limit_seconds
+    parts = list(components(trains, params).values())
+    engines = [classify(part, params) for part in parts]
+
+    # Cheap engines first; the heavy ones share what is left of the time limit
+    order = sorted(range(len(parts)), key=lambda k: (engines[k] in ('cpsat', 'lns'), len(parts[k])))
+    solutions = [None] * len(parts)
+    used = {}
+    heavy_left = sum(len(parts[k]) ** 2 for k in order if engines[k] in ('cpsat', 'lns'))
+    for n, k in enumerate(order):
+        if engines[k] in ('cpsat', 'lns'):
+            size = len(parts[k]) ** 2
+            share = (deadline - time.time()) * size / max(1, heavy_left)
+            heavy_left -= size
+        else:
+            # Only used if an exact search has to fall back to CP-SAT
+            share = (deadline - time.time()) / (len(order) - n)
+        solutions[k] = solve_component(parts[k], params, share, engines[k])
+        solved_by = solutions[k]['solver_meta'].get('engine', engines[k])
+        used[solved_by] = used.get(solved_by, 0) + 1
+
+    result = merge_results(trains, solutions)
+    result['solver_meta'].update({
+        'solve_time_seconds': time.time() - started,
+        'engine': 'auto',
+        'dispatch': {
+            'components': len(parts),
+            'largest_component': max((len(p) for p in parts), default=0),
+            'engines': used
+        }
+    })
+    return result
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Dominance and symmetry rules for ordering decisions
+Two trains on the same segment with the same travel time can swap start
+times without affecting anyone else. If one of them is released no later
+and weighs at least as much, the swap never increases weighted delay, so
+that train can always go first. Trains identical in release, travel time
+and priority are interchangeable and are ordered by input position.
+
+Shorter travel time alone is not enough: with release dates, running the
+longer train later can push back every train behind it.
+"""
+
+from typing import Optional, Tuple
+
+DOMINANCE = 'dominance'
+SYMMETRY = 'symmetry'
+
+
+def dominance_order(train_i, train_j) -> Optional[Tuple[bool, str]]:
+    """Return (i_first, rule) when the order of i (earlier index) and j is fixed"""
+    if train_i.travel_time_seconds != train_j.travel_time_seconds:
+        return None
+
+    r_i, r_j = train_i.earliest_entry_seconds, train_j.earliest_entry_seconds
+    w_i, w_j = train_i.priority_score, train_j.priority_score
+
+    if r_i == r_j and w_i == w_j:
+        # Interchangeable: break the symmetry by input order
+        return True, SYMMETRY
+    if r_i <= r_j and w_i >= w_j:
+        return True, DOMINANCE
+    if r_j <= r_i and w_j >= w_i:
+        return False, DOMINANCE
+    return None
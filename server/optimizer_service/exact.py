@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Exact single-segment scheduler
+One segment is a single machine with release dates: each train occupies it
+for travel time plus headway, and the objective is priority-weighted delay.
+For a fixed sequence the earliest-start timing is optimal, so the search
+runs over sequences: depth-first branch and bound with
+  - dominance precedences from dominance.py,
+  - active-schedule pruning (never idle long enough to fit another train),
+  - per-subset (free time, cost) Pareto memo,
+  - a lower bound of every remaining train starting no earlier than now.
+Small instances are proven optimal without building a CP-SAT model.
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from dominance import dominance_order, DOMINANCE
+
+OPTIMAL = 'OPTIMAL'
+INFEASIBLE = 'INFEASIBLE'
+LIMIT = 'LIMIT'
+
+
+@dataclass
+class ExactResult:
+    status: str
+    starts: List[int] = field(default_factory=list)
+    objective: Optional[int] = None
+    nodes: int = 0
+    preprocessing: Dict[str, int] = field(default_factory=dict)
+
+
+def solve_single_segment(trains: List, headway: int, max_start: Optional[int] = None,
+                         node_limit: int = 200000, use_dominance: bool = True) -> ExactResult:
+    """Optimal start times for trains sharing one segment (input order)"""
+    n = len(trains)
+    if n == 0:
+        return ExactResult(OPTIMAL, [], 0)
+
+    release = [t.earliest_entry_seconds for t in trains]
+    weight = [t.priority_score for t in trains]
+    occupy = [t.travel_time_seconds + headway for t in trains]
+    full = (1 << n) - 1
+
+    # pred[j]: trains that must already be scheduled before j may go
+    pred = [0] * n
+    # Same counters as TrainOptimizer's ordering preprocessing
+    preprocessing = {'ordering_pairs': n * (n - 1) // 2, 'fixed_by_dominance': 0, 'fixed_by_symmetry': 0}
+    if use_dominance:
+        for i in range(n):
+            for j in range(i + 1, n):
+                fixed = dominance_order(trains[i], trains[j])
+                if fixed is None:
+                    continue
+                preprocessing['fixed_by_dominance' if fixed[1] == DOMINANCE else 'fixed_by_symmetry'] += 1
+                if fixed[0]:
+                    pred[j] |= 1 << i
+                else:
+                    pred[i] |= 1 << j
+
+    best_cost = [None]
+    best_seq = [None]
+    nodes = [0]
+    memo = {}
+    seq = []
+
+    # Incumbent from release-order list scheduling
+    order = sorted(range(n), key=lambda k: (release[k], -weight[k]))
+    t = None
+    cost = 0
+    for k in order:
+        s = release[k] if t is None else max(release[k], t)
+        if max_start is not None and s > max_start:
+            cost = None
+            break
+        cost += weight[k] * (s - release[k])
+        t = s + occupy[k]
+    if cost is not None:
+        best_cost[0] = cost
+        best_seq[0] = order
+
+    def search(mask: int, free_at: Optional[int], cost: int) -> bool:
+        """Returns False once the node limit is exceeded"""
+        nodes[0] += 1
+        if nodes[0] > node_limit:
+            return False
+        if mask == full:
+            if best_cost[0] is None or cost < best_cost[0]:
+                best_cost[0] = cost
+                best_seq[0] = list(seq)
+            return True
+
+        remaining = [k for k in range(n) if not mask >> k & 1]
+        bound = cost
+        for k in remaining:
+            if free_at is not None and free_at > release[k]:
+                bound += weight[k] * (free_at - release[k])
+        if best_cost[0] is not None and bound >= best_cost[0]:
+            return True
+
+        # Pareto memo: another path to the same set that is free no later and cheaper
+        key_t = free_at if free_at is not None else -1
+        front = memo.get(mask)
+        if front is not None:
+            for other_t, other_cost in front:
+                if other_t <= key_t and other_cost <= cost:
+                    return True
+            front[:] = [(ot, oc) for ot, oc in front if not (key_t <= ot and cost <= oc)]
+            front.append((key_t, cost))
+        else:
+            memo[mask] = [(key_t, cost)]
+
+        eligible = [k for k in remaining if pred[k] & mask == pred[k]]
+        starts = {k: release[k] if free_at is None else max(release[k], free_at) for k in eligible}
+        # Active schedules only: k must start before any eligible train could finish
+        earliest_done = min(starts[k] + occupy[k] for k in eligible)
+        candidates = [k for k in eligible if starts[k] < earliest_done]
+        candidates.sort(key=lambda k: (starts[k], -weight[k] / occupy[k]))
+
+        for k in candidates:
+            s = starts[k]
+            if max_start is not None and s > max_start:
+                continue
+            seq.append(k)
+            ok = search(mask | 1 << k, s + occupy[k], cost + weight[k] * (s - release[k]))
+            seq.pop()
+            if not ok:
+                return False
+        return True
+
+    completed = search(0, None, 0)
+    if not completed:
+        return ExactResult(LIMIT, nodes=nodes[0], preprocessing=preprocessing)
+    if best_seq[0] is None:
+        return ExactResult(INFEASIBLE, nodes=nodes[0], preprocessing=preprocessing)
+
+    starts = [0] * n
+    t = None
+    for k in best_seq[0]:
+        s = release[k] if t is None else max(release[k], t)
+        starts[k] = s
+        t = s + occupy[k]
+    return ExactResult(OPTIMAL, starts, best_cost[0], nodes[0], preprocessing)
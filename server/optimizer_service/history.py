@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+Solve history
+Every /solve run is appended to a SQLite database: one row per run (input
+digest, corridor, status, timings, the full solver_meta) and one row per
+train result, indexed by train, segment and time so questions such as "all
+holds for train 12951 this week" or "average solve time per corridor per
+hour" are index range scans.
+
+/solve never waits on the database: record() only puts the response on a
+bounded queue; a writer thread owns the connection, writes in batched
+transactions and runs retention and compaction between batches. Readers
+use their own connections (WAL mode), so queries do not block writes.
+
+Retention: runs older than HISTORY_RETENTION_DAYS are deleted; past
+HISTORY_DETAIL_DAYS a run is compacted to its held trains (PROCEED rows
+carry nothing a later query needs beyond the run totals). HISTORY_DB=off
+disables the store.
+
+    python history.py holds --train 12951 --days 7
+    python history.py solve-times --bucket-seconds 3600
+"""
+
+import argparse
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Union
+
+DEFAULT_HISTORY_PATH = os.getenv(
+    'HISTORY_DB',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'history.sqlite3')
+)
+ENABLED = DEFAULT_HISTORY_PATH.lower() not in ('', 'off', 'false', '0')
+RETENTION_DAYS = float(os.getenv('HISTORY_RETENTION_DAYS', '30'))
+DETAIL_DAYS = float(os.getenv('HISTORY_DETAIL_DAYS', '7'))
+QUEUE_SIZE = 10000
+BATCH_SIZE = 200
+COMPACT_EVERY_SECONDS = 3600
+MAX_CORRIDOR_STATIONS = 8
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    run_id TEXT,
+    digest TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    corridor TEXT,
+    status TEXT,
+    engine TEXT,
+    objective_value REAL,
+    solve_time_seconds REAL,
+    trains INTEGER,
+    held_trains INTEGER,
+    total_hold_seconds INTEGER,
+    compacted INTEGER NOT NULL DEFAULT 0,
+    solver_meta TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_created ON runs (created_at);
+CREATE INDEX IF NOT EXISTS runs_corridor ON runs (corridor, created_at);
+CREATE INDEX IF NOT EXISTS runs_digest ON runs (digest);
+CREATE INDEX IF NOT EXISTS runs_run_id ON runs (run_id);
+
+CREATE TABLE IF NOT EXISTS results (
+    run INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    train_no TEXT NOT NULL,
+    segment_from TEXT,
+    segment_to TEXT,
+    entry_epoch INTEGER,
+    hold_seconds INTEGER,
+    action TEXT,
+    priority_score INTEGER
+);
+CREATE INDEX IF NOT EXISTS results_train ON results (train_no, created_at);
+CREATE INDEX IF NOT EXISTS results_segment ON results (segment_from, segment_to, created_at);
+CREATE INDEX IF NOT EXISTS results_run ON results (run);
+"""
+
+Timestamp = Union[float, int, str, None]
+
+
+def epoch(value: Timestamp) -> Optional[float]:
+    """Epoch seconds from an epoch number or an ISO-8601 string"""
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+
+
+def corridor_label(input_data: Dict) -> str:
+    """Explicit payload corridor, else the sorted station set of its trains"""
+    if input_data.get('corridor'):
+        return str(input_data['corridor'])
+    stations = sorted({s for t in input_data.get('trains', [])
+                       for s in (t.get('current_station'), t.get('next_station')) if s})
+    label = '-'.join(stations[:MAX_CORRIDOR_STATIONS])
+    if len(stations) > MAX_CORRIDOR_STATIONS:
+        label += f'+{len(stations) - MAX_CORRIDOR_STATIONS}'
+    return label
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+
+class HistoryStore:
+    """Append-only solve history with a background writer and indexed queries"""
+
+    def __init__(self, path: str = DEFAULT_HISTORY_PATH,
+                 retention_days: float = RETENTION_DAYS, detail_days: float = DETAIL_DAYS):
+        self.path = path
+        self.retention_days = retention_days
+        self.detail_days = detail_days
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30)
+        # auto_vacuum only takes effect before the first write (the WAL switch
+        # included); a file created without it is converted by compact(), on
+        # the writer thread, never here on the caller's
+        conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        conn.close()
+        conn = _connect(path)
+        conn.executescript(SCHEMA)
+        conn.close()
+
+        self.queue: 'queue.Queue' = queue.Queue(maxsize=QUEUE_SIZE)
+        self.lock = threading.Lock()
+        self.counters = {'queued': 0, 'written': 0, 'dropped': 0, 'errors': 0,
+                         'compactions': 0, 'last_error': None}
+        self.last_compaction = 0.0
+        self._local = threading.local()
+        self._writer = threading.Thread(target=self._write_loop, name='history-writer', daemon=True)
+        self._writer.start()
+
+    # --- writing ------------------------------------------------------------
+
+    def record(self, input_data: Dict, result: Dict, created_at: Optional[float] = None) -> bool:
+        """Queue a run for writing; never blocks. False if the queue is full"""
+        try:
+            self.queue.put_nowait((input_data, result, created_at or time.time()))
+        except queue.Full:
+            self._count('dropped')
+            return False
+        self._count('queued')
+        return True
+
+    def _count(self, name: str, n: int = 1):
+        with self.lock:
+            self.counters[name] += n
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Wait until everything queued so far is written"""
+        deadline = time.time() + timeout
+        while self.queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.01)
+        return not self.queue.unfinished_tasks
+
+    def _write_loop(self):
+        conn = _connect(self.path)
+        while True:
+            try:
+                batch = [self.queue.get(timeout=COMPACT_EVERY_SECONDS / 4)]
+            except queue.Empty:
+                batch = []
+            while batch and len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                if batch:
+                    with conn:
+                        for item in batch:
+                            self._insert(conn, *item)
+                    self._count('written', len(batch))
+                if time.time() - self.last_compaction >= COMPACT_EVERY_SECONDS:
+                    self.compact(conn=conn)
+            except Exception as e:
+                with self.lock:
+                    self.counters['errors'] += 1
+                    self.counters['last_error'] = str(e)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def _insert(self, conn: sqlite3.Connection, input_data: Dict, result: Dict, created_at: float):
+        from coalesce import canonical_key
+
+        meta = result.get('solver_meta', {})
+        rows = result.get('results', [])
+        segments = {t.get('train_no'): (t.get('current_station'), t.get('next_station'))
+                    for t in input_data.get('trains', [])}
+        holds = [row.get('hold_seconds', 0) for row in rows]
+        cursor = conn.execute(
+            'INSERT INTO runs (run_id, digest, created_at, corridor, status, engine, objective_value,'
+            ' solve_time_seconds, trains, held_trains, total_hold_seconds, solver_meta)'
+            ' VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (result.get('run_id') or input_data.get('run_id'), canonical_key(input_data), created_at,
+             corridor_label(input_data), meta.get('status'), meta.get('engine'),
+             meta.get('objective_value'), meta.get('solve_time_seconds'), len(rows),
+             sum(1 for h in holds if h > 0), sum(holds), json.dumps(meta, default=str))
+        )
+        run = cursor.lastrowid
+        conn.executemany(
+            'INSERT INTO results (run, created_at, train_no, segment_from, segment_to, entry_epoch,'
+            ' hold_seconds, action, priority_score) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            [(run, created_at, row['train_no'], *segments.get(row['train_no'], (None, None)),
+              row.get('optimized_entry_epoch'), row.get('hold_seconds'), row.get('action'),
+              row.get('priority_score')) for row in rows]
+        )
+
+    def compact(self, now: Optional[float] = None, conn: Optional[sqlite3.Connection] = None) -> Dict:
+        """Drop runs past retention, thin old runs to their holds, reclaim space"""
+        now = now or time.time()
+        own = conn is None
+        conn = conn or _connect(self.path)
+        expired = now - self.retention_days * 86400
+        detail = now - self.detail_days * 86400
+        try:
+            with conn:
+                removed_results = conn.execute(
+                    'DELETE FROM results WHERE run IN (SELECT id FROM runs WHERE created_at < ?)',
+                    (expired,)).rowcount
+                removed_runs = conn.execute('DELETE FROM runs WHERE created_at < ?', (expired,)).rowcount
+                thinned = conn.execute(
+                    'DELETE FROM results WHERE hold_seconds = 0'
+                    ' AND run IN (SELECT id FROM runs WHERE compacted = 0 AND created_at < ?)',
+                    (detail,)).rowcount
+                conn.execute('UPDATE runs SET compacted = 1 WHERE compacted = 0 AND created_at < ?',
+                             (detail,))
+            converted = conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2
+            if converted:
+                # Older store without incremental auto_vacuum: a one-time VACUUM rebuilds it
+                conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+                conn.execute('VACUUM')
+            else:
+                # execute() steps the pragma once (one page); executescript runs it to completion
+                conn.executescript('PRAGMA incremental_vacuum;')
+        finally:
+            if own:
+                conn.close()
+        self.last_compaction = time.time()
+        self._count('compactions')
+        return {'runs_removed': removed_runs, 'results_removed': removed_results,
+                'results_thinned': thinned, 'converted_to_incremental_vacuum': converted}
+
+    # --- queries ------------------------------------------------------------
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = _connect(self.path)
+        return conn
+
+    def _query(self, sql: str, args: tuple) -> List[Dict]:
+        return [dict(row) for row in self._reader().execute(sql, args)]
+
+    def runs(self, since: Timestamp = None, until: Timestamp = None, corridor: Optional[str] = None,
+             digest: Optional[str] = None, run_id: Optional[str] = None, limit: int = 100) -> List[Dict]:
+        """Run summaries, newest first"""
+        where, args = self._time_range('created_at', since, until)
+        for column, value in (('corridor', corridor), ('digest', digest), ('run_id', run_id)):
+            if value is not None:
+                where.append(f'{column} = ?')
+                args.append(value)
+        rows = self._query(
+            'SELECT id, run_id, digest, created_at, corridor, status, engine, objective_value,'
+            ' solve_time_seconds, trains, held_trains, total_hold_seconds, compacted, solver_meta'
+            f' FROM runs {self._where(where)} ORDER BY created_at DESC LIMIT ?', (*args, limit))
+        for row in rows:
+            row['solver_meta'] = json.loads(row['solver_meta']) if row['solver_meta'] else None
+        return rows
+
+    def results(self, train_no: Optional[str] = None, segment: Optional[List[str]] = None,
+                since: Timestamp = None, until: Timestamp = None, min_hold_seconds: int = 0,
+                limit: int = 1000) -> List[Dict]:
+        """Per-train results by train and/or segment in a time range, newest first"""
+        where, args = self._time_range('r.created_at', since, until)
+        if train_no is not None:
+            where.append('r.train_no = ?')
+            args.append(str(train_no))
+        if segment is not None:
+            where.append('r.segment_from = ? AND r.segment_to = ?')
+            args.extend(segment)
+        if min_hold_seconds > 0:
+            where.append('r.hold_seconds >= ?')
+            args.append(min_hold_seconds)
+        return self._query(
+            'SELECT runs.run_id, r.created_at, r.train_no, r.segment_from, r.segment_to,'
+            ' r.entry_epoch, r.hold_seconds, r.action, r.priority_score'
+            f' FROM results r JOIN runs ON runs.id = r.run {self._where(where)}'
+            ' ORDER BY r.created_at DESC LIMIT ?', (*args, limit))
+
+    def holds(self, train_no: Optional[str] = None, segment: Optional[List[str]] = None,
+              since: Timestamp = None, until: Timestamp = None, limit: int = 1000) -> List[Dict]:
+        """Held trains only; these survive compaction"""
+        return self.results(train_no, segment, since, until, 1, limit)
+
+    def solve_time_stats(self, bucket_seconds: int = 3600, since: Timestamp = None,
+                         until: Timestamp = None, corridor: Optional[str] = None) -> List[Dict]:
+        """Run count and solve-time statistics per corridor per time bucket"""
+        where, args = self._time_range('created_at', since, until)
+        if corridor is not None:
+            where.append('corridor = ?')
+            args.append(corridor)
+        return self._query(
+            'SELECT corridor, CAST(created_at / ? AS INTEGER) * ? AS bucket_start, COUNT(*) AS runs,'
+            ' AVG(solve_time_seconds) AS avg_solve_time_seconds,'
+            ' MAX(solve_time_seconds) AS max_solve_time_seconds,'
+            ' AVG(objective_value) AS avg_objective_value, SUM(held_trains) AS held_trains'
+            f' FROM runs {self._where(where)} GROUP BY corridor, bucket_start'
+            ' ORDER BY corridor, bucket_start', (bucket_seconds, bucket_seconds, *args))
+
+    def compare(self, run_a: str, run_b: str) -> Dict:
+        """Per-train entry and hold differences between two runs (by run_id)"""
+        found = {}
+        for run_id in (run_a, run_b):
+            runs = self.runs(run_id=run_id, limit=1)
+            if not runs:
+                raise KeyError(f'Unknown run: {run_id}')
+            found[run_id] = runs[0]
+        a, b = found[run_a], found[run_b]
+        rows = self._query(
+            'SELECT COALESCE(x.train_no, y.train_no) AS train_no,'
+            ' x.entry_epoch AS entry_a, y.entry_epoch AS entry_b,'
+            ' x.hold_seconds AS hold_a, y.hold_seconds AS hold_b'
+            ' FROM results x LEFT JOIN results y ON y.run = ? AND y.train_no = x.train_no'
+            ' WHERE x.run = ?'
+            ' UNION ALL'
+            ' SELECT y.train_no, NULL, y.entry_epoch, NULL, y.hold_seconds FROM results y'
+            ' WHERE y.run = ? AND y.train_no NOT IN (SELECT train_no FROM results WHERE run = ?)',
+            (b['id'], a['id'], b['id'], a['id']))
+        changed = [row for row in rows if row['entry_a'] != row['entry_b']]
+        return {
+            'runs': {run_a: {k: a[k] for k in ('created_at', 'status', 'objective_value',
+                                                'solve_time_seconds', 'compacted')},
+                     run_b: {k: b[k] for k in ('created_at', 'status', 'objective_value',
+                                                'solve_time_seconds', 'compacted')}},
+            'same_input': a['digest'] == b['digest'],
+            'trains_compared': len(rows),
+            'trains_changed': len(changed),
+            'changes': changed
+        }
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return dict(self.counters, pending=self.queue.unfinished_tasks, path=self.path)
+
+    @staticmethod
+    def _time_range(column: str, since: Timestamp, until: Timestamp):
+        where, args = [], []
+        if epoch(since) is not None:
+            where.append(f'{column} >= ?')
+            args.append(epoch(since))
+        if epoch(until) is not None:
+            where.append(f'{column} < ?')
+            args.append(epoch(until))
+        return where, args
+
+    @staticmethod
+    def _where(clauses: List[str]) -> str:
+        return 'WHERE ' + ' AND '.join(clauses) if clauses else ''
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Query the solve history')
+    parser.add_argument('--db', default=DEFAULT_HISTORY_PATH)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    runs = sub.add_parser('runs', help='Recent runs')
+    runs.add_argument('--corridor')
+    runs.add_argument('--days', type=float, default=1)
+    runs.add_argument('--limit', type=int, default=20)
+
+    holds = sub.add_parser('holds', help='Held trains by train and/or segment')
+    holds.add_argument('--train')
+    holds.add_argument('--segment', help='FROM-TO station codes')
+    holds.add_argument('--days', type=float, default=7)
+    holds.add_argument('--limit', type=int, default=1000)
+
+    times = sub.add_parser('solve-times', help='Solve time per corridor per bucket')
+    times.add_argument('--bucket-seconds', type=int, default=3600)
+    times.add_argument('--corridor')
+    times.add_argument('--days', type=float, default=7)
+
+    cmp_ = sub.add_parser('compare', help='Differences between two runs')
+    cmp_.add_argument('run_a')
+    cmp_.add_argument('run_b')
+
+    sub.add_parser('compact', help='Apply retention and compaction now')
+
+    args = parser.parse_args()
+    store = HistoryStore(args.db)
+    since = time.time() - getattr(args, 'days', 0) * 86400
+
+    if args.command == 'runs':
+        report = store.runs(since=since, corridor=args.corridor, limit=args.limit)
+    elif args.command == 'holds':
+        segment = args.segment.split('-', 1) if args.segment else None
+        report = store.holds(args.train, segment, since=since, limit=args.limit)
+    elif args.command == 'solve-times':
+        report = store.solve_time_stats(args.bucket_seconds, since=since, corridor=args.corridor)
+    elif args.command == 'compare':
+        report = store.compare(args.run_a, args.run_b)
+    elif args.command == 'compact':
+        report = store.compact()
+    print(json.dumps(report, indent=2, default=str))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Synthetic optimizer instances
+Generates /solve payloads of configurable size in the same shape the Node
+preprocessing produces, for load tests and benchmarks
+"""
+
+import random
+from typing import Dict, List, Optional
+
+# Station codes along the NDLS-MMCT corridor, used to name synthetic segments
+CORRIDOR_STATIONS = [
+    'NDLS', 'NZM', 'MTJ', 'BTE', 'GGC', 'SWM', 'KOTA', 'RTM', 'DDV', 'BRC',
+    'ST', 'VAPI', 'BVI', 'MMCT', 'GWL', 'JHS', 'BPL', 'ET', 'NGP', 'UJN',
+]
+
+# Priority scores used by the Node ingestion (server/src/config/constants.js)
+PRIORITY_SCORES = [100, 90, 85, 70, 40, 20]
+
+BASE_EPOCH = 1758304239  # 2025-09-19T17:50:39Z, matches run_sample.py
+
+
+def segment_names(n_segments: int) -> List[tuple]:
+    """Return n distinct (from, to) station pairs"""
+    segments = []
+    stations = CORRIDOR_STATIONS
+    for k in range(n_segments):
+        # Disambiguate station codes once the corridor list is exhausted
+        suffix = '' if k < len(stations) else str(k // len(stations))
+        a = stations[k % len(stations)]
+        b = stations[(k + 1) % len(stations)]
+        segments.append((f'{a}{suffix}', f'{b}{suffix}'))
+    return segments
+
+
+def generate_instance(n_trains: int,
+                      n_segments: int = 1,
+                      seed: Optional[int] = None,
+                      horizon_seconds: int = 3600,
+                      time_limit_seconds: int = 10,
+                      headway_seconds: int = 180,
+                      max_hold_minutes: int = 120,
+                      base_epoch: int = BASE_EPOCH,
+                      run_id: Optional[str] = None) -> Dict:
+    """Build a /solve payload with n_trains spread over n_segments"""
+    rng = random.Random(seed)
+    segments = segment_names(max(1, n_segments))
+    travel_by_segment = {seg: rng.randrange(120, 420, 30) for seg in segments}
+
+    trains = []
+    for i in range(n_trains):
+        seg = segments[i % len(segments)]
+        release = base_epoch + rng.randrange(0, max(1, horizon_seconds))
+        trains.append({
+            'train_no': f'{10000 + i:05d}',
+            'priority_score': rng.choice(PRIORITY_SCORES),
+            'current_station': seg[0],
+            'next_station': seg[1],
+            'delay_minutes': rng.randrange(0, 30),
+            'dwell_time_seconds': rng.choice([60, 120, 150, 300]),
+            'segment': {
+                'from': seg[0],
+                'to': seg[1],
+                'seconds': travel_by_segment[seg]
+            },
+            'earliest_entry_seconds': release
+        })
+
+    return {
+        'run_id': run_id or f'synthetic_{n_trains}x{n_segments}_{seed}',
+        'trains': trains,
+        'solver_params': {
+            'time_limit_seconds': time_limit_seconds,
+            'headway_seconds': headway_seconds,
+            'max_hold_minutes': max_hold_minutes
+        }
+    }
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Large neighbourhood search around TrainOptimizer
+Starts from a per-segment list schedule, then repeatedly frees a window of
+trains, re-optimizes them with a short CP-SAT sub-solve while every other
+train stays fixed, and keeps the result when the weighted delay drops. Only
+the freed trains and the fixed trains they can collide with enter each
+sub-model, so iterations stay cheap on 10k+ train instances.
+"""
+
+import random
+import time
+from bisect import bisect_left
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional, Tuple
+
+from ortools.sat.python import cp_model
+
+from bounds import SINGLE_MACHINE, lower_bound, relative_gap
+from solver import (Train, SolverParams, TrainOptimizer, conflict_groups, pair_headway,
+                    schedule_row, segment_key, track_key)
+
+STRATEGIES = ('time_window', 'segment', 'random')
+
+
+@dataclass
+class LNSParams:
+    neighbourhood_size: int = 20
+    strategy: str = 'mixed'  # one of STRATEGIES, or 'mixed' to rotate through them
+    sub_time_limit_seconds: float = 0.3
+    max_iterations: Optional[int] = None
+    seed: int = 0
+    verbose: bool = False
+    strategies: Tuple[str, ...] = field(default=STRATEGIES)
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict]) -> 'LNSParams':
+        data = data or {}
+        defaults = cls()
+        params = cls(
+            neighbourhood_size=int(data.get('neighbourhood_size', defaults.neighbourhood_size)),
+            strategy=data.get('strategy', defaults.strategy),
+            sub_time_limit_seconds=float(data.get('sub_time_limit_seconds',
+                                                  defaults.sub_time_limit_seconds)),
+            max_iterations=data.get('max_iterations'),
+            seed=int(data.get('seed', defaults.seed)),
+            verbose=bool(data.get('verbose', False))
+        )
+        if params.strategy != 'mixed' and params.strategy not in STRATEGIES:
+            raise ValueError(f'Unknown LNS strategy: {params.strategy}')
+        return params
+
+
+def list_schedule(trains: List[Train], headway: int, params: Optional[SolverParams] = None) -> List[int]:
+    """Feasible initial schedule: each block served in release order"""
+    params = params or SolverParams(headway_seconds=headway)
+    starts = [0] * len(trains)
+    for indices in conflict_groups(trains, params).values():
+        indices.sort(key=lambda i: (trains[i].earliest_entry_seconds, -trains[i].priority_score))
+        # Latest exit per direction; opposing trains may need a different headway
+        last_exit: Dict[Tuple[str, str], Tuple[int, int]] = {}
+        for i in indices:
+            start = trains[i].earliest_entry_seconds
+            for exit_time, j in last_exit.values():
+                start = max(start, exit_time + pair_headway(trains[j], trains[i], params))
+            starts[i] = start
+            direction = segment_key(trains[i])
+            exit_time = start + trains[i].travel_time_seconds
+            if direction not in last_exit or last_exit[direction][0] < exit_time:
+                last_exit[direction] = (exit_time, i)
+    return starts
+
+
+def weighted_delay(trains: List[Train], starts: List[int], indices) -> int:
+    return sum(trains[i].priority_score * (starts[i] - trains[i].earliest_entry_seconds)
+               for i in indices)
+
+
+class LNSOptimizer:
+    """LNS driver that uses TrainOptimizer for every neighbourhood sub-solve"""
+
+    def __init__(self, lns_params: Optional[LNSParams] = None):
+        self.params = lns_params or LNSParams()
+        self.rng = random.Random(self.params.seed)
+        self.history: List[Dict] = []
+
+    def solve(self, trains: List[Train], solver_params: SolverParams) -> Dict:
+        started = time.time()
+        deadline = started + solver_params.time_limit_seconds
+        headway = solver_params.headway_seconds
+
+        self.trains = trains
+        self.headway = headway
+        self.solver_params = solver_params
+        # Neighbourhoods work per block, so opposing trains on single track move together
+        self.segments: Dict[Tuple[str, str], List[int]] = conflict_groups(trains, solver_params)
+        self.segment_keys = list(self.segments)
+        # Per-segment service order, rebuilt lazily after accepted moves
+        self.orders: Dict[Tuple[str, str], List[int]] = {}
+
+        self.starts = list_schedule(trains, headway, solver_params)
+        objective = weighted_delay(trains, self.starts, range(len(trains)))
+        self._log(started, 0, objective, 'initial')
+        # Search stops once the incumbent is within gap_limit of the lower bound
+        bound = lower_bound(trains, solver_params).value if solver_params.lower_bounds else 0
+
+        iteration = 0
+        accepted = 0
+        proven = False
+        strategy_stats = {s: {'tried': 0, 'improved': 0} for s in self.params.strategies}
+        while time.time() < deadline and relative_gap(objective, bound) > solver_params.gap_limit:
+            if self.params.max_iterations is not None and iteration >= self.params.max_iterations:
+                break
+            iteration += 1
+            strategy = self._pick_strategy(iteration)
+            freed = self._neighbourhood(strategy)
+            if len(freed) < 2:
+                continue
+
+            time_left = deadline - time.time()
+            new_starts, sub_optimal = self._resolve(
+                freed, min(self.params.sub_time_limit_seconds, time_left))
+            strategy_stats[strategy]['tried'] += 1
+            if new_starts is None:
+                continue
+
+            before = weighted_delay(trains, self.starts, freed)
+            after = sum(trains[i].priority_score * (new_starts[i] - trains[i].earliest_entry_seconds)
+                        for i in freed)
+            if after < before:
+                for i in freed:
+                    self.starts[i] = new_starts[i]
+                    self.orders.pop(track_key(trains[i], solver_params), None)
+                objective -= before - after
+                accepted += 1
+                strategy_stats[strategy]['improved'] += 1
+                self._log(started, iteration, objective, strategy)
+            if sub_optimal and len(freed) == len(trains):
+                # The neighbourhood was the whole instance and CP-SAT proved it
+                proven = True
+                break
+
+        results = [schedule_row(train, self.starts[i]) for i, train in enumerate(trains)]
+        gap = relative_gap(objective, bound)
+        return {
+            'solver_meta': {
+                'status': 'OPTIMAL' if proven or objective <= bound else 'FEASIBLE',
+                'objective_value': float(objective),
+                'solve_time_seconds': time.time() - started,
+                'engine': 'lns',
+                'lower_bound': bound,
+                'bound_source': SINGLE_MACHINE,
+                'gap': gap,
+                'stopped_on_gap': not proven and gap <= solver_params.gap_limit,
+                'lns': {
+                    'iterations': iteration,
+                    'improvements': accepted,
+                    'neighbourhood_size': self.params.neighbourhood_size,
+                    'strategy': self.params.strategy,
+                    'strategy_stats': strategy_stats,
+                    'initial_objective': self.history[0]['objective'],
+                    'history': self.history
+                }
+            },
+            'results': results
+        }
+
+    def _log(self, started: float, iteration: int, objective: int, strategy: str):
+        entry = {
+            'elapsed_seconds': round(time.time() - started, 3),
+            'iteration': iteration,
+            'objective': objective,
+            'strategy': strategy
+        }
+        self.history.append(entry)
+        if self.params.verbose:
+            print(f"[lns] t={entry['elapsed_seconds']}s it={iteration} "
+                  f"objective={objective} ({strategy})")
+
+    def _pick_strategy(self, iteration: int) -> str:
+        if self.params.strategy != 'mixed':
+            return self.params.strategy
+        return self.params.strategies[iteration % len(self.params.strategies)]
+
+    def _neighbourhood(self, strategy: str) -> List[int]:
+        """Indices of the trains to free this iteration"""
+        k = self.params.neighbourhood_size
+        if len(self.trains) <= k:
+            return list(range(len(self.trains)))
+
+        if strategy == 'segment':
+            # A contiguous block, in service order, of one delayed segment
+            order = self._service_order(self._delayed_segment())
+            if len(order) <= k:
+                return order
+            offset = self.rng.randrange(len(order) - k + 1)
+            return order[offset:offset + k]
+
+        if strategy == 'random':
+            # A scattered subset of the trains on a few delayed segments
+            pool = []
+            for _ in range(3):
+                pool.extend(self.segments[self._delayed_segment()])
+            pool = list(set(pool))
+            return self.rng.sample(pool, min(k, len(pool)))
+
+        # time_window: on every segment, the trains starting nearest to a
+        # held train's start; keeps the k closest to that time overall
+        pivot = self.rng.choice(self.segments[self._delayed_segment()])
+        t = self.starts[pivot]
+        candidates = []
+        for key in self.segment_keys:
+            order = self._service_order(key)
+            starts = [self.starts[i] for i in order]
+            pos = bisect_left(starts, t)
+            window = order[max(0, pos - k // 2):pos + k // 2]
+            if len(window) >= 2:
+                candidates.extend(window)
+        candidates.sort(key=lambda i: abs(self.starts[i] - t))
+        return candidates[:k]
+
+    def _service_order(self, key: Tuple[str, str]) -> List[int]:
+        order = self.orders.get(key)
+        if order is None:
+            order = sorted(self.segments[key], key=lambda i: self.starts[i])
+            self.orders[key] = order
+        return order
+
+    def _delayed_segment(self) -> Tuple[str, str]:
+        """Sample a segment, favouring those carrying more weighted delay"""
+        candidates = self.rng.sample(self.segment_keys, min(len(self.segment_keys), 8))
+        return max(candidates, key=lambda key: weighted_delay(self.trains, self.starts, self.segments[key]))
+
+    def _resolve(self, freed: List[int], time_limit: float) -> Tuple[Optional[Dict[int, int]], bool]:
+        """Re-optimize the freed trains against the fixed rest of the schedule"""
+        if time_limit <= 0:
+            return None, False
+        freed_set = set(freed)
+        trains = self.trains
+        h = max(self.headway, self.solver_params.direction_change_headway_seconds or 0)
+
+        # Per block, freed trains within one occupancy of each other form a
+        # cluster; each cluster may move from far enough ahead of its earliest
+        # start to re-sequence all of it, up to one occupancy past its latest.
+        # Scattered neighbourhoods thus keep narrow windows on long schedules
+        windows = {}
+        ranges = []
+        for key in {track_key(trains[i], self.solver_params) for i in freed}:
+            freed_here = sorted((i for i in self.segments[key] if i in freed_set),
+                                key=lambda i: self.starts[i])
+            clusters = []
+            for i in freed_here:
+                occupancy = trains[i].travel_time_seconds + h
+                if clusters and self.starts[i] <= clusters[-1][1]:
+                    clusters[-1][0].append(i)
+                    clusters[-1][1] = max(clusters[-1][1], self.starts[i] + 2 * occupancy)
+                else:
+                    clusters.append([[i], self.starts[i] + 2 * occupancy])
+            for cluster, _ in clusters:
+                span = sum(trains[i].travel_time_seconds + h for i in cluster)
+                lo = self.starts[cluster[0]] - span
+                hi = max(self.starts[i] + trains[i].travel_time_seconds + h for i in cluster)
+                for i in cluster:
+                    windows[i] = (max(lo, trains[i].earliest_entry_seconds), hi)
+                lo = min(windows[i][0] for i in cluster)
+                reach = hi + max(trains[i].travel_time_seconds for i in cluster) + h
+                ranges.append((key, lo, reach))
+
+        # Only fixed trains whose occupancy can overlap a reachable window matter
+        fixed = []
+        for key, lo, reach in ranges:
+            for i in self.segments[key]:
+                if i not in freed_set and self.starts[i] < reach and \
+                        self.starts[i] + trains[i].travel_time_seconds + h > lo:
+                    fixed.append(i)
+        fixed = list(dict.fromkeys(fixed))
+
+        members = list(freed) + fixed
+        optimizer = TrainOptimizer()
+        optimizer.start_windows = {local: windows[i] for local, i in enumerate(freed)}
+        optimizer.fixed_starts = {local: self.starts[i]
+                                  for local, i in enumerate(members) if i not in freed_set}
+        optimizer.build_model(
+            [trains[i] for i in members],
+            replace(self.solver_params, time_limit_seconds=time_limit)
+        )
+        for local, i in enumerate(freed):
+            optimizer.model.AddHint(optimizer.variables[f'start_time_{local}'], self.starts[i])
+
+        # Profiled requests capture every sub-solve, as TrainOptimizer.solve() does
+        from profiling import current_capture
+        capture = current_capture()
+        model_stats = capture.attach(optimizer.solver, optimizer.model) if capture is not None else None
+        status = optimizer.solver.Solve(optimizer.model)
+        if capture is not None:
+            capture.record_response(model_stats, optimizer.solver)
+        if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            return None, False
+        new_starts = {i: optimizer.solver.Value(optimizer.variables[f'start_time_{local}'])
+                      for local, i in enumerate(freed)}
+        # OPTIMAL within a CP-SAT gap limit is not a proof
+        proven = status == cp_model.OPTIMAL and \
+            optimizer.solver.ObjectiveValue() <= optimizer.solver.BestObjectiveBound()
+        return new_starts, proven
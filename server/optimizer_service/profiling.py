@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Opt-in request profiling
+A profiled /solve runs under cProfile with CP-SAT search logging turned on
+for every model it builds (through the thread-local capture below), then
+writes a bundle directory that is enough to reproduce the run offline:
+
+    input.json        the request payload as received
+    profile.pstats    cProfile stats (python -m pstats profile.pstats)
+    profile.txt       top functions by cumulative time
+    search.log        CP-SAT search log of every model solved
+    models.json       per-model size and CP-SAT response statistics
+    manifest.json     timings, result summary and library versions
+
+Profiling is requested with solver_params.profile, an X-Profile header,
+or PROFILE_EVERY_N=<n> to sample every n-th /solve.
+
+    python profiling.py replay profiles/optim_1758304239_20250919T174000
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+DEFAULT_PROFILE_DIR = os.getenv(
+    'PROFILE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles')
+)
+PROFILE_EVERY_N = int(os.getenv('PROFILE_EVERY_N', '0'))
+MAX_LOG_LINES = 50000
+MAX_MODELS = 200  # LNS solves many small models; keep the first ones
+
+_local = threading.local()
+_sample_lock = threading.Lock()
+_sample_count = 0
+
+
+class Capture:
+    """Search log and model statistics of the CP-SAT solves on one request"""
+
+    def __init__(self):
+        self.log: List[str] = []
+        self.models: List[Dict] = []
+        self.dropped_models = 0
+
+    def attach(self, solver, model):
+        """Turn on search logging for a solver that is about to run"""
+        if len(self.models) >= MAX_MODELS:
+            self.dropped_models += 1
+            return None
+        solver.parameters.log_search_progress = True
+        solver.parameters.log_to_stdout = False
+        solver.log_callback = self._log_line
+        proto = model.Proto()
+        stats = {
+            'variables': len(proto.variables),
+            'constraints': len(proto.constraints),
+            'objective_terms': len(proto.objective.vars)
+        }
+        self.models.append(stats)
+        self.log.append(f'--- model {len(self.models)}: {json.dumps(stats)}')
+        return stats
+
+    def record_response(self, stats: Optional[Dict], solver):
+        if stats is not None:
+            stats['response'] = solver.ResponseStats()
+
+    def _log_line(self, line: str):
+        if len(self.log) < MAX_LOG_LINES:
+            self.log.append(line)
+
+
+def current_capture() -> Optional[Capture]:
+    """Capture of the request running on this thread, if it is being profiled"""
+    return getattr(_local, 'capture', None)
+
+
+@contextmanager
+def capturing(capture: Capture):
+    previous = current_capture()
+    _local.capture = capture
+    try:
+        yield capture
+    finally:
+        _local.capture = previous
+
+
+def should_profile(flag: bool = False, header: Optional[str] = None) -> bool:
+    """Explicit flag or header, else every PROFILE_EVERY_N-th request;
+    a negative header opts the request out of sampling"""
+    if flag:
+        return True
+    if header:
+        return header.lower() not in ('0', 'false', 'no')
+    if PROFILE_EVERY_N <= 0:
+        return False
+    global _sample_count
+    with _sample_lock:
+        _sample_count += 1
+        return _sample_count % PROFILE_EVERY_N == 0
+
+
+def profiled(fn, *args, **kwargs):
+    """Run fn under cProfile and search-log capture; returns (result, profile, capture, seconds)"""
+    import cProfile
+
+    capture = Capture()
+    profile = cProfile.Profile()
+    started = time.time()
+    with capturing(capture):
+        profile.enable()
+        try:
+            result = fn(*args, **kwargs)
+        finally:
+            profile.disable()
+    return result, profile, capture, time.time() - started
+
+
+def _versions() -> Dict:
+    from importlib import metadata
+
+    versions = {'python': platform.python_version(), 'platform': platform.platform()}
+    for name in ('ortools', 'numpy', 'flask'):
+        try:
+            versions[name] = metadata.version(name)
+        except metadata.PackageNotFoundError:
+            versions[name] = None
+    return versions
+
+
+def write_bundle(input_data: Dict, result: Dict, profile, capture: Capture, seconds: float,
+                 base_dir: str = DEFAULT_PROFILE_DIR) -> str:
+    """Write a reproducible artifact bundle and return its directory"""
+    import pstats
+
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')
+    run_id = str(input_data.get('run_id') or 'run').replace(os.sep, '_')
+    bundle = os.path.join(base_dir, f'{run_id}_{stamp}')
+    os.makedirs(bundle, exist_ok=True)
+
+    with open(os.path.join(bundle, 'input.json'), 'w', encoding='utf-8') as f:
+        json.dump(input_data, f, indent=2)
+    profile.dump_stats(os.path.join(bundle, 'profile.pstats'))
+    text = io.StringIO()
+    pstats.Stats(profile, stream=text).sort_stats('cumulative').print_stats(40)
+    with open(os.path.join(bundle, 'profile.txt'), 'w', encoding='utf-8') as f:
+        f.write(text.getvalue())
+    with open(os.path.join(bundle, 'search.log'), 'w', encoding='utf-8') as f:
+        f.write('\n'.join(capture.log))
+    with open(os.path.join(bundle, 'models.json'), 'w', encoding='utf-8') as f:
+        json.dump({'models': capture.models, 'dropped_models': capture.dropped_models}, f, indent=2)
+
+    meta = result.get('solver_meta', {})
+    manifest = {
+        'run_id': input_data.get('run_id'),
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'wall_seconds': seconds,
+        'status': meta.get('status'),
+        'objective_value': meta.get('objective_value'),
+        'engine': meta.get('engine'),
+        'solve_time_seconds': meta.get('solve_time_seconds'),
+        'trains': len(input_data.get('trains', [])),
+        'models_captured': len(capture.models),
+        'versions': _versions()
+    }
+    with open(os.path.join(bundle, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return bundle
+
+
+def replay(bundle: str, profile: bool = True, out_dir: Optional[str] = None) -> Dict:
+    """Re-run a bundle's input through the same solve path as /solve"""
+    from solver import TrainOptimizer, solve_trains
+
+    with open(os.path.join(bundle, 'input.json'), encoding='utf-8') as f:
+        input_data = json.load(f)
+    with open(os.path.join(bundle, 'manifest.json'), encoding='utf-8') as f:
+        recorded = json.load(f)
+
+    def run():
+        optimizer = TrainOptimizer()
+        trains, params = optimizer.parse_input(input_data)
+        return solve_trains(optimizer, trains, params)
+
+    if profile:
+        result, prof, capture, seconds = profiled(run)
+        new_bundle = write_bundle(input_data, result, prof, capture, seconds,
+                                  out_dir or os.path.join(bundle, 'replays'))
+    else:
+        started = time.time()
+        result = run()
+        seconds, new_bundle = time.time() - started, None
+
+    meta = result['solver_meta']
+    return {
+        'bundle': bundle,
+        'replay_bundle': new_bundle,
+        'recorded': {k: recorded.get(k) for k in ('status', 'objective_value', 'engine', 'wall_seconds')},
+        'replayed': {'status': meta.get('status'), 'objective_value': meta.get('objective_value'),
+                     'engine': meta.get('engine'), 'wall_seconds': seconds},
+        'recorded_versions': recorded.get('versions'),
+        'versions': _versions()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Profiling bundles')
+    sub = parser.add_subparsers(dest='command', required=True)
+    rep = sub.add_parser('replay', help='Re-run a bundle offline and compare with the recording')
+    rep.add_argument('bundle')
+    rep.add_argument('--no-profile', action='store_true', help='Time the solve without cProfile')
+    rep.add_argument('--out', help='Directory for the replay bundle (default <bundle>/replays)')
+    args = parser.parse_args()
+
+    if args.command == 'replay':
+        print(json.dumps(replay(args.bundle, not args.no_profile, args.out), indent=2))
+
+
+if __name__ == '__main__':
+    main()
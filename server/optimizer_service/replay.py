@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+Historical replay harness
+Rebuilds a day of corridor snapshots from archived RailRadar payloads (the
+schedule JSON / enriched CSV and live files the fetch scripts write to
+out/) and runs each snapshot through the /solve path as fast as the solver
+allows. Every snapshot records solve time, status, objective and plan churn
+against the previous snapshot; several solver configurations can be
+replayed over the same snapshots and compared side by side.
+
+    python replay.py ../../out --date 2025-09-20 --step-minutes 5 \\
+        --config baseline='{}' --config short='{"time_limit_seconds": 2}'
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from segment_times import normalize_train_class, parse_clock, route_rows
+
+IST = timezone(timedelta(hours=5, minutes=30))  # RailRadar timetables are local time
+
+# Node ingestion weights (server/src/config/constants.js)
+PRIORITY_WEIGHTS = {'PREMIUM': 100, 'SPECIAL': 90, 'HIGH': 85, 'MEDIUM': 70, 'LOW': 40, 'FREIGHT': 20}
+DEFAULT_DWELL_SECONDS = 150
+
+_SCHEDULE_FILE = re.compile(r'train_(?P<train_no>\w+?)_schedule_(?P<date>\d{4}-\d{2}-\d{2})')
+_LIVE_FILE = re.compile(r'train_(?P<train_no>\w+?)_live')
+
+
+@dataclass
+class Stop:
+    code: str
+    arrival: Optional[int]  # epoch seconds
+    departure: Optional[int]
+    halt_seconds: int
+
+
+@dataclass
+class Journey:
+    train_no: str
+    journey_date: str
+    train_class: str
+    stops: List[Stop]
+    delays: List[Tuple[int, int]] = field(default_factory=list)  # (observed at, delay seconds)
+
+    def delay_at(self, t: int) -> int:
+        """Latest reported delay at or before t"""
+        delay = 0
+        for observed, seconds in self.delays:
+            if observed > t:
+                break
+            delay = seconds
+        return delay
+
+
+def _stops(rows: List[Dict], journey_date: str) -> List[Stop]:
+    """Timed stops as epochs; day numbers when present, else midnight rollover"""
+    midnight = int(datetime.strptime(journey_date, '%Y-%m-%d').replace(tzinfo=IST).timestamp())
+    stops = []
+    last = None
+    rollover = 0
+    for row in rows:
+        code = (row.get('code') or '').upper()
+        arr, dep = parse_clock(row.get('arr')), parse_clock(row.get('dep'))
+        try:
+            day = int(row['day']) if row.get('day') not in (None, '') else None
+        except (TypeError, ValueError):
+            day = None
+
+        def epoch(clock):
+            nonlocal last, rollover
+            if clock is None:
+                return None
+            if day is not None:
+                value = midnight + (day - 1) * 86400 + clock
+            else:
+                value = midnight + rollover + clock
+                if last is not None and value < last:
+                    rollover += 86400
+                    value += 86400
+            last = value
+            return value
+
+        arrival, departure = epoch(arr), epoch(dep)
+        if code:
+            halt = (departure - arrival) if arrival is not None and departure is not None else 0
+            stops.append(Stop(code, arrival, departure, halt))
+    return stops
+
+
+def load_journeys(paths: List[str], date: Optional[str] = None) -> List[Journey]:
+    """Journeys from schedule files (JSON preferred over its enriched CSV) plus live delays"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, name) for name in sorted(os.listdir(path)))
+        else:
+            files.append(path)
+
+    journeys: Dict[Tuple[str, str], Journey] = {}
+    live_files = []
+    # Raw JSON first so an enriched CSV of the same train and date is skipped
+    for path in sorted(files, key=lambda p: not p.endswith('.json')):
+        name = os.path.basename(path)
+        match = _SCHEDULE_FILE.search(name)
+        if match is None:
+            if _LIVE_FILE.search(name) and name.endswith('.json'):
+                live_files.append(path)
+            continue
+        train_no, journey_date = match.group('train_no'), match.group('date')
+        if (date and journey_date != date) or (train_no, journey_date) in journeys:
+            continue
+        if name.endswith('.json'):
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f).get('data') or {}
+            train = data.get('train') or {}
+            rows = route_rows(data.get('route') or [])
+            train_class = normalize_train_class(train.get('type') or train.get('typeDescription'))
+        elif name.endswith('_enriched.csv'):
+            with open(path, newline='', encoding='utf-8') as f:
+                rows = list(csv.DictReader(f))
+            train_class = normalize_train_class(None)
+        else:
+            continue
+        stops = _stops(rows, journey_date)
+        if len(stops) >= 2:
+            journeys[(train_no, journey_date)] = Journey(train_no, journey_date, train_class, stops)
+
+    for path in live_files:
+        _add_live(path, journeys)
+    return sorted(journeys.values(), key=lambda j: (j.journey_date, j.train_no))
+
+
+def _add_live(path: str, journeys: Dict[Tuple[str, str], Journey]):
+    """Attach the delay from a live payload to every journey of that train"""
+    with open(path, encoding='utf-8') as f:
+        payload = json.load(f)
+    live = (payload.get('data') or {}).get('liveData') or {}
+    if live.get('delayMinutes') is None:
+        return
+    observed = None
+    for key in ('lastUpdated', 'lastUpdatedAt', 'updatedAt', 'timestamp'):
+        value = live.get(key) or (payload.get('data') or {}).get(key)
+        if value:
+            try:
+                observed = int(datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp())
+                break
+            except ValueError:
+                continue
+    if observed is None:
+        observed = int(os.path.getmtime(path))
+    train_no = _LIVE_FILE.search(os.path.basename(path)).group('train_no')
+    for (number, _), journey in journeys.items():
+        if number == train_no:
+            journey.delays.append((observed, int(float(live['delayMinutes']) * 60)))
+            journey.delays.sort()
+
+
+def snapshot(journeys: List[Journey], t: int, lookahead_seconds: int,
+             stations: Optional[set] = None) -> List[Dict]:
+    """Optimizer trains at time t: each train's next departure within the lookahead"""
+    trains = []
+    seen = set()
+    for journey in journeys:
+        # Runs of a multi-day train on consecutive dates can overlap
+        train_no = journey.train_no if journey.train_no not in seen \
+            else f'{journey.train_no}/{journey.journey_date}'
+        delay = journey.delay_at(t)
+        stops = journey.stops
+        for k in range(len(stops) - 1):
+            dep = stops[k].departure
+            if dep is None or dep + delay < t:
+                continue
+            arr = stops[k + 1].arrival
+            if dep + delay - t > lookahead_seconds or arr is None or arr <= dep:
+                break
+            if stations and not (stops[k].code in stations and stops[k + 1].code in stations):
+                break
+            seen.add(train_no)
+            trains.append({
+                'train_no': train_no,
+                'priority_score': PRIORITY_WEIGHTS.get(journey.train_class, PRIORITY_WEIGHTS['MEDIUM']),
+                'current_station': stops[k].code,
+                'next_station': stops[k + 1].code,
+                'earliest_entry_seconds': dep + delay,
+                'delay_minutes': delay // 60,
+                'dwell_time_seconds': stops[k].halt_seconds or DEFAULT_DWELL_SECONDS,
+                'segment': {'from': stops[k].code, 'to': stops[k + 1].code, 'seconds': arr - dep}
+            })
+            break
+    return trains
+
+
+def churn(previous: Optional[Dict], current: Dict, tolerance_seconds: int = 60) -> Dict:
+    """Plan changes for trains on the same segment in consecutive snapshots"""
+    if previous is None:
+        return {'compared': 0, 'changed': 0, 'mean_abs_shift_seconds': 0.0, 'action_flips': 0,
+                'order_changes': 0}
+    common = [k for k in current if k in previous and previous[k][0] == current[k][0]]
+    shifts = [abs(current[k][1] - previous[k][1]) for k in common]
+    flips = sum(1 for k in common if current[k][2] != previous[k][2])
+
+    # Position of each common train among the common trains on its segment
+    order_changes = 0
+    by_segment: Dict = {}
+    for k in common:
+        by_segment.setdefault(current[k][0], []).append(k)
+    for members in by_segment.values():
+        before = sorted(members, key=lambda k: (previous[k][1], k))
+        after = sorted(members, key=lambda k: (current[k][1], k))
+        order_changes += sum(1 for a, b in zip(before, after) if a != b)
+
+    return {
+        'compared': len(common),
+        'changed': sum(1 for s in shifts if s > tolerance_seconds),
+        'mean_abs_shift_seconds': round(sum(shifts) / len(shifts), 1) if shifts else 0.0,
+        'action_flips': flips,
+        'order_changes': order_changes
+    }
+
+
+def replay(journeys: List[Journey], start: int, end: int, step_seconds: int,
+           solver_params: Dict, lookahead_seconds: int = 3600,
+           stations: Optional[set] = None) -> Dict:
+    """Solve every snapshot in [start, end) back to back"""
+    from solver import solve_request
+
+    rows = []
+    previous_plan = None
+    started = time.time()
+    for t in range(start, end, step_seconds):
+        trains = snapshot(journeys, t, lookahead_seconds, stations)
+        row = {'t': t, 'snapshot_iso': datetime.fromtimestamp(t, tz=timezone.utc).isoformat(),
+               'trains': len(trains)}
+        if trains:
+            payload = {'run_id': f'replay_{t}', 'trains': trains, 'solver_params': dict(solver_params)}
+            t0 = time.time()
+            result = solve_request(payload, coalesce=False)
+            meta = result['solver_meta']
+            plan = {train['train_no']: ((train['current_station'], train['next_station']),
+                                        r['optimized_entry_epoch'], r['action'])
+                    for train, r in zip(trains, _aligned(result['results'], trains)) if r is not None}
+            row.update({
+                'wall_seconds': round(time.time() - t0, 4),
+                'status': meta['status'],
+                'objective_value': meta['objective_value'],
+                'engine': meta.get('engine'),
+                'held_trains': sum(1 for r in result['results'] if r['action'] == 'HOLD'),
+                'churn': churn(previous_plan, plan)
+            })
+            previous_plan = plan
+        else:
+            row.update({'status': 'EMPTY', 'churn': churn(None, {})})
+            previous_plan = None
+        rows.append(row)
+
+    wall = time.time() - started
+    return {'snapshots': rows, 'wall_seconds': wall,
+            'speedup': round((end - start) / wall, 1) if wall > 0 else None}
+
+
+def _aligned(results: List[Dict], trains: List[Dict]) -> List[Optional[Dict]]:
+    by_train = {r['train_no']: r for r in results}
+    return [by_train.get(t['train_no']) for t in trains]
+
+
+def summarize(run: Dict) -> Dict:
+    solved = [r for r in run['snapshots'] if r['status'] != 'EMPTY']
+    times = sorted(r['wall_seconds'] for r in solved)
+    statuses: Dict[str, int] = {}
+    for r in solved:
+        statuses[r['status']] = statuses.get(r['status'], 0) + 1
+    return {
+        'snapshots': len(run['snapshots']),
+        'solved_snapshots': len(solved),
+        'status': statuses,
+        'solve_seconds': {
+            'mean': round(sum(times) / len(times), 4) if times else 0.0,
+            'p95': times[min(len(times) - 1, int(0.95 * len(times)))] if times else 0.0,
+            'max': times[-1] if times else 0.0
+        },
+        'total_objective': sum(r['objective_value'] for r in solved),
+        'changed_trains': sum(r['churn']['changed'] for r in solved),
+        'order_changes': sum(r['churn']['order_changes'] for r in solved),
+        'action_flips': sum(r['churn']['action_flips'] for r in solved),
+        'wall_seconds': round(run['wall_seconds'], 3),
+        'speedup': run['speedup']
+    }
+
+
+def compare(runs: Dict[str, Dict]) -> Dict:
+    """Side-by-side summaries and per-snapshot rows for several configurations"""
+    names = list(runs)
+    summaries = {name: summarize(runs[name]) for name in names}
+    side_by_side = []
+    for rows in zip(*(runs[name]['snapshots'] for name in names)):
+        entry = {'snapshot_iso': rows[0]['snapshot_iso'], 'trains': rows[0]['trains']}
+        for name, row in zip(names, rows):
+            entry[name] = {k: row.get(k) for k in ('status', 'objective_value', 'wall_seconds')}
+            entry[name]['changed'] = row['churn']['changed']
+        side_by_side.append(entry)
+
+    report = {'summary': summaries, 'snapshots': side_by_side}
+    if len(names) >= 2:
+        base, other = summaries[names[0]], summaries[names[1]]
+        report['delta'] = {
+            'against': names[0],
+            'config': names[1],
+            'total_objective': other['total_objective'] - base['total_objective'],
+            'mean_solve_seconds': round(other['solve_seconds']['mean'] - base['solve_seconds']['mean'], 4),
+            'changed_trains': other['changed_trains'] - base['changed_trains']
+        }
+    return report
+
+
+def _parse_config(text: str) -> Tuple[str, Dict]:
+    """name=<json or path>, or just a JSON file path"""
+    name, _, value = text.partition('=')
+    if not value:
+        name, value = os.path.splitext(os.path.basename(text))[0], text
+    if os.path.exists(value):
+        with open(value, encoding='utf-8') as f:
+            return name, json.load(f)
+    return name, json.loads(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay archived snapshots through the optimizer')
+    parser.add_argument('paths', nargs='+', help='out/ directories or individual payload files')
+    parser.add_argument('--date', help='Journey date to replay (YYYY-MM-DD); default all')
+    parser.add_argument('--start', help='Replay start, ISO time (default first departure)')
+    parser.add_argument('--hours', type=float, default=24)
+    parser.add_argument('--step-minutes', type=float, default=5)
+    parser.add_argument('--lookahead-minutes', type=float, default=60)
+    parser.add_argument('--stations', help='Comma-separated corridor stations to keep')
+    parser.add_argument('--time-limit', type=float, default=5,
+                        help='Default time_limit_seconds for configs that do not set one')
+    parser.add_argument('--config', action='append', default=[],
+                        help='name=<solver_params JSON or file>; repeat to compare configurations')
+    parser.add_argument('--output', help='Write the report here instead of stdout')
+    args = parser.parse_args()
+
+    journeys = load_journeys(args.paths, args.date)
+    if not journeys:
+        parser.error('no schedule payloads found')
+    if args.start:
+        start = int(datetime.fromisoformat(args.start).timestamp())
+    else:
+        start = min(s.departure for j in journeys for s in j.stops if s.departure is not None)
+    end = start + int(args.hours * 3600)
+    stations = {s.strip().upper() for s in args.stations.split(',')} if args.stations else None
+
+    configs = [_parse_config(c) for c in args.config] or [('default', {})]
+    runs = {}
+    for name, params in configs:
+        params = dict({'time_limit_seconds': args.time_limit}, **params)
+        runs[name] = replay(journeys, start, end, int(args.step_minutes * 60), params,
+                            int(args.lookahead_minutes * 60), stations)
+
+    report = compare(runs)
+    report['replay'] = {
+        'journeys': len(journeys),
+        'start_iso': datetime.fromtimestamp(start, tz=timezone.utc).isoformat(),
+        'end_iso': datetime.fromtimestamp(end, tz=timezone.utc).isoformat(),
+        'step_minutes': args.step_minutes,
+        'configs': {name: params for name, params in configs}
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+        print(json.dumps({'summary': report['summary'], 'delta': report.get('delta')}, indent=2))
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
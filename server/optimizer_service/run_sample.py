@@ -1,11 +1,41 @@
 #!/usr/bin/env python3
 """
 Sample script to test the optimizer with mock data
+
+Without arguments, posts the three-train DDV->KOTA sample once and prints the
+result. With --load, replays a weighted mix of synthetic instances against a
+running /solve at one or more concurrency levels (closed loop) or arrival
+rates (open loop) and reports throughput, latency percentiles, error and
+timeout rates and the solver status distribution as JSON.
+
+Identical concurrent requests are merged by the service's single-flight
+coalescing, so a small variant pool measures the coalescer rather than the
+solver. --variants sets the pool size per mix entry; --variants 0 generates
+a fresh instance for every request. Coalesced responses are counted in the
+report next to the latency figures.
+
+    python run_sample.py --load --concurrency 1,4,16 --requests 200
+    python run_sample.py --load --variants 0 --concurrency 8 --requests 200
+    python run_sample.py --load --mode open --rate 2,5 --duration 60 \
+        --mix mix.json --output capacity.json
 """
 
+import argparse
 import json
+import math
+import os
+import platform
+import random
+import socket
+import sys
+import threading
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from instances import generate_instance
 
 # Sample input data (matches the format from Node preprocessing)
 sample_input = {
@@ -83,7 +113,7 @@ sample_input = {
     }
 }
 
-def test_optimizer():
+def test_optimizer(url: str = 'http://localhost:5000/solve'):
     """Test the optimizer service"""
     print("=== Testing Train Optimizer ===")
     print(f"Input: {len(sample_input['trains'])} trains")
@@ -93,7 +123,7 @@ def test_optimizer():
     try:
         # Make request to solver
         response = requests.post(
-            'http://localhost:5000/solve',
+            url,
             json=sample_input,
             headers={'Content-Type': 'application/json'},
             timeout=30
@@ -128,5 +158,333 @@ def test_optimizer():
         print(f"Error: {e}")
         return None
 
+# Default request mix: mostly small single-segment requests like the sample,
+# with a tail of corridor-sized snapshots
+DEFAULT_MIX = [
+    {'name': 'sample', 'weight': 6, 'trains': 3, 'segments': 1, 'time_limit_seconds': 10},
+    {'name': 'medium', 'weight': 3, 'trains': 50, 'segments': 5, 'time_limit_seconds': 10},
+    {'name': 'large', 'weight': 1, 'trains': 300, 'segments': 40, 'time_limit_seconds': 20},
+]
+
+VARIANTS_PER_MIX_ENTRY = 8
+
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """Linear-interpolated percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo = math.floor(k)
+    hi = math.ceil(k)
+    if lo == hi:
+        return sorted_values[int(k)]
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def load_mix(path: Optional[str]) -> List[Dict]:
+    """Load a request mix from a JSON file, or return the default mix"""
+    if not path:
+        return DEFAULT_MIX
+    with open(path, encoding='utf-8') as f:
+        mix = json.load(f)
+    for entry in mix:
+        if 'name' not in entry or 'trains' not in entry:
+            raise ValueError(f'Mix entry needs at least name and trains: {entry}')
+    return mix
+
+
+def is_fixed_sample(entry: Dict) -> bool:
+    return entry['name'] == 'sample' and entry['trains'] == len(sample_input['trains'])
+
+
+def entry_payload(entry: Dict, seed: int, run_id: str) -> bytes:
+    """Serialize one synthetic instance for a mix entry"""
+    payload = generate_instance(
+        n_trains=entry['trains'],
+        n_segments=entry.get('segments', 1),
+        seed=seed,
+        horizon_seconds=entry.get('horizon_seconds', 3600),
+        time_limit_seconds=entry.get('time_limit_seconds', 10),
+        headway_seconds=entry.get('headway_seconds', 180),
+        run_id=run_id
+    )
+    return json.dumps(payload).encode('utf-8')
+
+
+def build_payloads(mix: List[Dict], seed: int,
+                   variants: int = VARIANTS_PER_MIX_ENTRY) -> Dict[str, List[bytes]]:
+    """Pre-serialize payload variants per mix entry; none when variants <= 0,
+    in which case LoadRunner generates a fresh instance per request"""
+    payloads = {}
+    for entry in mix:
+        if is_fixed_sample(entry):
+            payloads[entry['name']] = [json.dumps(sample_input).encode('utf-8')]
+            continue
+        payloads[entry['name']] = [
+            entry_payload(entry, seed * 1000 + v, f"load_{entry['name']}_{v}")
+            for v in range(max(0, variants))
+        ]
+    return payloads
+
+
+class LoadRunner:
+    """Sends /solve requests and records one sample per request"""
+
+    def __init__(self, url: str, mix: List[Dict], payloads: Dict[str, List[bytes]],
+                 timeout: float, seed: int):
+        self.url = url
+        self.mix = mix
+        self.payloads = payloads
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.local = threading.local()
+        self.samples = []
+        self.samples_lock = threading.Lock()
+
+    def _session(self) -> requests.Session:
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers['Content-Type'] = 'application/json'
+            self.local.session = session
+        return session
+
+    def pick(self):
+        """Pick a mix entry by weight and one of its payload variants, or
+        generate a fresh instance when the entry has no pre-built variants"""
+        with self.rng_lock:
+            entry = self.rng.choices(self.mix, weights=[e.get('weight', 1) for e in self.mix])[0]
+            variants = self.payloads[entry['name']]
+            if variants:
+                return entry['name'], self.rng.choice(variants)
+            request_seed = self.rng.getrandbits(32)
+        return entry['name'], entry_payload(entry, request_seed,
+                                            f"load_{entry['name']}_{request_seed}")
+
+    def send(self, name: str, body: bytes, scheduled_at: Optional[float] = None):
+        """Send one request; latency counts from scheduled_at when given"""
+        started = scheduled_at if scheduled_at is not None else time.perf_counter()
+        sample = {'mix': name, 'ok': False, 'timeout': False, 'coalesced': False,
+                  'status': None, 'http_status': None}
+        try:
+            response = self._session().post(self.url, data=body, timeout=self.timeout)
+            sample['http_status'] = response.status_code
+            if response.status_code == 200:
+                meta = response.json().get('solver_meta', {})
+                sample['ok'] = True
+                sample['status'] = meta.get('status', 'UNKNOWN')
+                sample['coalesced'] = bool(meta.get('coalesced'))
+            else:
+                sample['status'] = f'HTTP_{response.status_code}'
+        except requests.exceptions.Timeout:
+            sample['timeout'] = True
+            sample['status'] = 'CLIENT_TIMEOUT'
+        except requests.exceptions.RequestException as e:
+            sample['status'] = f'CLIENT_ERROR:{type(e).__name__}'
+        sample['latency_seconds'] = time.perf_counter() - started
+        with self.samples_lock:
+            self.samples.append(sample)
+
+    def run_closed_loop(self, concurrency: int, n_requests: Optional[int],
+                        duration: Optional[float]) -> float:
+        """Each worker sends back-to-back requests; returns wall time"""
+        self.samples = []
+        remaining = [n_requests]
+        counter_lock = threading.Lock()
+        deadline = time.perf_counter() + duration if duration else None
+
+        def take() -> bool:
+            if deadline is not None and time.perf_counter() >= deadline:
+                return False
+            if remaining[0] is None:
+                return True
+            with counter_lock:
+                if remaining[0] <= 0:
+                    return False
+                remaining[0] -= 1
+                return True
+
+        def worker():
+            while take():
+                self.send(*self.pick())
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for _ in range(concurrency):
+                pool.submit(worker)
+        return time.perf_counter() - started
+
+    def run_open_loop(self, rate: float, n_requests: Optional[int],
+                      duration: Optional[float], arrival: str,
+                      max_in_flight: int) -> float:
+        """Send at a fixed offered rate regardless of responses; returns wall time"""
+        self.samples = []
+        started = time.perf_counter()
+        next_at = started
+        sent = 0
+        with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+            while True:
+                if n_requests is not None and sent >= n_requests:
+                    break
+                if duration is not None and next_at - started >= duration:
+                    break
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                name, body = self.pick()
+                # Latency is measured from the intended send time, so queueing
+                # behind a saturated service is not hidden (coordinated omission)
+                pool.submit(self.send, name, body, next_at)
+                sent += 1
+                with self.rng_lock:
+                    gap = self.rng.expovariate(rate) if arrival == 'poisson' else 1.0 / rate
+                next_at += gap
+        return time.perf_counter() - started
+
+
+def summarize(samples: List[Dict], wall_seconds: float) -> Dict:
+    """Aggregate request samples into a machine-readable report"""
+    total = len(samples)
+    latencies = sorted(s['latency_seconds'] for s in samples)
+    ok_latencies = sorted(s['latency_seconds'] for s in samples if s['ok'])
+    errors = sum(1 for s in samples if not s['ok'] and not s['timeout'])
+    timeouts = sum(1 for s in samples if s['timeout'])
+    coalesced = sum(1 for s in samples if s['coalesced'])
+
+    def latency_ms(values: List[float]) -> Dict:
+        if not values:
+            return {'mean': None, 'p50': None, 'p95': None, 'p99': None, 'max': None}
+        return {
+            'mean': round(1000 * sum(values) / len(values), 3),
+            'p50': round(1000 * percentile(values, 50), 3),
+            'p95': round(1000 * percentile(values, 95), 3),
+            'p99': round(1000 * percentile(values, 99), 3),
+            'max': round(1000 * values[-1], 3)
+        }
+
+    status_counts = {}
+    by_mix = {}
+    for s in samples:
+        status_counts[s['status']] = status_counts.get(s['status'], 0) + 1
+        by_mix.setdefault(s['mix'], []).append(s)
+
+    return {
+        'requests': total,
+        'wall_seconds': round(wall_seconds, 3),
+        'throughput_rps': round(len(ok_latencies) / wall_seconds, 3) if wall_seconds > 0 else None,
+        'latency_ms': latency_ms(latencies),
+        'ok_latency_ms': latency_ms(ok_latencies),
+        'error_rate': round(errors / total, 4) if total else None,
+        'timeout_rate': round(timeouts / total, 4) if total else None,
+        'coalesced': coalesced,
+        'coalesced_rate': round(coalesced / total, 4) if total else None,
+        'solver_status': status_counts,
+        'by_mix': {
+            name: {
+                'requests': len(group),
+                'latency_ms': latency_ms(sorted(s['latency_seconds'] for s in group)),
+                'coalesced': sum(1 for s in group if s['coalesced']),
+                'solver_status': {
+                    status: sum(1 for s in group if s['status'] == status)
+                    for status in sorted({s['status'] for s in group}, key=str)
+                }
+            }
+            for name, group in by_mix.items()
+        }
+    }
+
+
+def parse_levels(value: str, cast) -> List:
+    return [cast(v) for v in value.split(',') if v.strip()]
+
+
+def run_load_test(args) -> Dict:
+    """Run every configured level and return the full report"""
+    mix = load_mix(args.mix)
+    payloads = build_payloads(mix, args.seed, args.variants)
+    runner = LoadRunner(args.url, mix, payloads, args.timeout, args.seed)
+
+    if args.warmup:
+        runner.run_closed_loop(1, args.warmup, None)
+
+    levels = []
+    if args.mode == 'closed':
+        for concurrency in parse_levels(args.concurrency, int):
+            wall = runner.run_closed_loop(concurrency, args.requests, args.duration)
+            level = {'mode': 'closed', 'concurrency': concurrency}
+            level.update(summarize(runner.samples, wall))
+            levels.append(level)
+            print(f"closed c={concurrency}: {level['throughput_rps']} rps, "
+                  f"p95={level['latency_ms']['p95']} ms, coalesced={level['coalesced']}", file=sys.stderr)
+    else:
+        for rate in parse_levels(args.rate, float):
+            wall = runner.run_open_loop(rate, args.requests, args.duration,
+                                        args.arrival, args.max_in_flight)
+            level = {'mode': 'open', 'offered_rps': rate, 'arrival': args.arrival}
+            level.update(summarize(runner.samples, wall))
+            levels.append(level)
+            print(f"open rate={rate}: {level['throughput_rps']} rps, "
+                  f"p95={level['latency_ms']['p95']} ms, coalesced={level['coalesced']}", file=sys.stderr)
+
+    return {
+        'harness': 'optimizer_load_test',
+        'url': args.url,
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'host': {
+            'hostname': socket.gethostname(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count()
+        },
+        'config': {
+            'mode': args.mode,
+            'requests_per_level': args.requests,
+            'duration_seconds': args.duration,
+            'timeout_seconds': args.timeout,
+            'seed': args.seed,
+            'variants': args.variants,
+            'mix': mix
+        },
+        'levels': levels
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Optimizer sample request and load generator')
+    parser.add_argument('--url', default='http://localhost:5000/solve')
+    parser.add_argument('--load', action='store_true', help='Run the load generator instead of a single sample')
+    parser.add_argument('--mix', help='JSON file with [{name, weight, trains, segments, time_limit_seconds}]')
+    parser.add_argument('--mode', choices=['closed', 'open'], default='closed')
+    parser.add_argument('--concurrency', default='1,4,8', help='Closed loop: comma-separated worker counts')
+    parser.add_argument('--rate', default='1,2,5', help='Open loop: comma-separated offered req/s')
+    parser.add_argument('--arrival', choices=['poisson', 'uniform'], default='poisson')
+    parser.add_argument('--max-in-flight', type=int, default=256, help='Open loop: client-side concurrency cap')
+    parser.add_argument('--requests', type=int, help='Requests per level')
+    parser.add_argument('--duration', type=float, help='Seconds per level')
+    parser.add_argument('--warmup', type=int, default=2, help='Requests sent before measuring')
+    parser.add_argument('--timeout', type=float, default=60.0, help='Client timeout per request in seconds')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--variants', type=int, default=VARIANTS_PER_MIX_ENTRY,
+                        help='Pre-built instances per mix entry; 0 generates a fresh one per request')
+    parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+    args = parser.parse_args()
+
+    if not args.load:
+        test_optimizer(args.url)
+        return
+
+    if args.requests is None and args.duration is None:
+        args.requests = 100
+
+    report = run_load_test(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+        print(f'Wrote report to {args.output}', file=sys.stderr)
+    else:
+        print(text)
+
+
 if __name__ == '__main__':
-    test_optimizer()
+    main()
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Segment running-time index
+Derives per-segment, per-train-class running time statistics from the
+RailRadar schedules the fetch scripts save under out/, so the optimizer can
+fill in segment.seconds when the payload leaves it out.
+
+    python segment_times.py build ../../out --index segment_times.json.gz
+    python segment_times.py query NDLS NZM --train-class HIGH
+"""
+
+import argparse
+import csv
+import gzip
+import json
+import os
+import re
+import sys
+from typing import Dict, Iterable, List, Optional
+
+INDEX_VERSION = 1
+DEFAULT_INDEX_PATH = os.getenv(
+    'SEGMENT_TIMES_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'segment_times.json.gz')
+)
+ALL_CLASSES = 'ALL'
+PERCENTILES = (10, 50, 90, 95)
+
+# RailRadar train type codes -> Node ingestion categories (constants.js)
+TRAIN_CLASS_BY_TYPE = {
+    'RAJ': 'PREMIUM', 'RAJDHANI': 'PREMIUM', 'SHT': 'PREMIUM', 'SHATABDI': 'PREMIUM',
+    'DRNT': 'PREMIUM', 'DURONTO': 'PREMIUM', 'VB': 'PREMIUM', 'VANDEBHARAT': 'PREMIUM',
+    'JSH': 'HIGH', 'GR': 'HIGH', 'SUF': 'HIGH', 'SUPERFAST': 'HIGH', 'TEJAS': 'HIGH',
+    'MEX': 'MEDIUM', 'EXP': 'MEDIUM', 'MAIL': 'MEDIUM', 'EXPRESS': 'MEDIUM', 'MAILEXPRESS': 'MEDIUM',
+    'PAS': 'LOW', 'PASS': 'LOW', 'PASSENGER': 'LOW', 'MEMU': 'LOW', 'DEMU': 'LOW', 'EMU': 'LOW',
+    'SPL': 'SPECIAL', 'SPECIAL': 'SPECIAL',
+    'FREIGHT': 'FREIGHT', 'GOODS': 'FREIGHT',
+}
+KNOWN_CLASSES = set(TRAIN_CLASS_BY_TYPE.values())
+
+_SCHEDULE_FILE = re.compile(r'train_(?P<train_no>\w+?)_schedule_(?P<date>\d{4}-\d{2}-\d{2})')
+
+
+def normalize_train_class(value: Optional[str]) -> str:
+    """Map a RailRadar type code or Node category to a train class key"""
+    if not value:
+        return ALL_CLASSES
+    key = re.sub(r'[^A-Z]', '', str(value).upper())
+    if key in KNOWN_CLASSES:
+        return key
+    return TRAIN_CLASS_BY_TYPE.get(key, ALL_CLASSES)
+
+
+def parse_clock(value) -> Optional[int]:
+    """Parse 'HH:MM', 'HMM'/'HHMM' or minutes-of-day into seconds of day"""
+    if value is None:
+        return None
+    text = str(value).strip()
+    if not text or text.lower() in ('null', 'none', '--'):
+        return None
+    if ':' in text:
+        hours, minutes = text.split(':')[:2]
+    elif text.isdigit() and len(text) in (3, 4):
+        hours, minutes = text[:-2], text[-2:]
+    else:
+        return None
+    try:
+        return (int(hours) * 60 + int(minutes)) * 60
+    except ValueError:
+        return None
+
+
+def route_rows(route: List[Dict]) -> List[Dict]:
+    """Flatten a RailRadar route into enriched-CSV style rows"""
+    rows = []
+    for stop in route:
+        station = stop.get('station') or {}
+        schedule = stop.get('schedule') or {}
+        rows.append({
+            'code': station.get('code') or station.get('stationCode'),
+            'arr': stop.get('arrival') or schedule.get('arrival'),
+            'dep': stop.get('departure') or schedule.get('departure'),
+            'day': stop.get('day') or stop.get('journeyDay'),
+            'distance': stop.get('distance') if stop.get('distance') is not None
+            else stop.get('distanceKilometers'),
+        })
+    return rows
+
+
+def segment_running_times(rows: List[Dict]) -> List[tuple]:
+    """Return (from, to, seconds) for each consecutive pair of timed stops"""
+    segments = []
+    prev_code = prev_dep = prev_day = None
+    for row in rows:
+        code = (row.get('code') or '').upper() or None
+        arr = parse_clock(row.get('arr'))
+        dep = parse_clock(row.get('dep'))
+        try:
+            day = int(row['day']) if row.get('day') not in (None, '') else None
+        except (TypeError, ValueError):
+            day = None
+
+        if prev_code and code and prev_dep is not None and arr is not None:
+            seconds = arr - prev_dep
+            if day is not None and prev_day is not None:
+                seconds += (day - prev_day) * 86400
+            elif seconds < 0:
+                # Without day numbers, assume a single midnight crossing
+                seconds += 86400
+            if seconds > 0:
+                segments.append((prev_code, code, seconds))
+
+        prev_code = code
+        prev_dep = dep if dep is not None else arr
+        prev_day = day
+    return segments
+
+
+class SegmentTimeIndex:
+    """Histogram-backed running-time statistics keyed by segment and train class"""
+
+    def __init__(self, bin_seconds: int = 60):
+        self.bin_seconds = bin_seconds
+        self.entries: Dict[str, Dict] = {}
+        self.sources = set()
+
+    @staticmethod
+    def key(from_station: str, to_station: str, train_class: str = ALL_CLASSES) -> str:
+        return f'{from_station.upper()}|{to_station.upper()}|{train_class}'
+
+    def add_rows(self, rows: List[Dict], train_class: Optional[str] = None,
+                 source_id: Optional[str] = None) -> int:
+        """Add one train's schedule rows; returns the number of segments added"""
+        if source_id is not None:
+            if source_id in self.sources:
+                return 0
+            self.sources.add(source_id)
+
+        train_class = normalize_train_class(train_class)
+        touched = set()
+        segments = segment_running_times(rows)
+        for from_station, to_station, seconds in segments:
+            keys = {self.key(from_station, to_station)}
+            if train_class != ALL_CLASSES:
+                keys.add(self.key(from_station, to_station, train_class))
+            for key in keys:
+                entry = self.entries.setdefault(key, {'n': 0, 'bins': {}})
+                b = str(seconds // self.bin_seconds)
+                entry['bins'][b] = entry['bins'].get(b, 0) + 1
+                entry['n'] += 1
+                touched.add(key)
+
+        # Only entries that changed get their summary recomputed
+        for key in touched:
+            self._summarize(self.entries[key])
+        return len(segments)
+
+    def add_schedule_payload(self, payload: Dict, source_id: Optional[str] = None) -> int:
+        """Add a raw RailRadar /schedule response"""
+        data = payload.get('data') or {}
+        train = data.get('train') or {}
+        train_class = train.get('type') or train.get('typeDescription')
+        return self.add_rows(route_rows(data.get('route') or []), train_class, source_id)
+
+    def add_file(self, path: str) -> int:
+        """Add a saved schedule JSON or enriched CSV from out/"""
+        name = os.path.basename(path)
+        match = _SCHEDULE_FILE.search(name)
+        source_id = f"{match.group('train_no')}|{match.group('date')}" if match else name
+
+        if name.endswith('.json'):
+            with open(path, encoding='utf-8') as f:
+                return self.add_schedule_payload(json.load(f), source_id)
+
+        with open(path, newline='', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+        # The enriched CSV has no train type; borrow it from the raw JSON beside it
+        train_class = None
+        raw_path = path.replace('_enriched.csv', '.json')
+        if os.path.exists(raw_path):
+            with open(raw_path, encoding='utf-8') as f:
+                train = (json.load(f).get('data') or {}).get('train') or {}
+            train_class = train.get('type') or train.get('typeDescription')
+        return self.add_rows(rows, train_class, source_id)
+
+    def add_paths(self, paths: Iterable[str]) -> int:
+        """Add every schedule file under the given files or directories"""
+        added = 0
+        for path in paths:
+            if os.path.isdir(path):
+                names = sorted(os.listdir(path))
+                # Prefer raw JSON; enriched CSVs of the same train/date dedupe on source_id
+                names.sort(key=lambda n: not n.endswith('.json'))
+                files = [os.path.join(path, n) for n in names
+                         if '_schedule_' in n and (n.endswith('.json') or n.endswith('_enriched.csv'))]
+            else:
+                files = [path]
+            for file_path in files:
+                added += self.add_file(file_path)
+        return added
+
+    def _summarize(self, entry: Dict):
+        bins = sorted((int(b), c) for b, c in entry['bins'].items())
+        n = entry['n']
+        stats = {
+            'min': bins[0][0] * self.bin_seconds,
+            'max': bins[-1][0] * self.bin_seconds,
+            'mean': int(sum(b * self.bin_seconds * c for b, c in bins) / n)
+        }
+        targets = [(p, p / 100.0 * n) for p in PERCENTILES]
+        cumulative = 0
+        t = 0
+        for b, c in bins:
+            cumulative += c
+            while t < len(targets) and cumulative >= targets[t][1]:
+                stats[f'p{targets[t][0]}'] = b * self.bin_seconds
+                t += 1
+        entry['stats'] = stats
+
+    def lookup(self, from_station: str, to_station: str,
+               train_class: Optional[str] = None) -> Optional[Dict]:
+        """O(1) stats lookup, falling back to the all-classes entry"""
+        train_class = normalize_train_class(train_class)
+        entry = self.entries.get(self.key(from_station, to_station, train_class))
+        if entry is None and train_class != ALL_CLASSES:
+            entry = self.entries.get(self.key(from_station, to_station))
+        if entry is None:
+            return None
+        return dict(entry['stats'], n=entry['n'])
+
+    def running_seconds(self, from_station: str, to_station: str,
+                        train_class: Optional[str] = None, stat: str = 'p50') -> Optional[int]:
+        stats = self.lookup(from_station, to_station, train_class)
+        return stats.get(stat) if stats else None
+
+    def segments(self) -> List[tuple]:
+        """(from, to) station pairs with at least one observation"""
+        return sorted({tuple(key.split('|')[:2]) for key in self.entries})
+
+    def to_dict(self) -> Dict:
+        return {
+            'version': INDEX_VERSION,
+            'bin_seconds': self.bin_seconds,
+            'sources': sorted(self.sources),
+            'entries': {k: {'n': e['n'], 'bins': e['bins'], 'stats': e['stats']}
+                        for k, e in self.entries.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'SegmentTimeIndex':
+        if data.get('version') != INDEX_VERSION:
+            raise ValueError(f"Unsupported segment time index version: {data.get('version')}")
+        index = cls(bin_seconds=data['bin_seconds'])
+        index.sources = set(data.get('sources', []))
+        index.entries = data.get('entries', {})
+        return index
+
+    def save(self, path: str = DEFAULT_INDEX_PATH):
+        """Write the index as gzipped compact JSON"""
+        tmp_path = f'{path}.tmp'
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_INDEX_PATH) -> 'SegmentTimeIndex':
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+
+_default_index = None
+
+
+def default_index() -> Optional[SegmentTimeIndex]:
+    """Load the index at SEGMENT_TIMES_PATH once; None if it has not been built"""
+    global _default_index
+    if _default_index is None and os.path.exists(DEFAULT_INDEX_PATH):
+        _default_index = SegmentTimeIndex.load(DEFAULT_INDEX_PATH)
+    return _default_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Segment running-time index')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build = sub.add_parser('build', help='Add schedule files to the index (incremental)')
+    build.add_argument('paths', nargs='+', help='Schedule JSON/CSV files or directories such as out/')
+    build.add_argument('--index', default=DEFAULT_INDEX_PATH)
+    build.add_argument('--rebuild', action='store_true', help='Start from an empty index')
+
+    query = sub.add_parser('query', help='Look up one segment')
+    query.add_argument('from_station')
+    query.add_argument('to_station')
+    query.add_argument('--train-class')
+    query.add_argument('--index', default=DEFAULT_INDEX_PATH)
+
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        if os.path.exists(args.index) and not args.rebuild:
+            index = SegmentTimeIndex.load(args.index)
+        else:
+            index = SegmentTimeIndex()
+        before = len(index.entries)
+        added = index.add_paths(args.paths)
+        index.save(args.index)
+        print(f'Added {added} segment samples; {len(index.entries)} keys '
+              f'({len(index.entries) - before} new) in {args.index}')
+    else:
+        stats = SegmentTimeIndex.load(args.index).lookup(
+            args.from_station, args.to_station, args.train_class)
+        if stats is None:
+            print(f'No data for {args.from_station}->{args.to_station}')
+            sys.exit(1)
+        print(json.dumps(stats, indent=2))
+
+
+if __name__ == '__main__':
+    main()
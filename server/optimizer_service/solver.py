@@ -5,13 +5,18 @@ Implements MILP for train scheduling with conflict resolution
 """
 
 import json
+import os
+import sys
+import threading
 import time
 from datetime import datetime, timezone
 from typing import Dict, List, Tuple, Optional
 from dataclasses import dataclass
 
 from flask import Flask, request, jsonify
-from ortools.sat.python import cp_model
+
+from dominance import dominance_order, DOMINANCE, SYMMETRY
+from segment_times import default_index
 
 
 @dataclass
@@ -30,16 +35,106 @@ class SolverParams:
     time_limit_seconds: int = 20
     headway_seconds: int = 180
     max_hold_minutes: int = 120
+    engine: str = 'auto'  # 'auto' routes each component (dispatch.py); 'cpsat' or 'lns' force one engine
+    lns_threshold_trains: int = 200  # 'auto': components above this size use LNS
+    lns: Optional[Dict] = None
+    fix_dominated_orders: bool = True
+    exact_max_trains: int = 30  # 'auto': single-segment components up to this size are solved exactly
+    exact_node_limit: int = 50000
+    validate: bool = False  # re-check the returned schedule (validate.py) and attach the report
+    coalesce: bool = True  # share one in-flight solve between identical concurrent requests
+    single_track: bool = False  # every A->B shares its block with B->A
+    single_track_segments: Optional[List[List[str]]] = None  # or only these [A, B] station pairs
+    direction_change_headway_seconds: Optional[int] = None  # opposing moves on one block; default headway_seconds
+    cpsat_profile: Optional[str] = 'auto'  # tuned CP-SAT parameters (tuning.py): 'auto' by size, a bucket name, or 'default'
+    cpsat_parameters: Optional[Dict] = None  # explicit CP-SAT parameters, applied over the profile
+    lower_bounds: bool = True  # per-block single-machine bounds (bounds.py) as objective cuts and stop test
+    gap_limit: float = 0.0  # stop once the incumbent is within this fraction of the lower bound
+    
+    def __post_init__(self):
+        self.single_track_pairs = frozenset(
+            frozenset(pair) for pair in (self.single_track_segments or []))
+
+
+def segment_key(train: Train) -> Tuple[str, str]:
+    """Segment a train occupies, in its direction of travel"""
+    return (train.current_station, train.next_station)
+
+
+def track_key(train: Train, params: Optional[SolverParams] = None) -> Tuple[str, str]:
+    """Physical block a train occupies; trains on the same block conflict.
+    
+    Both directions of a single-track section map to one block, keyed by the
+    station pair in sorted order; double track keeps one block per direction.
+    """
+    key = segment_key(train)
+    if params is not None and (params.single_track or frozenset(key) in params.single_track_pairs):
+        return tuple(sorted(key))
+    return key
+
+
+def pair_headway(train_i: Train, train_j: Train, params: SolverParams) -> int:
+    """Headway between two trains on one block; opposing moves may need longer"""
+    if params.direction_change_headway_seconds is not None and \
+            segment_key(train_i) != segment_key(train_j):
+        return params.direction_change_headway_seconds
+    return params.headway_seconds
+
+
+def conflict_groups(trains: List[Train], params: Optional[SolverParams] = None) -> Dict[Tuple[str, str], List[int]]:
+    """Train indices per block: conflicts only ever arise inside a group"""
+    groups: Dict[Tuple[str, str], List[int]] = {}
+    for i, train in enumerate(trains):
+        groups.setdefault(track_key(train, params), []).append(i)
+    return groups
+
+
+def schedule_row(train: Train, start_time_seconds: int) -> Dict:
+    """Result entry for a train entering its segment at start_time_seconds"""
+    start_time_seconds = int(start_time_seconds)
+    
+    # Calculate hold time
+    hold_seconds = max(0, start_time_seconds - train.earliest_entry_seconds)
+    
+    # Convert to ISO strings
+    start_iso = datetime.fromtimestamp(start_time_seconds, tz=timezone.utc).isoformat()
+    arrival_iso = datetime.fromtimestamp(
+        start_time_seconds + train.travel_time_seconds, 
+        tz=timezone.utc
+    ).isoformat()
+    
+    return {
+        'train_no': train.train_no,
+        'optimized_entry_epoch': start_time_seconds,
+        'optimized_entry_iso': start_iso,
+        'optimized_arrival_iso': arrival_iso,
+        'hold_seconds': int(hold_seconds),
+        'action': 'HOLD' if hold_seconds > 0 else 'PROCEED',
+        'priority_score': train.priority_score
+    }
 
 
 class TrainOptimizer:
-    def __init__(self):
+    def __init__(self, segment_times=None):
         self.model = None
         self.solver = None
         self.trains = []
         self.train_indices = {}
         self.variables = {}
         self.solver_params = SolverParams()
+        self.segment_times = segment_times
+        # Optional upper bound on start times; defaults to last release + 1 hour
+        self.max_start_seconds = None
+        # Narrower per-train start windows (index -> (earliest, latest)), e.g. LNS neighbourhoods
+        self.start_windows = {}
+        # Domain of every start variable (index -> (lo, hi)); sizes the big-M per pair
+        self.start_bounds = {}
+        # Trains pinned to a start time (index -> epoch seconds); two pinned
+        # trains need no ordering decision between them
+        self.fixed_starts = {}
+        # Pair orders settled before solving ((i, j) -> i goes first)
+        self.fixed_orders = {}
+        self.preprocessing = {}
     
     def parse_input(self, input_data: Dict) -> Tuple[List[Train], SolverParams]:
         """Parse input JSON and create Train objects"""
@@ -51,7 +146,22 @@ class TrainOptimizer:
         solver_params = SolverParams(
             time_limit_seconds=solver_params_data.get('time_limit_seconds', 20),
             headway_seconds=solver_params_data.get('headway_seconds', 180),
-            max_hold_minutes=solver_params_data.get('max_hold_minutes', 120)
+            max_hold_minutes=solver_params_data.get('max_hold_minutes', 120),
+            engine=solver_params_data.get('engine', 'auto'),
+            lns_threshold_trains=solver_params_data.get('lns_threshold_trains', 200),
+            lns=solver_params_data.get('lns'),
+            fix_dominated_orders=solver_params_data.get('fix_dominated_orders', True),
+            exact_max_trains=solver_params_data.get('exact_max_trains', 30),
+            exact_node_limit=solver_params_data.get('exact_node_limit', 50000),
+            validate=solver_params_data.get('validate', False),
+            coalesce=solver_params_data.get('coalesce', True),
+            single_track=solver_params_data.get('single_track', False),
+            single_track_segments=solver_params_data.get('single_track_segments'),
+            direction_change_headway_seconds=solver_params_data.get('direction_change_headway_seconds'),
+            cpsat_profile=solver_params_data.get('cpsat_profile', 'auto'),
+            cpsat_parameters=solver_params_data.get('cpsat_parameters'),
+            lower_bounds=solver_params_data.get('lower_bounds', True),
+            gap_limit=solver_params_data.get('gap_limit', 0.0)
         )
         
         # Parse trains
@@ -62,7 +172,7 @@ class TrainOptimizer:
                 current_station=train_data['current_station'],
                 next_station=train_data['next_station'],
                 earliest_entry_seconds=train_data['earliest_entry_seconds'],
-                travel_time_seconds=train_data['segment']['seconds'],
+                travel_time_seconds=self._segment_seconds(train_data),
                 dwell_time_seconds=train_data['dwell_time_seconds']
             )
             trains.append(train)
@@ -70,16 +180,59 @@ class TrainOptimizer:
         
         return trains, solver_params
     
+    def _segment_seconds(self, train_data: Dict) -> int:
+        """Segment travel time from the payload, else the running-time index median"""
+        segment = train_data.get('segment') or {}
+        if segment.get('seconds') is not None:
+            return segment['seconds']
+        
+        from_station = segment.get('from') or train_data['current_station']
+        to_station = segment.get('to') or train_data['next_station']
+        index = self.segment_times or default_index()
+        seconds = None
+        if index is not None:
+            train_class = train_data.get('train_class') or train_data.get('priority')
+            seconds = index.running_seconds(from_station, to_station, train_class)
+        if seconds is None:
+            raise ValueError(
+                f"Train {train_data['train_no']}: no segment.seconds and no running-time "
+                f"data for {from_station}->{to_station}"
+            )
+        return seconds
+    
     def build_model(self, trains: List[Train], params: SolverParams):
         """Build CP-SAT model for train scheduling"""
+        # Deferred: OR-Tools is the slowest import and many callers never build a model
+        from ortools.sat.python import cp_model
+        
         self.trains = trains
         self.solver_params = params
         self.model = cp_model.CpModel()
         self.solver = cp_model.CpSolver()
+        self.fixed_orders = {}
+        self.preprocessing = {'ordering_pairs': 0, DOMINANCE: 0, SYMMETRY: 0}
         
         # Set solver parameters
         self.solver.parameters.max_time_in_seconds = params.time_limit_seconds
         
+        # Conflicting pairs come from the per-block index, not a scan over all
+        # pairs; a pair of pinned trains has no order left to decide
+        groups = conflict_groups(trains, params)
+        self.conflict_pairs = [
+            (i, j)
+            for group in groups.values()
+            for a, i in enumerate(group) for j in group[a + 1:]
+            if not (i in self.fixed_starts and j in self.fixed_starts)
+        ]
+        
+        # Tuned parameters for this model's size class, then explicit overrides
+        from tuning import apply_parameters, model_features, select_profile
+        self.cpsat_profile = select_profile(model_features(trains, self.conflict_pairs), params.cpsat_profile)
+        if self.cpsat_profile is not None:
+            apply_parameters(self.solver.parameters, self.cpsat_profile['parameters'])
+        if params.cpsat_parameters:
+            apply_parameters(self.solver.parameters, params.cpsat_parameters)
+        
         # Create variables
         self._create_variables()
         
@@ -88,69 +241,108 @@ class TrainOptimizer:
         
         # Set objective
         self._set_objective()
+        
+        # Cheap lower bounds: cut the objective per block and stop on the gap
+        self.lower_bound = None
+        if params.lower_bounds:
+            from bounds import lower_bound
+            self.lower_bound = lower_bound(trains, params, self.fixed_starts)
+            self._add_bound_constraints(groups)
     
     def _create_variables(self):
         """Create decision variables"""
         max_time = max(train.earliest_entry_seconds for train in self.trains) + 3600  # 1 hour buffer
+        if self.max_start_seconds is not None:
+            max_time = max(max_time, self.max_start_seconds)
         
         # Start time variables for each train
+        self.start_bounds = {}
         for i, train in enumerate(self.trains):
             var_name = f'start_time_{i}'
-            self.variables[var_name] = self.model.NewIntVar(
-                train.earliest_entry_seconds,
-                max_time,
-                var_name
-            )
+            if i in self.fixed_starts:
+                fixed = self.fixed_starts[i]
+                self.start_bounds[i] = (fixed, fixed)
+                self.variables[var_name] = self.model.NewIntVar(fixed, fixed, var_name)
+                continue
+            lo, hi = train.earliest_entry_seconds, max_time
+            if i in self.start_windows:
+                lo = max(lo, self.start_windows[i][0])
+                hi = self.start_windows[i][1]
+            self.start_bounds[i] = (lo, hi)
+            self.variables[var_name] = self.model.NewIntVar(lo, hi, var_name)
         
         # Ordering variables for conflicting trains
-        for i in range(len(self.trains)):
-            for j in range(i + 1, len(self.trains)):
-                if self._trains_conflict(i, j):
-                    var_name = f'order_{i}_{j}'
-                    self.variables[var_name] = self.model.NewBoolVar(var_name)
+        for i, j in self.conflict_pairs:
+            self.preprocessing['ordering_pairs'] += 1
+            fixed = self._dominance(i, j)
+            if fixed is not None:
+                # Order known up front: plain precedence, no decision variable
+                self.fixed_orders[(i, j)] = fixed[0]
+                self.preprocessing[fixed[1]] += 1
+                continue
+            var_name = f'order_{i}_{j}'
+            self.variables[var_name] = self.model.NewBoolVar(var_name)
     
     def _trains_conflict(self, i: int, j: int) -> bool:
-        """Check if two trains conflict (same segment)"""
-        train_i = self.trains[i]
-        train_j = self.trains[j]
-        
-        # Trains conflict if they share the same segment
-        return (train_i.current_station == train_j.current_station and 
-                train_i.next_station == train_j.next_station)
+        """Check if two trains conflict (same block)"""
+        # Trains conflict if they share the same block, in either direction on single track
+        return track_key(self.trains[i], self.solver_params) == track_key(self.trains[j], self.solver_params)
+    
+    def _dominance(self, i: int, j: int):
+        """Dominance/symmetry fixing for a free pair, if enabled"""
+        if not self.solver_params.fix_dominated_orders:
+            return None
+        if i in self.fixed_starts or j in self.fixed_starts:
+            # Swapping start times would move a pinned train
+            return None
+        if pair_headway(self.trains[i], self.trains[j], self.solver_params) != self.solver_params.headway_seconds:
+            # Opposing trains with a direction-change headway are not interchangeable
+            return None
+        return dominance_order(self.trains[i], self.trains[j])
     
     def _add_constraints(self):
         """Add constraints to the model"""
         # Headway constraints for conflicting trains
-        for i in range(len(self.trains)):
-            for j in range(i + 1, len(self.trains)):
-                if self._trains_conflict(i, j):
-                    self._add_headway_constraint(i, j)
+        for i, j in self.conflict_pairs:
+            self._add_headway_constraint(i, j)
     
     def _add_headway_constraint(self, i: int, j: int):
         """Add headway constraint between two conflicting trains"""
         train_i = self.trains[i]
         train_j = self.trains[j]
-        headway = self.solver_params.headway_seconds
+        headway = pair_headway(train_i, train_j, self.solver_params)
         
         start_i = self.variables[f'start_time_{i}']
         start_j = self.variables[f'start_time_{j}']
+        
+        if (i, j) in self.fixed_orders:
+            if self.fixed_orders[(i, j)]:
+                self.model.Add(start_i + train_i.travel_time_seconds + headway <= start_j)
+            else:
+                self.model.Add(start_j + train_j.travel_time_seconds + headway <= start_i)
+            return
+        
         order_var = self.variables[f'order_{i}_{j}']
         
-        # Large constant for big-M constraint
-        M = 86400  # 24 hours in seconds
+        # Big-M from the variable domains: just large enough to switch each
+        # constraint off, whatever the horizon (a fixed 24h fails past a day)
+        lo_i, hi_i = self.start_bounds[i]
+        lo_j, hi_j = self.start_bounds[j]
+        m_i = max(0, hi_i + train_i.travel_time_seconds + headway - lo_j)
+        m_j = max(0, hi_j + train_j.travel_time_seconds + headway - lo_i)
         
         # If order_var = 1, then train i goes first
         # start_i + travel_time_i + headway <= start_j + M * (1 - order_var)
         self.model.Add(
             start_i + train_i.travel_time_seconds + headway <= 
-            start_j + M * (1 - order_var)
+            start_j + m_i * (1 - order_var)
         )
         
         # If order_var = 0, then train j goes first
         # start_j + travel_time_j + headway <= start_i + M * order_var
         self.model.Add(
             start_j + train_j.travel_time_seconds + headway <= 
-            start_i + M * order_var
+            start_i + m_j * order_var
         )
     
     def _set_objective(self):
@@ -168,45 +360,66 @@ class TrainOptimizer:
         # Minimize total weighted delay
         self.model.Minimize(sum(delay_terms))
     
+    def _add_bound_constraints(self, groups: Dict[Tuple[str, str], List[int]]):
+        """Redundant per-block objective cuts; the big-M relaxation alone bounds weakly"""
+        for key, group in groups.items():
+            bound = self.lower_bound.by_block.get(key, 0)
+            if bound <= 0 or len(group) < 2:
+                continue
+            self.model.Add(sum(
+                (self.variables[f'start_time_{i}'] - self.trains[i].earliest_entry_seconds)
+                * self.trains[i].priority_score
+                for i in group
+            ) >= bound)
+    
     def solve(self) -> Dict:
         """Solve the model and return results"""
         start_time = time.time()
         
-        # Solve
-        status = self.solver.Solve(self.model)
+        # Profiled requests collect the search log and model statistics
+        from profiling import current_capture
+        capture = current_capture()
+        model_stats = capture.attach(self.solver, self.model) if capture is not None else None
+        
+        # Solve; with a lower bound, stop as soon as the incumbent is within gap_limit of it
+        from bounds import gap_stopper
+        stopper = None
+        if self.lower_bound is not None:
+            stopper = gap_stopper(self.lower_bound.value, self.solver_params.gap_limit)
+        status = self.solver.Solve(self.model, stopper)
         solve_time = time.time() - start_time
+        if capture is not None:
+            capture.record_response(model_stats, self.solver)
+        
+        from ortools.sat.python import cp_model
+        from bounds import CPSAT, SINGLE_MACHINE, relative_gap
         
         # Parse results
         results = []
         objective_value = 0
         
+        bounds = {}
         if status in [cp_model.OPTIMAL, cp_model.FEASIBLE]:
             objective_value = self.solver.ObjectiveValue()
+            lower, source = self.solver.BestObjectiveBound(), CPSAT
+            if self.lower_bound is not None and self.lower_bound.value >= lower:
+                lower, source = self.lower_bound.value, SINGLE_MACHINE
+            if objective_value <= lower:
+                # Incumbent meets the bound: optimal even if the search was cut short
+                status = cp_model.OPTIMAL
+            elif status == cp_model.OPTIMAL:
+                # CP-SAT stopped inside a relative/absolute gap limit: not proven
+                status = cp_model.FEASIBLE
+            bounds = {
+                'lower_bound': lower,
+                'bound_source': source,
+                'gap': relative_gap(objective_value, lower),
+                'stopped_on_gap': bool(stopper is not None and stopper.stopped)
+            }
             
             for i, train in enumerate(self.trains):
                 start_var = self.variables[f'start_time_{i}']
-                start_time_seconds = self.solver.Value(start_var)
-                
-                # Calculate hold time
-                hold_seconds = max(0, start_time_seconds - train.earliest_entry_seconds)
-                
-                # Convert to ISO strings
-                start_iso = datetime.fromtimestamp(start_time_seconds, tz=timezone.utc).isoformat()
-                arrival_iso = datetime.fromtimestamp(
-                    start_time_seconds + train.travel_time_seconds, 
-                    tz=timezone.utc
-                ).isoformat()
-                
-                result = {
-                    'train_no': train.train_no,
-                    'optimized_entry_epoch': start_time_seconds,
-                    'optimized_entry_iso': start_iso,
-                    'optimized_arrival_iso': arrival_iso,
-                    'hold_seconds': int(hold_seconds),
-                    'action': 'HOLD' if hold_seconds > 0 else 'PROCEED',
-                    'priority_score': train.priority_score
-                }
-                results.append(result)
+                results.append(schedule_row(train, self.solver.Value(start_var)))
         
         elif status == cp_model.INFEASIBLE:
             # Fallback: greedy heuristic
@@ -224,7 +437,15 @@ class TrainOptimizer:
             'solver_meta': {
                 'status': status_map.get(status, 'UNKNOWN'),
                 'objective_value': objective_value,
-                'solve_time_seconds': solve_time
+                'solve_time_seconds': solve_time,
+                'engine': 'cpsat',
+                'cpsat_profile': self.cpsat_profile['name'] if self.cpsat_profile else None,
+                **bounds,
+                'preprocessing': {
+                    'ordering_pairs': self.preprocessing.get('ordering_pairs', 0),
+                    'fixed_by_dominance': self.preprocessing.get(DOMINANCE, 0),
+                    'fixed_by_symmetry': self.preprocessing.get(SYMMETRY, 0)
+                }
             },
             'results': results
         }
@@ -240,24 +461,7 @@ class TrainOptimizer:
         for train in sorted_trains:
             # Assign sequential slots
             start_time_seconds = max(current_time, train.earliest_entry_seconds)
-            hold_seconds = max(0, start_time_seconds - train.earliest_entry_seconds)
-            
-            start_iso = datetime.fromtimestamp(start_time_seconds, tz=timezone.utc).isoformat()
-            arrival_iso = datetime.fromtimestamp(
-                start_time_seconds + train.travel_time_seconds, 
-                tz=timezone.utc
-            ).isoformat()
-            
-            result = {
-                'train_no': train.train_no,
-                'optimized_entry_epoch': start_time_seconds,
-                'optimized_entry_iso': start_iso,
-                'optimized_arrival_iso': arrival_iso,
-                'hold_seconds': int(hold_seconds),
-                'action': 'HOLD' if hold_seconds > 0 else 'PROCEED',
-                'priority_score': train.priority_score
-            }
-            results.append(result)
+            results.append(schedule_row(train, start_time_seconds))
             
             # Update current time for next train
             current_time = start_time_seconds + train.travel_time_seconds + self.solver_params.headway_seconds
@@ -265,9 +469,120 @@ class TrainOptimizer:
         return results
 
 
+PROCESS_STARTED = time.time()
+
 # Flask app
 app = Flask(__name__)
 
+# Helper modules import this file as `solver`; when it runs as a script,
+# register it under that name so they share this module instead of reloading it
+sys.modules.setdefault('solver', sys.modules[__name__])
+
+_incremental_sessions = None
+
+
+def incremental_sessions():
+    """Process-wide store of incremental sessions, created on first use"""
+    global _incremental_sessions
+    if _incremental_sessions is None:
+        from incremental import SessionStore
+        _incremental_sessions = SessionStore()
+    return _incremental_sessions
+
+
+def solve_trains(optimizer: TrainOptimizer, trains: List[Train], solver_params: SolverParams) -> Dict:
+    """Run the engine selected by solver_params.engine"""
+    if solver_params.engine == 'auto':
+        # Per-component routing to the exact engine, CP-SAT or LNS
+        from dispatch import dispatch
+        return dispatch(trains, solver_params)
+    if solver_params.engine == 'lns':
+        # Large instances: neighbourhood search instead of one full model
+        from lns import LNSOptimizer, LNSParams
+        return LNSOptimizer(LNSParams.from_dict(solver_params.lns)).solve(trains, solver_params)
+    # Build and solve model
+    optimizer.build_model(trains, solver_params)
+    return optimizer.solve()
+
+
+_spatial_index = None
+_solve_flights = None
+_history_store = None
+_history_lock = threading.Lock()
+
+
+def spatial_index():
+    """Stations from stations_geo.json and the running-time index's segments, built on first use"""
+    global _spatial_index
+    if _spatial_index is None:
+        from spatial import SpatialIndex, load_stations, index_segments
+        _spatial_index = SpatialIndex(load_stations(), index_segments())
+    return _spatial_index
+
+
+def solve_flights():
+    """Process-wide single-flight group for /solve, created on first use"""
+    global _solve_flights
+    if _solve_flights is None:
+        from coalesce import SingleFlight
+        _solve_flights = SingleFlight()
+    return _solve_flights
+
+
+def history_store():
+    """Process-wide solve history (history.py), or None when HISTORY_DB is off"""
+    global _history_store
+    if _history_store is None:
+        from history import ENABLED, HistoryStore
+        if not ENABLED:
+            return None
+        with _history_lock:
+            if _history_store is None:
+                _history_store = HistoryStore()
+    return _history_store
+
+
+def _solver_settings_error(input_data: Dict):
+    """400 response for an unknown CP-SAT profile or parameter, else None"""
+    from tuning import validate_settings
+    params = input_data.get('solver_params') or {}
+    try:
+        validate_settings(params.get('cpsat_profile', 'auto'), params.get('cpsat_parameters'))
+    except ValueError as e:
+        return jsonify({'error': f'Invalid solver parameters: {str(e)}'}), 400
+    return None
+
+
+def solve_request(input_data: Dict, coalesce: bool = True) -> Optional[Dict]:
+    """Parse and solve one /solve payload; None if it has no trains"""
+    # Create optimizer
+    optimizer = TrainOptimizer()
+    
+    # Parse input
+    trains, solver_params = optimizer.parse_input(input_data)
+    
+    if not trains:
+        return None
+    
+    def run():
+        result = solve_trains(optimizer, trains, solver_params)
+        if solver_params.validate:
+            from validate import validate_result
+            validation = validate_result(trains, result, solver_params)
+            result['validation'] = validation['validation_meta']
+            result['validation']['violation_details'] = validation['violations'][:100]
+        return result
+    
+    # Identical concurrent requests (burst refreshes) share one solve
+    key = None
+    if coalesce and solver_params.coalesce:
+        from coalesce import canonical_key
+        key = canonical_key(input_data)
+    result, shared = solve_flights().do(key, run)
+    if shared:
+        result['solver_meta']['coalesced'] = True
+    return result
+
 
 @app.route('/solve', methods=['POST'])
 def solve():
@@ -277,21 +592,69 @@ def solve():
         if not input_data:
             return jsonify({'error': 'No input data provided'}), 400
         
-        # Create optimizer
-        optimizer = TrainOptimizer()
+        error = _solver_settings_error(input_data)
+        if error:
+            return error
+        
+        from profiling import should_profile
+        
+        # Read from the raw payload so parse_input itself is inside the profile
+        profile_flag = bool((input_data.get('solver_params') or {}).get('profile'))
+        if should_profile(profile_flag, request.headers.get('X-Profile')):
+            from profiling import profiled, write_bundle
+            # Not coalesced: the capture follows this request's own thread
+            result, profile, capture, seconds = profiled(solve_request, input_data, False)
+            if result is not None:
+                result['profile'] = {
+                    'bundle': write_bundle(input_data, result, profile, capture, seconds),
+                    'wall_seconds': seconds,
+                    'models_captured': len(capture.models)
+                }
+        else:
+            result = solve_request(input_data)
         
-        # Parse input
-        trains, solver_params = optimizer.parse_input(input_data)
+        if result is None:
+            return jsonify({'error': 'No valid trains provided'}), 400
         
-        if not trains:
+        # Add run_id to result
+        result['run_id'] = input_data.get('run_id', f'optim_{int(time.time())}')
+        
+        # Queued for the history writer thread; never waits on the database
+        header = request.headers.get('X-History')
+        if not (header and header.lower() in ('0', 'false', 'no')):
+            store = history_store()
+            if store is not None:
+                store.record(input_data, result)
+        
+        return jsonify(result)
+        
+    except Exception as e:
+        return jsonify({'error': f'Solver error: {str(e)}'}), 500
+
+
+@app.route('/solve/incremental', methods=['POST'])
+def solve_incremental():
+    """Re-solve only the segments that changed since this session's last call"""
+    try:
+        input_data = request.get_json()
+        if not input_data:
+            return jsonify({'error': 'No input data provided'}), 400
+        
+        if not input_data.get('trains'):
             return jsonify({'error': 'No valid trains provided'}), 400
         
-        # Build and solve model
-        optimizer.build_model(trains, solver_params)
-        result = optimizer.solve()
+        error = _solver_settings_error(input_data)
+        if error:
+            return error
+        
+        store = incremental_sessions()
+        session_id = str(input_data.get('session_id', 'default'))
+        if input_data.get('reset'):
+            store.drop(session_id)
+        result = store.get(session_id).update(input_data)
         
-        # Add run_id to result
         result['run_id'] = input_data.get('run_id', f'optim_{int(time.time())}')
+        result['session_id'] = session_id
         
         return jsonify(result)
         
@@ -299,12 +662,303 @@ def solve():
         return jsonify({'error': f'Solver error: {str(e)}'}), 500
 
 
+@app.route('/simulate', methods=['POST'])
+def simulate():
+    """Monte Carlo delay robustness of a /solve result"""
+    try:
+        body = request.get_json()
+        if not body or 'input' not in body or 'result' not in body:
+            return jsonify({'error': 'Provide the /solve input and its result'}), 400
+        
+        from simulate import Scenario, simulate_plan
+        
+        optimizer = TrainOptimizer()
+        trains, solver_params = optimizer.parse_input(body['input'])
+        if not trains:
+            return jsonify({'error': 'No valid trains provided'}), 400
+        
+        planned = {row['train_no']: row['optimized_entry_epoch']
+                   for row in body['result'].get('results', [])}
+        missing = [t.train_no for t in trains if t.train_no not in planned]
+        if missing:
+            return jsonify({'error': f'Result has no plan for trains: {missing[:10]}'}), 400
+        
+        scenario = Scenario.from_dict(body.get('scenario'))
+        result = simulate_plan(trains, [planned[t.train_no] for t in trains],
+                               solver_params.headway_seconds, scenario, solver_params)
+        result['run_id'] = body['result'].get('run_id') or body['input'].get('run_id')
+        
+        return jsonify(result)
+        
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': f'Invalid simulation request: {str(e)}'}), 400
+    except Exception as e:
+        return jsonify({'error': f'Simulation error: {str(e)}'}), 500
+
+
+@app.route('/validate', methods=['POST'])
+def validate():
+    """Check and score a schedule: a /solve result or an edited plan in the same shape"""
+    try:
+        body = request.get_json()
+        if not body or 'input' not in body or 'result' not in body:
+            return jsonify({'error': 'Provide the /solve input and the schedule to check'}), 400
+        
+        from validate import validate_result
+        
+        optimizer = TrainOptimizer()
+        trains, solver_params = optimizer.parse_input(body['input'])
+        if not trains:
+            return jsonify({'error': 'No valid trains provided'}), 400
+        
+        result = validate_result(trains, body['result'], solver_params)
+        result['run_id'] = body['result'].get('run_id') or body['input'].get('run_id')
+        
+        return jsonify(result)
+        
+    except (ValueError, TypeError, KeyError) as e:
+        return jsonify({'error': f'Invalid validation request: {str(e)}'}), 400
+    except Exception as e:
+        return jsonify({'error': f'Validation error: {str(e)}'}), 500
+
+
+@app.route('/corridor/stats', methods=['POST'])
+def corridor():
+    """Occupancy statistics of the as-is schedule and, if given or solved, the optimized one"""
+    try:
+        body = request.get_json()
+        if not body or 'input' not in body:
+            return jsonify({'error': 'Provide the /solve input'}), 400
+        
+        from corridor import corridor_stats, compare_stats
+        
+        optimizer = TrainOptimizer()
+        trains, solver_params = optimizer.parse_input(body['input'])
+        if not trains:
+            return jsonify({'error': 'No valid trains provided'}), 400
+        
+        bucket_seconds = int(body.get('bucket_seconds', 900))
+        top_windows = int(body.get('top_windows', 10))
+        headway = solver_params.headway_seconds
+        
+        # As-is: every train enters at its earliest entry time
+        before = corridor_stats(trains, [t.earliest_entry_seconds for t in trains],
+                                headway, bucket_seconds, top_windows, solver_params)
+        response = {'before': before}
+        
+        result = body.get('result')
+        if result is None and body.get('solve'):
+            result = solve_trains(optimizer, trains, solver_params)
+        if result is not None:
+            planned = {row['train_no']: row['optimized_entry_epoch']
+                       for row in result.get('results', [])}
+            missing = [t.train_no for t in trains if t.train_no not in planned]
+            if missing:
+                return jsonify({'error': f'Result has no plan for trains: {missing[:10]}'}), 400
+            after = corridor_stats(trains, [planned[t.train_no] for t in trains],
+                                   headway, bucket_seconds, top_windows, solver_params)
+            response['after'] = after
+            response['comparison'] = compare_stats(before, after)
+        
+        response['run_id'] = (result or {}).get('run_id') or body['input'].get('run_id')
+        return jsonify(response)
+        
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': f'Invalid corridor request: {str(e)}'}), 400
+    except Exception as e:
+        return jsonify({'error': f'Corridor stats error: {str(e)}'}), 500
+
+
+@app.route('/snap', methods=['POST'])
+def snap():
+    """Snap live positions to segments and estimate each train's next entry time"""
+    try:
+        body = request.get_json()
+        if not body or not body.get('positions'):
+            return jsonify({'error': 'No positions provided'}), 400
+        
+        if body.get('segments'):
+            # Caller-supplied network, e.g. one zone's polylines
+            from spatial import SpatialIndex, load_stations
+            index = SpatialIndex(
+                load_stations(),
+                [(seg['from'], seg['to'], seg.get('points')) for seg in body['segments']],
+                max_snap_km=float(body.get('max_snap_km', 5.0))
+            )
+        else:
+            index = spatial_index()
+        
+        now = int(body.get('timestamp', time.time()))
+        positions = index.snap_positions(body['positions'], now)
+        return jsonify({
+            'snap_meta': {
+                'positions': len(positions),
+                'matched': sum(1 for p in positions if p['matched']),
+                'segments': len(index.geometries),
+                'timestamp': now
+            },
+            'positions': positions
+        })
+        
+    except (ValueError, TypeError, KeyError) as e:
+        return jsonify({'error': f'Invalid snap request: {str(e)}'}), 400
+    except Exception as e:
+        return jsonify({'error': f'Snap error: {str(e)}'}), 500
+
+
+def _history_or_404():
+    store = history_store()
+    if store is None:
+        return None, (jsonify({'error': 'Solve history is disabled (HISTORY_DB=off)'}), 404)
+    return store, None
+
+
+@app.route('/history/runs', methods=['GET'])
+def history_runs():
+    """Past runs, newest first: ?since=&until=&corridor=&digest=&run_id=&limit="""
+    store, error = _history_or_404()
+    if error:
+        return error
+    try:
+        args = request.args
+        runs = store.runs(args.get('since'), args.get('until'), args.get('corridor'),
+                          args.get('digest'), args.get('run_id'), int(args.get('limit', 100)))
+        return jsonify({'runs': runs})
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': f'Invalid history query: {str(e)}'}), 400
+
+
+@app.route('/history/results', methods=['GET'])
+def history_results():
+    """Per-train results: ?train_no=&segment=FROM-TO&since=&until=&min_hold_seconds=&limit="""
+    store, error = _history_or_404()
+    if error:
+        return error
+    try:
+        args = request.args
+        segment = args['segment'].split('-', 1) if args.get('segment') else None
+        rows = store.results(args.get('train_no'), segment, args.get('since'), args.get('until'),
+                             int(args.get('min_hold_seconds', 0)), int(args.get('limit', 1000)))
+        return jsonify({'results': rows})
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': f'Invalid history query: {str(e)}'}), 400
+
+
+@app.route('/history/solve-times', methods=['GET'])
+def history_solve_times():
+    """Solve time per corridor per bucket: ?bucket_seconds=3600&since=&until=&corridor="""
+    store, error = _history_or_404()
+    if error:
+        return error
+    try:
+        args = request.args
+        stats = store.solve_time_stats(int(args.get('bucket_seconds', 3600)), args.get('since'),
+                                       args.get('until'), args.get('corridor'))
+        return jsonify({'solve_times': stats})
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': f'Invalid history query: {str(e)}'}), 400
+
+
+@app.route('/history/compare', methods=['GET'])
+def history_compare():
+    """Per-train differences between two runs: ?a=<run_id>&b=<run_id>"""
+    store, error = _history_or_404()
+    if error:
+        return error
+    if not request.args.get('a') or not request.args.get('b'):
+        return jsonify({'error': 'Provide run ids a and b'}), 400
+    try:
+        return jsonify(store.compare(request.args['a'], request.args['b']))
+    except KeyError as e:
+        return jsonify({'error': str(e.args[0])}), 404
+
+
+# Tiny instance that exercises every code path a first real request would hit
+WARM_UP_INPUT = {
+    'run_id': 'warm_up',
+    'trains': [
+        {'train_no': f'WARM{k}', 'priority_score': 100 - 10 * k, 'current_station': 'WA',
+         'next_station': 'WB', 'earliest_entry_seconds': 1758304239 + 60 * k,
+         'dwell_time_seconds': 0, 'segment': {'seconds': 300}}
+        for k in range(3)
+    ],
+    'solver_params': {'time_limit_seconds': 2, 'headway_seconds': 180, 'coalesce': False}
+}
+
+_warm_up = {'state': 'cold', 'started_at': None, 'seconds': None, 'error': None}
+_warm_up_lock = threading.Lock()
+_ready = threading.Event()
+
+
+def warm_up() -> float:
+    """Import the lazy modules and solve WARM_UP_INPUT with each engine"""
+    started = time.time()
+    default_index()
+    # Through the test client so Flask's request and JSON paths are warm too
+    client = app.test_client()
+    for engine in ('cpsat', 'auto'):
+        payload = dict(WARM_UP_INPUT, solver_params=dict(WARM_UP_INPUT['solver_params'], engine=engine))
+        response = client.post('/solve', json=payload, headers={'X-Profile': '0', 'X-History': '0'})
+        if response.status_code != 200:
+            raise RuntimeError(f"Warm-up solve failed: {response.get_json().get('error')}")
+    # Open the history database and start its writer now, not on the first
+    # real /solve (the synthetic runs above are not recorded)
+    history_store()
+    return time.time() - started
+
+
+def _run_warm_up():
+    try:
+        _warm_up['seconds'] = warm_up()
+        _warm_up['state'] = 'ready'
+        _ready.set()
+    except Exception as e:
+        _warm_up['state'] = 'failed'
+        _warm_up['error'] = str(e)
+
+
+def start_warm_up(background: bool = True):
+    """Start the warm-up once; /ready reports ready when it has finished"""
+    with _warm_up_lock:
+        if _warm_up['state'] != 'cold':
+            return
+        _warm_up['state'] = 'warming_up'
+        _warm_up['started_at'] = time.time()
+    if background:
+        threading.Thread(target=_run_warm_up, name='warm-up', daemon=True).start()
+    else:
+        _run_warm_up()
+
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness: 200 once the warm-up solve has run, 503 before that"""
+    # Under a WSGI server nothing ran __main__; the first probe starts the warm-up
+    start_warm_up()
+    body = {
+        'status': _warm_up['state'],
+        'warm_up_seconds': _warm_up['seconds'],
+        'uptime_seconds': time.time() - PROCESS_STARTED
+    }
+    if _warm_up['error']:
+        body['error'] = _warm_up['error']
+    return jsonify(body), 200 if _ready.is_set() else 503
+
+
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
-    return jsonify({'status': 'ok', 'service': 'train-optimizer'})
+    status = {'status': 'ok', 'service': 'train-optimizer'}
+    if _solve_flights is not None:
+        status['coalescing'] = _solve_flights.stats()
+    if _history_store is not None:
+        status['history'] = _history_store.stats()
+    return jsonify(status)
 
 
 if __name__ == '__main__':
     print("Starting Train Optimizer Service...")
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # With the reloader only the child process serves; don't warm up the watcher
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_warm_up()
+    app.run(host='0.0.0.0', port=int(os.getenv('PORT', '5000')), debug=True)
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Spatial index for live train positions
+Projects station coordinates (stations_geo.json) and segment polylines to
+a local plane in kilometres, cuts every polyline into pieces no longer than
+one grid cell and registers each piece in the cells within snapping range.
+A batch of live positions is then snapped with array operations only: one
+cell lookup per position, projection onto the candidate pieces, and the
+nearest piece per position. The snap gives the segment, progress along it,
+and the remaining running time to the segment's end station, which is the
+train's earliest entry to its next segment.
+
+    python spatial.py 28.40 77.31 --next-station AGC
+"""
+
+import argparse
+import json
+import math
+import os
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from segment_times import default_index
+
+EARTH_RADIUS_KM = 6371.0088
+DEFAULT_STATIONS_PATH = os.getenv(
+    'STATIONS_GEO_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'config', 'stations_geo.json')
+)
+DEFAULT_SPEED_KMH = 60.0  # running-time fallback when the index has no entry
+
+
+def load_stations(path: str = DEFAULT_STATIONS_PATH) -> Dict[str, Tuple[float, float]]:
+    """{CODE: (lat, lon)} from a stations_geo.json file"""
+    with open(path, encoding='utf-8') as f:
+        geo = json.load(f)
+    return {code.upper(): (float(c['lat']), float(c['lon'])) for code, c in geo.items()}
+
+
+class _PieceGrid:
+    """Uniform grid over line pieces; a piece is listed in every cell within radius of it"""
+
+    def __init__(self, a: np.ndarray, b: np.ndarray, cell_km: float, radius_km: float):
+        self.a, self.b = a, b
+        self.cell = cell_km
+        lo = np.floor((np.minimum(a, b) - radius_km) / cell_km).astype(np.int64)
+        hi = np.floor((np.maximum(a, b) + radius_km) / cell_km).astype(np.int64)
+        self.origin = lo.min(axis=0) if len(a) else np.zeros(2, dtype=np.int64)
+        self.width = int((hi[:, 1].max() - self.origin[1] + 3)) if len(a) else 1
+
+        # Expand each piece's cell range into (cell key, piece) pairs
+        nx, ny = hi[:, 0] - lo[:, 0] + 1, hi[:, 1] - lo[:, 1] + 1
+        per_piece = nx * ny
+        piece = np.repeat(np.arange(len(a)), per_piece)
+        offset = np.arange(per_piece.sum()) - np.repeat(np.cumsum(per_piece) - per_piece, per_piece)
+        cx = lo[piece, 0] + offset // ny[piece]
+        cy = lo[piece, 1] + offset % ny[piece]
+        keys = self._key(cx, cy)
+        order = np.argsort(keys, kind='stable')
+        self.keys, self.pieces = keys[order], piece[order]
+
+    def _key(self, cx: np.ndarray, cy: np.ndarray) -> np.ndarray:
+        return (cx - self.origin[0]) * self.width + (cy - self.origin[1])
+
+    def nearest(self, p: np.ndarray, radius_km: float):
+        """(piece, t along piece, distance) per point; piece -1 if none within radius"""
+        n = len(p)
+        cells = np.floor(p / self.cell).astype(np.int64)
+        inside = ((cells[:, 1] >= self.origin[1]) & (cells[:, 1] < self.origin[1] + self.width)
+                  & (cells[:, 0] >= self.origin[0]))
+        keys = self._key(cells[:, 0], cells[:, 1])
+        first = np.searchsorted(self.keys, keys, side='left')
+        last = np.searchsorted(self.keys, keys, side='right')
+        counts = np.where(inside, last - first, 0)
+
+        point = np.repeat(np.arange(n), counts)
+        offset = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        piece = self.pieces[np.repeat(first, counts) + offset]
+
+        a, b, q = self.a[piece], self.b[piece], p[point]
+        ab = b - a
+        length_sq = (ab * ab).sum(axis=1)
+        t = np.clip(((q - a) * ab).sum(axis=1) / np.where(length_sq > 0, length_sq, 1.0), 0.0, 1.0)
+        dist = np.hypot(*(a + t[:, None] * ab - q).T)
+
+        best_piece = np.full(n, -1, dtype=np.int64)
+        best_t = np.zeros(n)
+        best_dist = np.full(n, np.inf)
+        keep = dist <= radius_km
+        point, piece, t, dist = point[keep], piece[keep], t[keep], dist[keep]
+        if point.size:
+            order = np.lexsort((dist, point))
+            winners, first_hit = np.unique(point[order], return_index=True)
+            pick = order[first_hit]
+            best_piece[winners] = piece[pick]
+            best_t[winners] = t[pick]
+            best_dist[winners] = dist[pick]
+        return best_piece, best_t, best_dist
+
+
+class SpatialIndex:
+    """Stations and segment polylines, snapped against in batches"""
+
+    def __init__(self, stations: Dict[str, Tuple[float, float]],
+                 segments: Iterable[Tuple[str, str, Optional[Sequence[Tuple[float, float]]]]],
+                 max_snap_km: float = 5.0, station_radius_km: float = 1.5, segment_times=None):
+        self.stations = {code.upper(): ll for code, ll in stations.items()}
+        self.max_snap_km = max_snap_km
+        self.station_radius_km = station_radius_km
+        self.segment_times = segment_times
+        lats = [lat for lat, _ in self.stations.values()] or [0.0]
+        self.cos_lat0 = math.cos(math.radians(sum(lats) / len(lats)))
+
+        # One geometry per station pair; A->B and B->A share it
+        self.geometries: List[Tuple[str, str]] = []
+        self.lengths: List[float] = []
+        seen = set()
+        a, b, geometry, along = [], [], [], []
+        for from_station, to_station, points in segments:
+            from_station, to_station = from_station.upper(), to_station.upper()
+            pair = frozenset((from_station, to_station))
+            if pair in seen or from_station not in self.stations or to_station not in self.stations:
+                continue
+            seen.add(pair)
+            line = [self.stations[from_station], *(points or []), self.stations[to_station]]
+            xy = self.project(np.array([p[0] for p in line]), np.array([p[1] for p in line]))
+            xy = self._densify(xy, max_snap_km)
+            steps = np.hypot(*np.diff(xy, axis=0).T)
+            g = len(self.geometries)
+            self.geometries.append((from_station, to_station))
+            self.lengths.append(float(steps.sum()))
+            a.append(xy[:-1])
+            b.append(xy[1:])
+            geometry.append(np.full(len(steps), g))
+            along.append(np.concatenate(([0.0], np.cumsum(steps)[:-1])))
+
+        empty = np.zeros((0, 2))
+        self.piece_a = np.concatenate(a) if a else empty
+        self.piece_b = np.concatenate(b) if b else empty
+        self.piece_geometry = np.concatenate(geometry) if geometry else np.zeros(0, dtype=np.int64)
+        self.piece_along = np.concatenate(along) if along else np.zeros(0)
+        self.piece_length = np.hypot(*(self.piece_b - self.piece_a).T)
+        self.segment_grid = _PieceGrid(self.piece_a, self.piece_b, max_snap_km, max_snap_km)
+
+        # Stations are zero-length pieces on their own grid
+        self.station_codes = list(self.stations)
+        station_xy = self.project(np.array([self.stations[c][0] for c in self.station_codes]),
+                                  np.array([self.stations[c][1] for c in self.station_codes]))
+        self.station_grid = _PieceGrid(station_xy, station_xy, max(station_radius_km, 0.5),
+                                       station_radius_km)
+
+    def project(self, lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+        """Equirectangular projection to kilometres around the stations' mean latitude"""
+        return np.column_stack((
+            EARTH_RADIUS_KM * np.radians(lon) * self.cos_lat0,
+            EARTH_RADIUS_KM * np.radians(lat)
+        ))
+
+    @staticmethod
+    def _densify(xy: np.ndarray, max_km: float) -> np.ndarray:
+        """Split polyline steps longer than max_km so pieces stay grid-cell sized"""
+        out = [xy[:1]]
+        for p, q in zip(xy[:-1], xy[1:]):
+            parts = max(1, int(math.ceil(np.hypot(*(q - p)) / max_km)))
+            out.append(p + (q - p) * (np.arange(1, parts + 1) / parts)[:, None])
+        return np.concatenate(out)
+
+    def snap(self, lat: Sequence[float], lon: Sequence[float],
+             next_station: Optional[Sequence[Optional[str]]] = None) -> Dict[str, np.ndarray]:
+        """Nearest segment, direction-aware progress and nearest station per position"""
+        p = self.project(np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64))
+        if self.geometries:
+            piece, t, dist = self.segment_grid.nearest(p, self.max_snap_km)
+        else:
+            piece, t, dist = np.full(len(p), -1), np.zeros(len(p)), np.full(len(p), np.inf)
+        matched = piece >= 0
+        safe = np.where(matched, piece, 0)
+
+        geometry = np.where(matched, self.piece_geometry[safe], -1) if self.geometries else piece
+        g = np.maximum(geometry, 0)
+        progress = np.zeros(len(p))
+        reverse = np.zeros(len(p), dtype=bool)
+        if self.geometries:
+            along = self.piece_along[safe] + t * self.piece_length[safe]
+            progress = np.where(matched, along / np.maximum(np.array(self.lengths)[g], 1e-9), 0.0)
+            # Heading towards the geometry's first station means running it backwards
+            if next_station is not None:
+                firsts = np.array([first for first, _ in self.geometries], dtype=object)
+                hints = np.array([(s or '').upper() for s in next_station], dtype=object)
+                reverse = matched & (firsts[g] == hints)
+            progress = np.where(reverse, 1.0 - progress, progress)
+
+        station, _, station_dist = self.station_grid.nearest(p, self.station_radius_km)
+        return {
+            'geometry': geometry,
+            'reverse': reverse,
+            'progress': np.clip(progress, 0.0, 1.0),
+            'offset_km': dist,
+            'station': station,
+            'station_km': station_dist
+        }
+
+    def segment_seconds(self, from_station: str, to_station: str, length_km: float,
+                        train_class: Optional[str] = None) -> int:
+        """Running time from the index, else the distance at DEFAULT_SPEED_KMH"""
+        index = self.segment_times or default_index()
+        if index is not None:
+            seconds = index.running_seconds(from_station, to_station, train_class)
+            if seconds is not None:
+                return seconds
+        return int(length_km / DEFAULT_SPEED_KMH * 3600)
+
+    def snap_positions(self, positions: List[Dict], now_epoch: int) -> List[Dict]:
+        """Snap live rows ({train_no, latitude, longitude, next_station?, train_class?})"""
+        snapped = self.snap([float(row['latitude']) for row in positions],
+                            [float(row['longitude']) for row in positions],
+                            [row.get('next_station') for row in positions])
+        seconds_cache = {}
+        out = []
+        for k, row in enumerate(positions):
+            entry = {'train_no': row.get('train_no'), 'matched': bool(snapped['geometry'][k] >= 0)}
+            if snapped['station'][k] >= 0:
+                entry['at_station'] = self.station_codes[snapped['station'][k]]
+            if entry['matched']:
+                g = int(snapped['geometry'][k])
+                from_station, to_station = self.geometries[g]
+                if snapped['reverse'][k]:
+                    from_station, to_station = to_station, from_station
+                cache_key = (from_station, to_station, row.get('train_class'))
+                if cache_key not in seconds_cache:
+                    seconds_cache[cache_key] = self.segment_seconds(
+                        from_station, to_station, self.lengths[g], row.get('train_class'))
+                progress = float(snapped['progress'][k])
+                remaining = int(round((1.0 - progress) * seconds_cache[cache_key]))
+                entry.update({
+                    'segment_from': from_station,
+                    'segment_to': to_station,
+                    'direction_known': bool(row.get('next_station')),
+                    'progress': round(progress, 4),
+                    'offset_km': round(float(snapped['offset_km'][k]), 3),
+                    'remaining_seconds': remaining,
+                    # Entry into the segment that starts at segment_to
+                    'earliest_entry_seconds': int(now_epoch) + remaining
+                })
+            out.append(entry)
+        return out
+
+
+def index_segments(segment_times=None) -> List[Tuple[str, str, None]]:
+    """Segments the running-time index has seen, as straight lines between stations"""
+    index = segment_times or default_index()
+    if index is None:
+        return []
+    return [(f, t, None) for f, t in index.segments()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Snap a live position to the segment network')
+    parser.add_argument('latitude', type=float)
+    parser.add_argument('longitude', type=float)
+    parser.add_argument('--next-station')
+    parser.add_argument('--stations', default=DEFAULT_STATIONS_PATH)
+    parser.add_argument('--segment', action='append', default=[],
+                        help='FROM-TO pair; repeatable. Defaults to the running-time index segments')
+    parser.add_argument('--now', type=int, default=0)
+    args = parser.parse_args()
+
+    segments = [(*s.upper().split('-', 1), None) for s in args.segment] or index_segments()
+    index = SpatialIndex(load_stations(args.stations), segments)
+    row = {'train_no': 'cli', 'latitude': args.latitude, 'longitude': args.longitude,
+           'next_station': args.next_station}
+    print(json.dumps(index.snap_positions([row], args.now)[0], indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+"""Shared fixtures: the service modules import each other as top-level modules"""
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Never write test solves into the service's history database
+os.environ.setdefault('HISTORY_DB', 'off')
+
+from solver import Train  # noqa: E402
+
+BASE = 1_700_000_000
+STATIONS = ['NDLS', 'MTJ', 'AGC', 'GWL', 'JHS', 'BPL']
+
+
+def random_trains(seed: int, n: int, segments: int = 1, reverse: bool = False,
+                  horizon: int = 1800, base: int = BASE):
+    """n trains spread over `segments` consecutive station pairs; with
+    reverse, about half of them run the opposite way"""
+    rng = random.Random(seed)
+    trains = []
+    for i in range(n):
+        k = rng.randrange(segments)
+        a, b = STATIONS[k], STATIONS[k + 1]
+        if reverse and rng.random() < 0.5:
+            a, b = b, a
+        trains.append(Train(
+            train_no=f'{10000 + i}',
+            priority_score=rng.choice([10, 30, 50, 70, 100]),
+            current_station=a,
+            next_station=b,
+            earliest_entry_seconds=base + rng.randrange(horizon),
+            travel_time_seconds=rng.choice([120, 180, 240, 300]),
+            dwell_time_seconds=60
+        ))
+    return trains
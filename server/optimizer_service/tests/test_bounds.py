@@ -0,0 +1,82 @@
+import itertools
+import random
+from dataclasses import replace
+
+import pytest
+
+from bounds import lower_bound, relative_gap, single_machine_bound
+from conftest import random_trains
+from solver import SolverParams, TrainOptimizer
+
+
+def brute_force_single_machine(release, processing, weight):
+    """Best non-preemptive sequence: earliest-start timing of every permutation"""
+    best = None
+    for order in itertools.permutations(range(len(release))):
+        t, cost = None, 0
+        for k in order:
+            s = release[k] if t is None else max(release[k], t)
+            cost += weight[k] * (s - release[k])
+            t = s + processing[k]
+        best = cost if best is None else min(best, cost)
+    return best
+
+
+def optimum(trains, params, fixed_starts=None):
+    optimizer = TrainOptimizer()
+    optimizer.fixed_starts = dict(fixed_starts or {})
+    optimizer.build_model(trains, replace(params, lower_bounds=False, time_limit_seconds=30))
+    result = optimizer.solve()
+    assert result['solver_meta']['status'] == 'OPTIMAL'
+    return round(result['solver_meta']['objective_value'])
+
+
+@pytest.mark.parametrize('seed', range(40))
+def test_single_machine_bound_below_optimum(seed):
+    rng = random.Random(seed)
+    n = rng.randrange(1, 7)
+    release = [rng.randrange(0, 1200) for _ in range(n)]
+    processing = [rng.choice([200, 300, 450, 600]) for _ in range(n)]
+    weight = [rng.choice([1, 3, 5, 10]) for _ in range(n)]
+    assert single_machine_bound(release, processing, weight) <= \
+        brute_force_single_machine(release, processing, weight)
+
+
+def test_single_machine_bound_tight_without_overlap():
+    assert single_machine_bound([0, 1000], [300, 300], [5, 1]) == 0
+    # Equal jobs released together: the second waits exactly one job
+    assert single_machine_bound([0, 0], [300, 300], [1, 1]) == 300
+
+
+@pytest.mark.parametrize('seed', range(8))
+def test_lower_bound_below_optimum(seed):
+    trains = random_trains(seed, 8, segments=2, horizon=900)
+    params = SolverParams()
+    bound = lower_bound(trains, params)
+    assert bound.value == sum(bound.by_block.values())
+    assert bound.value <= optimum(trains, params)
+
+
+@pytest.mark.parametrize('seed', range(6))
+def test_lower_bound_with_pinned_trains(seed):
+    trains = random_trains(seed, 7, horizon=900)
+    params = SolverParams()
+    # Pin two trains where a feasible plan puts them: release-order list schedule
+    from lns import list_schedule
+    starts = list_schedule(trains, params.headway_seconds, params)
+    pinned = {i: starts[i] for i in (0, 3)}
+    bound = lower_bound(trains, params, pinned)
+    assert bound.value <= optimum(trains, params, pinned)
+
+
+@pytest.mark.parametrize('seed', range(6))
+def test_lower_bound_single_track(seed):
+    trains = random_trains(seed, 7, reverse=True, horizon=900)
+    params = SolverParams(single_track=True, direction_change_headway_seconds=300)
+    assert lower_bound(trains, params).value <= optimum(trains, params)
+
+
+def test_relative_gap():
+    assert relative_gap(100, 100) == 0.0
+    assert relative_gap(90, 100) == 0.0
+    assert relative_gap(200, 150) == pytest.approx(0.25)
@@ -0,0 +1,64 @@
+import random
+from dataclasses import replace
+
+import pytest
+
+from conftest import random_trains
+from corridor import OccupancyIndex, corridor_stats
+from solver import SolverParams, pair_headway, track_key
+
+
+def plan_for(trains, seed):
+    rng = random.Random(seed)
+    return [t.earliest_entry_seconds + rng.choice([0, 0, 60, 400]) for t in trains]
+
+
+def blocks(trains, params):
+    by_block = {}
+    for i, train in enumerate(trains):
+        by_block.setdefault(track_key(train, params), []).append(i)
+    return by_block
+
+
+@pytest.mark.parametrize('seed', range(10))
+@pytest.mark.parametrize('single_track', [False, True])
+def test_occupancy_matches_brute_force(seed, single_track):
+    trains = random_trains(seed, 30, segments=3, reverse=True, horizon=5400)
+    params = SolverParams(single_track=single_track,
+                          direction_change_headway_seconds=300 if single_track else None)
+    starts = plan_for(trains, seed)
+    index = OccupancyIndex(trains, starts, params.headway_seconds, params)
+    util = index.utilization(900)
+    peak, _ = index.peak_concurrency()
+    margins = index.segment_margins(index.headway_margins())
+
+    for s, key in enumerate(index.segments):
+        members = blocks(trains, params)[key]
+        intervals = [(starts[i], starts[i] + trains[i].travel_time_seconds) for i in members]
+
+        # Busy seconds per bucket: clipped interval lengths
+        edges = util['edges']
+        busy = [sum(max(0, min(b, e) - max(a, s0)) for s0, e in intervals)
+                for a, b in zip(edges[:-1], edges[1:])]
+        assert list(util['busy'][s]) == busy
+
+        # Peak concurrency: most intervals containing one entry instant
+        assert peak[s] == max(sum(1 for s0, e in intervals if s0 <= t < e) for t, _ in intervals)
+
+        # Margins between consecutive entries on the block
+        ordered = sorted(members, key=lambda i: (starts[i], i))
+        expected = [starts[j] - (starts[i] + trains[i].travel_time_seconds + pair_headway(trains[i], trains[j], params))
+                    for i, j in zip(ordered, ordered[1:])]
+        assert sorted(margins[s].tolist()) == sorted(expected)
+
+
+def test_single_track_margins_use_direction_change_headway():
+    first, second = random_trains(3, 2)
+    second = replace(second, current_station=first.next_station, next_station=first.current_station)
+    starts = [first.earliest_entry_seconds, first.earliest_entry_seconds + first.travel_time_seconds + 200]
+    params = SolverParams(single_track=True, direction_change_headway_seconds=300)
+    stats = corridor_stats([first, second], starts, 180, params=params)
+    assert stats['corridor_meta']['segments'] == 1
+    assert stats['corridor_meta']['headway_margin_seconds']['min'] == -100
+    # Double track: independent directions, no shared margin
+    assert corridor_stats([first, second], starts, 180)['corridor_meta']['headway_margin_seconds']['count'] == 0
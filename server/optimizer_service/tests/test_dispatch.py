@@ -0,0 +1,85 @@
+from dataclasses import replace
+
+import pytest
+
+from conftest import random_trains
+from dispatch import classify, components, dispatch, merge_results, solve_component
+from exact import OPTIMAL, solve_single_segment
+from solver import SolverParams, TrainOptimizer
+
+
+def cpsat_optimum(trains, params):
+    optimizer = TrainOptimizer()
+    optimizer.build_model(trains, replace(params, time_limit_seconds=30))
+    result = optimizer.solve()
+    assert result['solver_meta']['status'] == 'OPTIMAL'
+    return round(result['solver_meta']['objective_value'])
+
+
+@pytest.mark.parametrize('seed', range(12))
+def test_exact_matches_cpsat(seed):
+    trains = random_trains(seed, 3 + seed % 5, horizon=900)
+    params = SolverParams()
+    max_start = max(t.earliest_entry_seconds for t in trains) + 3600
+    exact = solve_single_segment(trains, params.headway_seconds, max_start)
+    assert exact.status == OPTIMAL
+    assert exact.objective == cpsat_optimum(trains, params)
+
+
+def test_exact_without_dominance_agrees():
+    trains = random_trains(3, 7, horizon=600)
+    with_rules = solve_single_segment(trains, 180)
+    without = solve_single_segment(trains, 180, use_dominance=False)
+    assert with_rules.objective == without.objective
+    assert with_rules.preprocessing['ordering_pairs'] == 21
+
+
+def test_classify_routes_by_size():
+    params = SolverParams(exact_max_trains=5, lns_threshold_trains=12)
+    assert classify(random_trains(0, 1), params) == 'trivial'
+    assert classify(random_trains(0, 5), params) == 'exact'
+    assert classify(random_trains(0, 8), params) == 'cpsat'
+    assert classify(random_trains(0, 13), params) == 'lns'
+
+
+def test_classify_sends_opposing_headways_to_cpsat():
+    trains = random_trains(1, 4, reverse=True)
+    assert len({(t.current_station, t.next_station) for t in trains}) == 2
+    params = SolverParams(single_track=True, direction_change_headway_seconds=300)
+    assert classify(trains, params) == 'cpsat'
+    assert classify(trains, replace(params, direction_change_headway_seconds=None)) == 'exact'
+
+
+def test_dispatch_covers_every_train():
+    trains = random_trains(5, 40, segments=5)
+    result = dispatch(trains, SolverParams(time_limit_seconds=10))
+    assert [row['train_no'] for row in result['results']] == \
+        [t.train_no for t in trains]
+    meta = result['solver_meta']
+    assert meta['dispatch']['components'] == len(components(trains))
+    pairs = sum(len(part) * (len(part) - 1) // 2 for part in components(trains).values())
+    assert meta['preprocessing']['ordering_pairs'] == pairs
+
+
+def test_merge_results_reports_missing_trains():
+    trains = random_trains(2, 6, segments=2)
+    parts = list(components(trains).values())
+    solutions = [solve_component(part, SolverParams(), 5) for part in parts]
+    solutions[0] = {'solver_meta': {'status': 'OPTIMAL', 'objective_value': 0}, 'results': []}
+    merged = merge_results(trains, solutions)
+    missing = {t.train_no for t in parts[0]}
+    assert set(merged['solver_meta']['unscheduled']) == missing
+    assert merged['solver_meta']['status'] == 'UNKNOWN'
+    assert {row['train_no'] for row in merged['results']} | missing == {t.train_no for t in trains}
+
+
+def test_unknown_component_falls_back_to_list_schedule(monkeypatch):
+    trains = random_trains(4, 8)
+    monkeypatch.setattr(TrainOptimizer, 'solve', lambda self: {
+        'solver_meta': {'status': 'UNKNOWN', 'objective_value': 0, 'engine': 'cpsat'}, 'results': []})
+    solution = solve_component(trains, SolverParams(), 1, 'cpsat')
+    assert solution['solver_meta']['fallback'] == 'list_schedule'
+    assert len(solution['results']) == len(trains)
+    merged = merge_results(trains, [solution])
+    assert 'unscheduled' not in merged['solver_meta']
+    assert merged['solver_meta']['fallback_components'] == 1
@@ -0,0 +1,43 @@
+from dataclasses import replace
+
+from conftest import random_trains
+from lns import LNSOptimizer, LNSParams, list_schedule, weighted_delay
+from solver import SolverParams, TrainOptimizer
+from validate import validate_schedule
+
+
+def test_sub_solves_succeed_on_schedules_longer_than_a_day():
+    # One congested block: release-order service runs well past 24 hours
+    trains = random_trains(1, 300, horizon=4 * 3600)
+    params = SolverParams(time_limit_seconds=20, engine='lns')
+    initial = list_schedule(trains, params.headway_seconds, params)
+    assert max(initial) - min(t.earliest_entry_seconds for t in trains) > 24 * 3600
+
+    optimizer = LNSOptimizer(LNSParams(max_iterations=12, seed=0))
+    resolve = optimizer._resolve
+    outcomes = []
+
+    def counted(freed, time_limit):
+        new_starts, proven = resolve(freed, time_limit)
+        outcomes.append(new_starts is not None)
+        return new_starts, proven
+
+    optimizer._resolve = counted
+    result = optimizer.solve(trains, params)
+    assert outcomes and all(outcomes)
+
+    starts = [row['optimized_entry_epoch'] for row in result['results']]
+    assert result['solver_meta']['objective_value'] < weighted_delay(trains, initial, range(len(trains)))
+    assert validate_schedule(trains, starts, params.headway_seconds, params=params)['validation_meta']['valid']
+
+
+def test_big_m_spans_releases_more_than_a_day_apart():
+    # Two trains released 30h apart on one block: the later one must still be
+    # free to go first or second under the ordering constraint
+    early, late = random_trains(2, 2)
+    late = replace(late, earliest_entry_seconds=early.earliest_entry_seconds + 30 * 3600)
+    optimizer = TrainOptimizer()
+    optimizer.build_model([early, late], SolverParams(fix_dominated_orders=False, lower_bounds=False))
+    result = optimizer.solve()
+    assert result['solver_meta']['status'] == 'OPTIMAL'
+    assert result['solver_meta']['objective_value'] == 0
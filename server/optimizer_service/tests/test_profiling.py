@@ -0,0 +1,13 @@
+import profiling
+from profiling import should_profile
+
+
+def test_negative_header_skips_sampling(monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILE_EVERY_N', 1)
+    monkeypatch.setattr(profiling, '_sample_count', 0)
+    for header in ('0', 'false', 'No'):
+        assert not should_profile(False, header)
+    assert profiling._sample_count == 0
+    assert should_profile(False, None)
+    assert should_profile(False, '1')
+    assert should_profile(True, '0')
@@ -0,0 +1,51 @@
+import pytest
+
+from conftest import random_trains
+from solver import SolverParams, TrainOptimizer, app
+from tuning import DEFAULT_GRID, validate_settings
+
+
+def test_default_grid_has_no_gap_limits():
+    assert not any('gap' in name for name in DEFAULT_GRID)
+
+
+@pytest.mark.parametrize('name, parameters', [
+    ('no_such_bucket', None),
+    ('auto', {'no_such_parameter': 1}),
+    ('auto', {'max_time_in_seconds': 5}),
+    ('auto', {'search_branching': 'NO_SUCH_SEARCH'}),
+    ('auto', {'num_workers': 'eight'}),
+])
+def test_invalid_settings_rejected(name, parameters):
+    with pytest.raises(ValueError):
+        validate_settings(name, parameters)
+
+
+def test_valid_settings_accepted():
+    validate_settings('default', {'search_branching': 'FIXED_SEARCH', 'num_workers': 1})
+
+
+def test_solve_returns_400_for_unknown_profile():
+    trains = [{'train_no': t.train_no, 'priority_score': t.priority_score,
+               'current_station': t.current_station, 'next_station': t.next_station,
+               'earliest_entry_seconds': t.earliest_entry_seconds, 'dwell_time_seconds': 60,
+               'segment': {'seconds': t.travel_time_seconds}} for t in random_trains(0, 3)]
+    response = app.test_client().post('/solve', json={
+        'trains': trains, 'solver_params': {'cpsat_profile': 'no_such_bucket'}})
+    assert response.status_code == 400
+    assert 'no_such_bucket' in response.get_json()['error']
+
+
+def test_gap_limited_solve_is_not_reported_optimal():
+    trains = random_trains(2, 10, horizon=2400)
+    solved = {}
+    for gap in (0.0, 0.9):
+        optimizer = TrainOptimizer()
+        optimizer.build_model(trains, SolverParams(
+            lower_bounds=False, fix_dominated_orders=False,
+            cpsat_parameters={'relative_gap_limit': gap, 'num_workers': 1}))
+        solved[gap] = optimizer.solve()['solver_meta']
+    assert solved[0.0]['status'] == 'OPTIMAL'
+    # Stopped inside the gap limit, short of the optimum: not a proof
+    assert solved[0.9]['objective_value'] > solved[0.9]['lower_bound']
+    assert solved[0.9]['status'] == 'FEASIBLE'
@@ -0,0 +1,71 @@
+import random
+
+import pytest
+
+from conftest import random_trains
+from lns import list_schedule
+from solver import SolverParams, pair_headway, schedule_row, track_key
+from validate import validate_result, validate_schedule
+
+
+def brute_force_overlaps(trains, starts, params):
+    """train_no -> worst overlap with any train entering the block before it"""
+    order = sorted(range(len(trains)), key=lambda k: (starts[k], k))
+    rank = {k: r for r, k in enumerate(order)}
+    worst = {}
+    for k, train in enumerate(trains):
+        for j, other in enumerate(trains):
+            if rank[j] >= rank[k] or track_key(other, params) != track_key(train, params):
+                continue
+            late = starts[j] + other.travel_time_seconds + pair_headway(other, train, params) - starts[k]
+            if late > 0:
+                worst[train.train_no] = max(worst.get(train.train_no, 0), late)
+    return worst
+
+
+def perturbed_plan(trains, params, seed):
+    rng = random.Random(seed)
+    plan = list_schedule(trains, params.headway_seconds, params)
+    for i in rng.sample(range(len(trains)), len(trains) // 4):
+        plan[i] = max(trains[i].earliest_entry_seconds, plan[i] - rng.randrange(0, 600))
+    return plan
+
+
+@pytest.mark.parametrize('seed', range(20))
+@pytest.mark.parametrize('single_track', [False, True])
+def test_headway_violations_match_brute_force(seed, single_track):
+    trains = random_trains(seed, 25, segments=3, reverse=True, horizon=3600)
+    params = SolverParams(single_track=single_track,
+                          direction_change_headway_seconds=300 if single_track else None)
+    plan = perturbed_plan(trains, params, seed)
+    report = validate_schedule(trains, plan, params.headway_seconds, params=params)
+    found = {v['train_no']: v['overlap_seconds'] for v in report['violations'] if v['type'] == 'headway'}
+    assert found == brute_force_overlaps(trains, plan, params)
+    assert report['validation_meta']['objective_value'] == sum(
+        t.priority_score * (s - t.earliest_entry_seconds) for t, s in zip(trains, plan))
+
+
+def test_list_schedule_is_valid():
+    trains = random_trains(7, 60, segments=4, reverse=True)
+    params = SolverParams(single_track=True, direction_change_headway_seconds=300)
+    plan = list_schedule(trains, params.headway_seconds, params)
+    assert validate_schedule(trains, plan, params.headway_seconds, params=params)['validation_meta']['valid']
+
+
+def test_early_entry_and_hold_limit():
+    trains = random_trains(1, 3, segments=3, horizon=60)
+    plan = [t.earliest_entry_seconds for t in trains]
+    plan[0] -= 30
+    plan[1] += 3 * 3600
+    report = validate_schedule(trains, plan, 180, max_hold_minutes=120)
+    early = [v for v in report['violations'] if v['type'] == 'early_entry']
+    assert [(v['train_no'], v['early_seconds']) for v in early] == [(trains[0].train_no, 30)]
+    assert report['validation_meta']['hold_limit_exceeded'] == [trains[1].train_no]
+
+
+def test_validate_result_reports_missing_rows():
+    trains = random_trains(2, 4)
+    result = {'results': [schedule_row(t, t.earliest_entry_seconds) for t in trains[1:]]}
+    report = validate_result(trains, result, SolverParams())
+    assert not report['validation_meta']['valid']
+    assert report['validation_meta']['missing_trains'] == [trains[0].train_no]
@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+CP-SAT parameter profiles
+Instances are bucketed by model size (ordering pairs after the block index);
+each bucket can carry its own CP-SAT parameters, tuned offline on a corpus
+of recorded or generated instances and stored in cpsat_profiles.json.
+build_model looks up the bucket of every model it builds and applies that
+bucket's parameters; without a profiles file CP-SAT runs on its defaults.
+
+Tuning races candidate parameter sets from a grid (successive halving:
+every survivor is scored on a growing prefix of the bucket's instances and
+the worse half dropped) and scores time-to-quality as the primal integral,
+the area under the incumbent's gap to the best known objective over the
+time limit. Stock parameters always race too, so a bucket only gets a
+profile that beat them.
+
+    python tuning.py tune profiles/ --generate 5,30,150,600 --time-limit 2
+    python tuning.py show input.json
+"""
+
+import argparse
+import glob
+import itertools
+import json
+import math
+import os
+import random
+import time
+from dataclasses import replace
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_PROFILES_PATH = os.getenv(
+    'CPSAT_PROFILES',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cpsat_profiles.json')
+)
+
+# (name, largest ordering-pair count in the bucket); the last bucket is open-ended
+BUCKETS = [('tiny', 50), ('small', 1000), ('medium', 20000), ('large', None)]
+
+# Default search space; override with --grid <file> holding the same shape.
+# No gap limits: CP-SAT reports OPTIMAL once within them, which callers
+# (the incremental cache among them) take as proven
+DEFAULT_GRID = {
+    'num_workers': [1, 8],
+    'search_branching': ['AUTOMATIC_SEARCH', 'FIXED_SEARCH', 'PORTFOLIO_SEARCH'],
+    'cp_model_presolve': [True, False],
+    'linearization_level': [0, 1, 2],
+}
+
+_cache: Dict[str, Tuple[float, Optional[Dict]]] = {}
+
+
+def bucket_for(ordering_pairs: int) -> str:
+    for name, limit in BUCKETS:
+        if limit is None or ordering_pairs <= limit:
+            return name
+    return BUCKETS[-1][0]
+
+
+def model_features(trains, conflict_pairs) -> Dict:
+    """Size features of a model, from the conflict pairs build_model enumerated"""
+    return {
+        'trains': len(trains),
+        'ordering_pairs': len(conflict_pairs),
+        'bucket': bucket_for(len(conflict_pairs))
+    }
+
+
+def instance_features(trains, params) -> Dict:
+    """Same features without building a model"""
+    from solver import conflict_groups
+
+    groups = conflict_groups(trains, params).values()
+    pairs = sum(len(g) * (len(g) - 1) // 2 for g in groups)
+    return {
+        'trains': len(trains),
+        'blocks': len(groups),
+        'largest_block': max((len(g) for g in groups), default=0),
+        'ordering_pairs': pairs,
+        'bucket': bucket_for(pairs)
+    }
+
+
+def load_profiles(path: str = DEFAULT_PROFILES_PATH) -> Optional[Dict]:
+    """Profiles file, re-read only when it changes; None if there is none"""
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    cached = _cache.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, encoding='utf-8') as f:
+            cached = _cache[path] = (mtime, json.load(f))
+    return cached[1]
+
+
+def select_profile(features: Dict, name: Optional[str] = 'auto',
+                   path: str = DEFAULT_PROFILES_PATH) -> Optional[Dict]:
+    """Profile for a model: its size bucket for 'auto', a named bucket, or None"""
+    if not name or name == 'default':
+        return None
+    profiles = load_profiles(path)
+    if not profiles:
+        return None
+    bucket = features['bucket'] if name == 'auto' else name
+    profile = profiles.get('buckets', {}).get(bucket)
+    if profile is None:
+        if name != 'auto':
+            raise ValueError(f'Unknown CP-SAT profile: {name}')
+        return None
+    return {'name': bucket, 'parameters': profile.get('parameters', {})}
+
+
+def apply_parameters(parameters, values: Dict):
+    """Set SatParameters fields by name; enum fields take their value names"""
+    for name, value in values.items():
+        if name == 'max_time_in_seconds' or name.startswith('_') or not hasattr(parameters, name):
+            # The request's time limit is not a tuning knob
+            raise ValueError(f'Unsupported CP-SAT parameter: {name}')
+        if isinstance(value, str):
+            descriptor = getattr(parameters, 'DESCRIPTOR', None)
+            if descriptor is not None:
+                # protobuf SatParameters (older OR-Tools): enum fields hold numbers
+                enum = descriptor.fields_by_name[name].enum_type
+                names = enum.values_by_name if enum is not None else {}
+            else:
+                # pybind SatParameters: enum fields hold enum members
+                names = getattr(type(getattr(parameters, name)), '__members__', {})
+            if value not in names:
+                raise ValueError(f'Invalid value for CP-SAT parameter {name}: {value}')
+            value = names[value].number if descriptor is not None else names[value]
+        setattr(parameters, name, value)
+
+
+def validate_settings(name: Optional[str] = 'auto', parameters: Optional[Dict] = None,
+                      path: str = DEFAULT_PROFILES_PATH):
+    """Raise ValueError for a profile name or CP-SAT parameter a request can not use"""
+    if name not in (None, '', 'auto', 'default'):
+        if not isinstance(name, str):
+            raise ValueError(f'Unknown CP-SAT profile: {name}')
+        profiles = load_profiles(path)
+        known = set(profiles.get('buckets', {})) if profiles else {bucket for bucket, _ in BUCKETS}
+        if name not in known:
+            raise ValueError(f'Unknown CP-SAT profile: {name}')
+    if parameters:
+        if not isinstance(parameters, dict):
+            raise ValueError('cpsat_parameters must be an object')
+        from ortools.sat.python import cp_model
+
+        try:
+            apply_parameters(cp_model.CpSolver().parameters, parameters)
+        except TypeError as e:
+            raise ValueError(f'Invalid CP-SAT parameter value: {e}')
+
+
+# --- tuning -----------------------------------------------------------------
+
+def load_corpus(paths: List[str]) -> List[Tuple[str, Dict]]:
+    """/solve payloads from files and directories (profile bundles included)"""
+    found = []
+    for path in paths:
+        files = sorted(glob.glob(os.path.join(path, '**', '*.json'), recursive=True)) \
+            if os.path.isdir(path) else [path]
+        for name in files:
+            try:
+                with open(name, encoding='utf-8') as f:
+                    payload = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if isinstance(payload, dict) and payload.get('trains'):
+                found.append((name, payload))
+    return found
+
+
+def generated_corpus(sizes: List[int], per_size: int, seed: int) -> List[Tuple[str, Dict]]:
+    from instances import generate_instance
+
+    corpus = []
+    for n in sizes:
+        for k in range(per_size):
+            # About ten trains per segment, the density of a busy corridor hour
+            segments = max(1, n // 10)
+            payload = generate_instance(n, segments, seed=seed + 1000 * n + k,
+                                        horizon_seconds=max(1800, 60 * n // segments))
+            corpus.append((f'generated_{n}_{k}', payload))
+    return corpus
+
+
+def grid_candidates(grid: Dict) -> List[Dict]:
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[n] for n in names))]
+
+
+class _Prepared:
+    """One corpus instance with its CP-SAT model built once and solved per candidate"""
+
+    def __init__(self, name: str, payload: Dict):
+        from solver import TrainOptimizer
+
+        self.name = name
+        optimizer = TrainOptimizer()
+        trains, params = optimizer.parse_input(payload)
+        optimizer.build_model(trains, replace(params, cpsat_profile=None, cpsat_parameters=None))
+        self.model = optimizer.model
+        self.features = model_features(trains, optimizer.conflict_pairs)
+        self.runs: Dict[int, Dict] = {}  # candidate index -> run
+
+    def best_objective(self) -> Optional[float]:
+        found = [r['objective'] for r in self.runs.values() if r['objective'] is not None]
+        return min(found) if found else None
+
+
+def _run(model, parameters: Dict, time_limit: float) -> Dict:
+    """Solve once, recording every incumbent with its wall time"""
+    from ortools.sat.python import cp_model
+
+    class Incumbents(cp_model.CpSolverSolutionCallback):
+        def __init__(self):
+            super().__init__()
+            self.trace = []
+
+        def on_solution_callback(self):
+            self.trace.append((self.WallTime(), self.ObjectiveValue()))
+
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = time_limit
+    apply_parameters(solver.parameters, parameters)
+    incumbents = Incumbents()
+    status = solver.Solve(model, incumbents)
+    objective = solver.ObjectiveValue() if status in (cp_model.OPTIMAL, cp_model.FEASIBLE) else None
+    return {
+        'status': solver.StatusName(status),
+        'objective': objective,
+        'wall_seconds': solver.WallTime(),
+        'trace': incumbents.trace
+    }
+
+
+def primal_integral(run: Dict, best: Optional[float], time_limit: float) -> float:
+    """Area under the primal gap over [0, time_limit]: 1 until the first
+    incumbent, then |obj - best| / max(|obj|, |best|), held after the solve ends"""
+    if best is None:
+        return time_limit
+
+    def gap(objective):
+        scale = max(abs(objective), abs(best))
+        return abs(objective - best) / scale if scale > 0 else 0.0
+
+    area, last_time, last_gap = 0.0, 0.0, 1.0
+    for wall, objective in run['trace']:
+        wall = min(wall, time_limit)
+        area += (wall - last_time) * last_gap
+        last_time, last_gap = wall, gap(objective)
+    if run['objective'] is not None:
+        last_gap = gap(run['objective'])
+    return area + max(0.0, time_limit - last_time) * last_gap
+
+
+def _score(candidate: int, instances: List[_Prepared], time_limit: float) -> Tuple[float, float]:
+    """(mean primal integral, mean wall seconds) of a candidate; lower is better"""
+    integrals = [primal_integral(p.runs[candidate], p.best_objective(), time_limit) for p in instances]
+    walls = [p.runs[candidate]['wall_seconds'] for p in instances]
+    return sum(integrals) / len(integrals), sum(walls) / len(walls)
+
+
+def race(instances: List[_Prepared], candidates: List[Dict], time_limit: float,
+         strategy: str = 'racing', keep_fraction: float = 0.5, initial: int = 2,
+         min_improvement: float = 0.05, log=None) -> Dict:
+    """Pick the candidate with the best time-to-quality on a bucket's instances.
+
+    candidates[0] is the stock configuration and is never eliminated, so the
+    winner can always be compared with it on the same instances.
+    """
+    alive = list(range(len(candidates)))
+    evaluated = len(instances) if strategy == 'grid' else min(initial, len(instances))
+    rounds = 0
+    while True:
+        rounds += 1
+        for p in instances[:evaluated]:
+            for c in alive:
+                if c not in p.runs:
+                    p.runs[c] = _run(p.model, candidates[c], time_limit)
+        scores = {c: _score(c, instances[:evaluated], time_limit) for c in alive}
+        alive.sort(key=lambda c: scores[c])
+        if log:
+            log(f'  round {rounds}: {len(alive)} candidates on {evaluated} instances, '
+                f'best {scores[alive[0]][0]:.3f}')
+        if len(alive) <= 2 or evaluated >= len(instances):
+            break
+        survivors = alive[:max(1, math.ceil(len(alive) * keep_fraction))]
+        alive = survivors if 0 in survivors else survivors + [0]
+        evaluated = min(len(instances), evaluated * 2)
+
+    winner = alive[0]
+    win_score, baseline = scores[winner], scores[0]
+    # A profile has to beat stock parameters by a margin, not by timing noise
+    if win_score[0] > baseline[0] * (1 - min_improvement) and \
+            win_score[1] > baseline[1] * (1 - min_improvement):
+        winner, win_score = 0, baseline
+    return {
+        'parameters': candidates[winner],
+        'primal_integral': round(win_score[0], 4),
+        'mean_wall_seconds': round(win_score[1], 3),
+        'baseline_primal_integral': round(baseline[0], 4),
+        'baseline_mean_wall_seconds': round(baseline[1], 3),
+        'instances': evaluated,
+        'candidates': len(candidates),
+        'runs': sum(len(p.runs) for p in instances),
+        'rounds': rounds
+    }
+
+
+def tune(corpus: List[Tuple[str, Dict]], grid: Dict, time_limit: float,
+         strategy: str = 'racing', max_instances: int = 8, seed: int = 7,
+         log=print) -> Dict:
+    """Race the grid on every size bucket of the corpus; returns a profiles document"""
+    rng = random.Random(seed)
+    by_bucket: Dict[str, List[_Prepared]] = {}
+    for name, payload in corpus:
+        prepared = _Prepared(name, payload)
+        by_bucket.setdefault(prepared.features['bucket'], []).append(prepared)
+
+    candidates = [{}] + [c for c in grid_candidates(grid) if c]
+    buckets = {}
+    for bucket, _ in BUCKETS:
+        instances = by_bucket.get(bucket)
+        if not instances:
+            continue
+        rng.shuffle(instances)
+        instances = instances[:max_instances]
+        if log:
+            log(f'{bucket}: {len(instances)} instances, {len(candidates)} candidates')
+        buckets[bucket] = race(instances, candidates, time_limit, strategy, log=log)
+        buckets[bucket]['max_ordering_pairs'] = dict(BUCKETS)[bucket]
+
+    return {
+        'version': 1,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'time_limit_seconds': time_limit,
+        'strategy': strategy,
+        'corpus_instances': len(corpus),
+        'cpu_count': os.cpu_count(),  # worker counts only transfer to similar hosts
+        'grid': grid,
+        'buckets': buckets
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='CP-SAT parameter profiles')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    tn = sub.add_parser('tune', help='Race parameter sets per size bucket and write profiles')
+    tn.add_argument('paths', nargs='*', help='/solve payload files or directories (profile bundles)')
+    tn.add_argument('--generate', default='', help='Comma-separated train counts of generated instances')
+    tn.add_argument('--per-size', type=int, default=3)
+    tn.add_argument('--grid', help='JSON file mapping parameter names to candidate values')
+    tn.add_argument('--strategy', choices=['racing', 'grid'], default='racing')
+    tn.add_argument('--time-limit', type=float, default=2)
+    tn.add_argument('--max-instances', type=int, default=8, help='Per bucket')
+    tn.add_argument('--seed', type=int, default=7)
+    tn.add_argument('--out', default=DEFAULT_PROFILES_PATH)
+
+    sh = sub.add_parser('show', help='Features and selected profile of a /solve payload')
+    sh.add_argument('payload')
+    sh.add_argument('--profiles', default=DEFAULT_PROFILES_PATH)
+
+    args = parser.parse_args()
+
+    if args.command == 'tune':
+        corpus = load_corpus(args.paths)
+        if args.generate:
+            corpus += generated_corpus([int(n) for n in args.generate.split(',')], args.per_size, args.seed)
+        if not corpus:
+            parser.error('no instances: pass payload paths or --generate')
+        grid = DEFAULT_GRID
+        if args.grid:
+            with open(args.grid, encoding='utf-8') as f:
+                grid = json.load(f)
+        started = time.time()
+        profiles = tune(corpus, grid, args.time_limit, args.strategy, args.max_instances, args.seed)
+        profiles['tuning_seconds'] = round(time.time() - started, 1)
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(profiles, f, indent=2)
+        print(json.dumps({b: {k: v for k, v in p.items() if k != 'runs'}
+                          for b, p in profiles['buckets'].items()}, indent=2))
+    elif args.command == 'show':
+        from solver import TrainOptimizer
+
+        with open(args.payload, encoding='utf-8') as f:
+            payload = json.load(f)
+        trains, params = TrainOptimizer().parse_input(payload)
+        features = instance_features(trains, params)
+        print(json.dumps({'features': features,
+                          'profile': select_profile(features, params.cpsat_profile, args.profiles)},
+                         indent=2))
+
+
+if __name__ == '__main__':
+    main()